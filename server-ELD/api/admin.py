@@ -1,7 +1,7 @@
 # api/admin.py - Django admin configuration
 
 from django.contrib import admin
-from .models import Trip, Stop, ELDLog, LogSegment
+from .models import Trip, Stop, ELDLog, LogSegment, GeocodeCacheEntry
 
 
 @admin.register(Trip)
@@ -30,4 +30,11 @@ class ELDLogAdmin(admin.ModelAdmin):
 @admin.register(LogSegment)
 class LogSegmentAdmin(admin.ModelAdmin):
     list_display = ['log', 'status', 'start_time', 'end_time']
-    list_filter = ['status']
\ No newline at end of file
+    list_filter = ['status']
+
+
+@admin.register(GeocodeCacheEntry)
+class GeocodeCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ['key', 'latitude', 'longitude', 'source', 'found', 'expires_at']
+    list_filter = ['found', 'source']
+    search_fields = ['key']
\ No newline at end of file
@@ -0,0 +1,94 @@
+# api/management/commands/bench_gazetteer.py - Memory/latency benchmark for the gazetteer index
+
+import random
+import string
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.utils.gazetteer import GazetteerIndex, read_gazetteer_file
+
+
+class Command(BaseCommand):
+    help = 'Benchmark gazetteer index build time, memory and lookup latency'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--path', help='Gazetteer TSV to load (default: synthetic places)')
+        parser.add_argument('--synthetic', type=int, default=5000,
+                            help='Number of synthetic places when --path is not given')
+        parser.add_argument('--queries', type=int, default=20000)
+        parser.add_argument('--seed', type=int, default=7)
+    
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        
+        if options['path']:
+            try:
+                places = list(read_gazetteer_file(options['path']))
+            except OSError as e:
+                raise CommandError(f"Could not read {options['path']}: {e}")
+        else:
+            places = self._synthetic_places(options['synthetic'], rng)
+        
+        if not places:
+            raise CommandError('No places to index')
+        
+        started = time.perf_counter()
+        index = GazetteerIndex.build(places)
+        build_seconds = time.perf_counter() - started
+        
+        # Build again under tracemalloc for the peak, which slows the build down
+        tracemalloc.start()
+        GazetteerIndex.build(places)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        
+        self.stdout.write(f"Places:        {len(index)}")
+        self.stdout.write(f"Keys:          {len(index.keys)}")
+        self.stdout.write(f"Build time:    {build_seconds * 1000:.1f} ms")
+        self.stdout.write(f"Index size:    {index.memory_bytes() / 1024:.1f} KiB")
+        self.stdout.write(f"Build peak:    {peak / 1024:.1f} KiB")
+        
+        exact = [f"{p['name']}, {p.get('admin1', '')}".strip(', ') for p in rng.choices(places, k=options['queries'])]
+        prefixes = [q[:max(3, len(q) // 2)] for q in exact]
+        typos = [self._typo(q, rng) for q in exact[:max(1, options['queries'] // 10)]]
+        
+        self._time('exact', index.lookup, exact)
+        self._time('prefix', index.prefix, prefixes)
+        self._time('fuzzy', index.fuzzy, typos)
+    
+    def _time(self, label, lookup, queries):
+        samples = []
+        for query in queries:
+            started = time.perf_counter()
+            lookup(query)
+            samples.append(time.perf_counter() - started)
+        samples.sort()
+        p50 = samples[len(samples) // 2] * 1e6
+        p99 = samples[int(len(samples) * 0.99)] * 1e6
+        self.stdout.write(f"{label:<8} n={len(samples):<6} p50={p50:8.1f} us  p99={p99:8.1f} us")
+    
+    def _synthetic_places(self, count, rng):
+        states = ['AL', 'AZ', 'CA', 'CO', 'FL', 'GA', 'IL', 'IN', 'KY', 'MI',
+                  'MO', 'NC', 'NY', 'OH', 'PA', 'TN', 'TX', 'VA', 'WA', 'WI']
+        places = []
+        for _ in range(count):
+            name = ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 12))).title()
+            if rng.random() < 0.2:
+                name += ' Terminal'
+            places.append({
+                'name': name,
+                'lat': rng.uniform(25, 49),
+                'lon': rng.uniform(-124, -67),
+                'admin1': rng.choice(states),
+                'country': 'US',
+                'population': rng.randint(0, 1_000_000),
+            })
+        return places
+    
+    def _typo(self, text, rng):
+        if len(text) < 4:
+            return text
+        i = rng.randrange(1, len(text) - 1)
+        return text[:i] + text[i + 1] + text[i] + text[i + 2:]
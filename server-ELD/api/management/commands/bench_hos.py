@@ -0,0 +1,93 @@
+# api/management/commands/bench_hos.py - Scheduling cost benchmark for the HOS engine
+
+import random
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from api.utils.hos_calculator import HOSCalculator
+from api.utils.polyline import route_polyline
+
+
+class Command(BaseCommand):
+    help = 'Benchmark HOS scheduling cost per simulated week on long multi-stop routes'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--miles', type=float, default=5000)
+        parser.add_argument('--stops', type=int, default=6, help='Segments per route')
+        parser.add_argument('--routes', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=7)
+        parser.add_argument('--duty-history', type=float, nargs='*', default=[],
+                            help="On-duty hours for the days before the trip, oldest first")
+        parser.add_argument('--split-sleeper', type=int, default=0, metavar='N',
+                            help='Also run the split sleeper-berth planner on the first N routes')
+    
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        routes = [self._route(options['miles'], options['stops'], rng) for _ in range(options['routes'])]
+        calculator = HOSCalculator(duty_history=options['duty_history'])
+        
+        best_schedule = best_convert = float('inf')
+        simulated_hours = stops = restarts = 0
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            scheduled = [calculator.schedule(segments) for segments, _ in routes]
+            best_schedule = min(best_schedule, time.perf_counter() - started)
+            
+            started = time.perf_counter()
+            for (segments, polyline), (records, _) in zip(routes, scheduled):
+                calculator.to_stop_dicts(records, segments, polyline, datetime(2024, 1, 1, 6))
+            best_convert = min(best_convert, time.perf_counter() - started)
+            
+            simulated_hours = sum(records[-1].end for records, _ in scheduled)
+            stops = sum(len(records) for records, _ in scheduled)
+            restarts = sum(state.restarts for _, state in scheduled)
+        
+        weeks = simulated_hours / 168
+        self.stdout.write(f"Routes:              {len(routes)} x {options['miles']:.0f} miles, {options['stops']} segments")
+        self.stdout.write(f"Simulated:           {weeks:.1f} driver-weeks, {stops} stops, {restarts} 34-hour restarts")
+        self.stdout.write(f"Schedule (records):  {best_schedule / len(routes) * 1e6:8.1f} us/route  "
+                          f"{best_schedule / weeks * 1e6:8.1f} us/simulated week")
+        self.stdout.write(f"Convert to dicts:    {best_convert / len(routes) * 1e6:8.1f} us/route  "
+                          f"{best_convert / weeks * 1e6:8.1f} us/simulated week")
+    
+        if options['split_sleeper']:
+            self._bench_planner(calculator, routes[:options['split_sleeper']])
+    
+    def _bench_planner(self, calculator, routes):
+        saved, improved, complete, cpu = [], 0, 0, []
+        for segments, _ in routes:
+            started = time.process_time()
+            plan = calculator.planner.plan(segments, calculator.initial_state())
+            cpu.append(time.process_time() - started)
+            saved.append(plan['baseline_state'].clock - plan['state'].clock)
+            improved += saved[-1] > 0.01
+            complete += not plan['timed_out']
+        
+        self.stdout.write(f"Split sleeper:       {len(routes)} routes, budget {calculator.planner.cpu_budget}s CPU")
+        self.stdout.write(f"  faster than baseline on {improved}, search complete on {complete}")
+        self.stdout.write(f"  hours saved: mean {sum(saved) / len(saved):.2f}  max {max(saved):.2f}")
+        self.stdout.write(f"  CPU per route: mean {sum(cpu) / len(cpu):.3f}s  max {max(cpu):.3f}s")
+    
+    def _route(self, miles, count, rng):
+        '''
+        Random split of `miles` into segments with 45-65 mph average speeds
+        '''
+        cuts = sorted(rng.uniform(0, miles) for _ in range(count - 1))
+        lengths = [b - a for a, b in zip([0.0] + cuts, cuts + [miles])]
+        
+        segments, lat, lon = [], 35.0, -120.0
+        for index, length in enumerate(lengths):
+            end_lat, end_lon = lat + rng.uniform(-1, 1), lon + length / 55.0
+            segments.append({
+                'start': f'Stop {index}', 'end': f'Stop {index + 1}',
+                'start_coords': {'lat': lat, 'lon': lon},
+                'end_coords': {'lat': end_lat, 'lon': end_lon},
+                'distance': length,
+                'duration_hours': length / rng.uniform(45, 65),
+                'stop_type': 'pickup' if index == 0 else 'dropoff',
+            })
+            lat, lon = end_lat, end_lon
+        return segments, route_polyline(segments)
@@ -0,0 +1,124 @@
+# api/management/commands/bench_log_storage.py - Storage size and read latency of LogSegment rows vs ELDLog.grid blobs
+
+import random
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from api.models import ELDLog, LogSegment, Trip
+from api.utils.log_grid import encode_segments, read_segments
+from api.utils.persistence import log_segment_rows
+
+LOCATIONS = ['Chicago, IL', 'Joliet, IL', 'Davenport, IA', 'Des Moines, IA', 'Omaha, NE',
+             'Lincoln, NE', 'North Platte, NE', 'Cheyenne, WY', 'Denver, CO', '']
+
+
+class Command(BaseCommand):
+    help = 'Compare storage size and read latency of row-stored and blob-stored daily logs (rolled back afterwards)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--logs', type=int, default=2000)
+        parser.add_argument('--segments', type=int, default=12, help='Duty-status changes per day')
+        parser.add_argument('--reads', type=int, default=200, help='Single-log reads to time per format')
+        parser.add_argument('--seed', type=int, default=7)
+    
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        days = [self._day(options['segments'], rng) for _ in range(options['logs'])]
+        
+        with transaction.atomic():
+            trip = Trip.objects.create(current_location='A', pickup_location='B', dropoff_location='C')
+            results = {}
+            for storage in ('rows', 'blob'):
+                before = self._table_bytes()
+                started = time.perf_counter()
+                ids = self._write(trip, days, storage)
+                write_seconds = time.perf_counter() - started
+                results[storage] = {
+                    'bytes': self._table_bytes() - before if before is not None else None,
+                    'write': write_seconds,
+                    'read_all': self._time_read_all(ids, storage),
+                    'read_one': self._time_read_one(ids, storage, options['reads'], rng),
+                }
+            transaction.set_rollback(True)
+        
+        payload = sum(len(encode_segments(day)) for day in days)
+        self.stdout.write(f"Logs:              {len(days)} days x {options['segments']} segments")
+        self.stdout.write(f"Grid payload:      {payload / len(days):8.1f} bytes/day")
+        self.stdout.write(f"{'':19}{'rows':>12}{'blob':>12}")
+        if results['rows']['bytes'] is not None:
+            self.stdout.write(f"{'Storage (B/day)':19}" + ''.join(
+                f"{results[storage]['bytes'] / len(days):12.1f}" for storage in ('rows', 'blob')))
+        else:
+            self.stdout.write('Storage:           n/a (page statistics need SQLite with dbstat)')
+        for key, label, scale, unit in (
+            ('write', 'Write', 1e3, 'ms'),
+            ('read_all', 'Read all', 1e3, 'ms'),
+            ('read_one', 'Read one', 1e6, 'us'),
+        ):
+            self.stdout.write(f"{label + ' (' + unit + ')':19}" + ''.join(
+                f"{results[storage][key] * scale:12.1f}" for storage in ('rows', 'blob')))
+    
+    def _day(self, count, rng):
+        '''
+        A fully covered day: `count` segments with random minute boundaries
+        '''
+        cuts = sorted(rng.sample(range(1, 24 * 60), count - 1))
+        bounds = [0] + cuts + [24 * 60]
+        status = rng.randrange(4)
+        segments = []
+        for start, end in zip(bounds, bounds[1:]):
+            status = (status + rng.randrange(1, 4)) % 4
+            segments.append({'status': status, 'start': start / 60, 'end': end / 60,
+                             'location': rng.choice(LOCATIONS)})
+        return segments
+    
+    def _write(self, trip, days, storage):
+        first = date(2024, 1, 1)
+        logs = ELDLog.objects.bulk_create([
+            ELDLog(trip=trip, log_date=first + timedelta(days=i), day_number=i + 1,
+                   grid=encode_segments(day) if storage == 'blob' else None)
+            for i, day in enumerate(days)
+        ])
+        if storage == 'rows':
+            LogSegment.objects.bulk_create([
+                row for log, day in zip(logs, days) for row in log_segment_rows(log, day)
+            ], batch_size=1000)
+        return [log.id for log in logs]
+    
+    def _logs(self, storage):
+        # Blob-stored logs need no join against LogSegment
+        logs = ELDLog.objects.all()
+        return logs.prefetch_related('segments') if storage == 'rows' else logs
+    
+    def _time_read_all(self, ids, storage):
+        started = time.perf_counter()
+        for log in self._logs(storage).filter(id__in=ids):
+            read_segments(log)
+        return time.perf_counter() - started
+    
+    def _time_read_one(self, ids, storage, reads, rng):
+        sample = [rng.choice(ids) for _ in range(reads)]
+        started = time.perf_counter()
+        for log_id in sample:
+            read_segments(self._logs(storage).get(id=log_id))
+        return (time.perf_counter() - started) / reads
+    
+    def _table_bytes(self):
+        '''
+        Bytes of SQLite pages used by the log tables and their indexes
+        '''
+        if connection.vendor != 'sqlite':
+            return None
+        with connection.cursor() as cursor:
+            try:
+                cursor.execute(
+                    "SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE name IN "
+                    "(SELECT name FROM sqlite_master WHERE tbl_name IN (%s, %s))",
+                    [ELDLog._meta.db_table, LogSegment._meta.db_table]
+                )
+            except Exception:
+                return None
+            return cursor.fetchone()[0]
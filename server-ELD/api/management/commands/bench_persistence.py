@@ -0,0 +1,84 @@
+# api/management/commands/bench_persistence.py - Write latency of per-row autocommit vs atomic bulk saves
+
+import io
+import statistics
+import time
+from contextlib import redirect_stdout
+from datetime import date, datetime, timezone
+
+from django.core.management.base import BaseCommand
+
+from api.models import ELDLog, LogSegment, Stop, Trip
+from api.utils.hos_calculator import HOSCalculator
+from api.utils.persistence import save_log, save_trip, stop_fields
+
+TRIP_FIELDS = {'current_location': 'Bench', 'pickup_location': 'Bench', 'dropoff_location': 'Bench'}
+
+
+class Command(BaseCommand):
+    help = 'Time saving a multi-day trip (and a daily log) row by row vs. with the atomic bulk persistence layer'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--stops', type=int, default=40)
+        parser.add_argument('--segments', type=int, default=12, help='Segments in the daily log')
+        parser.add_argument('--repeat', type=int, default=20)
+    
+    def handle(self, *args, **options):
+        stops = self._stops(options['stops'])
+        days = (stops[-1]['departure_time'] - stops[0]['arrival_time']).total_seconds() / 86400
+        segments = [{'status': i % 4, 'start': i * 24 / options['segments'], 'end': (i + 1) * 24 / options['segments'],
+                     'location': f"Stop {i}"} for i in range(options['segments'])]
+        
+        timings = {name: [] for name in ('trip_rows', 'trip_bulk', 'log_rows', 'log_bulk')}
+        self.trip_ids = []  # everything the benchmark created, and nothing else, is deleted afterwards
+        try:
+            for _ in range(options['repeat']):
+                timings['trip_rows'].append(self._time(self._trip_row_by_row, stops))
+                timings['trip_bulk'].append(self._time(lambda: save_trip(stops, **TRIP_FIELDS).id))
+                timings['log_rows'].append(self._time(self._log_row_by_row, segments))
+                timings['log_bulk'].append(self._time(
+                    lambda: save_log(TRIP_FIELDS, segments, storage='rows', log_date=date(2024, 1, 1), day_number=1).trip_id
+                ))
+        finally:
+            Trip.objects.filter(id__in=self.trip_ids).delete()
+        
+        self.stdout.write(f"Trip:   {len(stops)} stops over {days:.1f} days; log: {len(segments)} segments; "
+                          f"{options['repeat']} runs each (median)")
+        for label, rows, bulk in (('Trip + stops', 'trip_rows', 'trip_bulk'), ('Log + segments', 'log_rows', 'log_bulk')):
+            before, after = statistics.median(timings[rows]), statistics.median(timings[bulk])
+            self.stdout.write(f"{label:16} row by row {before * 1e3:8.1f} ms   atomic bulk {after * 1e3:8.1f} ms   "
+                              f"{before / after:5.1f}x")
+    
+    def _time(self, write, *args):
+        started = time.perf_counter()
+        self.trip_ids.append(write(*args))
+        return time.perf_counter() - started
+    
+    def _stops(self, count):
+        '''
+        The first `count` stops of a long straight route, as calculate-route schedules them
+        '''
+        segments = [
+            {'start': f"City {i}", 'end': f"City {i + 1}", 'distance': 900.0, 'duration_hours': 900 / 55,
+             'start_coords': {'lat': 40.0, 'lon': -120.0 + i * 3}, 'end_coords': {'lat': 40.0, 'lon': -117.0 + i * 3},
+             'stop_type': 'pickup' if i == 0 else 'dropoff'}
+            for i in range(count)
+        ]
+        with redirect_stdout(io.StringIO()):
+            timeline = HOSCalculator().calculate_stops({'segments': segments}, start_time=datetime(2024, 1, 1, 6, tzinfo=timezone.utc))
+        return timeline['stops'][:count]
+    
+    def _trip_row_by_row(self, stops):
+        # What the views did before: autocommit, one INSERT (and commit) per row
+        trip = Trip.objects.create(**TRIP_FIELDS)
+        for stop in stops:
+            Stop.objects.create(trip=trip, **stop_fields(stop))
+        return trip.id
+    
+    def _log_row_by_row(self, segments):
+        trip = Trip.objects.create(**TRIP_FIELDS)
+        log = ELDLog.objects.create(trip=trip, log_date=date(2024, 1, 1), day_number=1)
+        for segment in segments:
+            LogSegment.objects.create(log=log, status=segment['status'], start_time=segment['start'],
+                                      end_time=segment['end'], location=segment['location'])
+        return trip.id
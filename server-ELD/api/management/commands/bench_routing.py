@@ -0,0 +1,107 @@
+# api/management/commands/bench_routing.py - Query latency benchmark for the road graph
+
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from api.utils.distance import haversine_miles
+from api.utils.road_graph import HIGHWAY_SPEEDS, NoRoute, RoadGraph
+
+
+class Command(BaseCommand):
+    help = 'Benchmark bidirectional A* query latency on a road graph'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--graph', help='Graph directory (default: synthetic state-sized grid)')
+        parser.add_argument('--grid', type=int, default=500,
+                            help='Side of the synthetic grid when --graph is not given (500 = 250k nodes)')
+        parser.add_argument('--queries', type=int, default=100)
+        parser.add_argument('--seed', type=int, default=7)
+    
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        
+        started = time.perf_counter()
+        if options['graph']:
+            try:
+                graph = RoadGraph.load(options['graph'])
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"Could not load {options['graph']}: {e}")
+        else:
+            graph = self._synthetic_grid(options['grid'], rng)
+        load_seconds = time.perf_counter() - started
+        
+        self.stdout.write(f"Nodes:         {len(graph)}")
+        self.stdout.write(f"Edges:         {graph.edge_count}")
+        self.stdout.write(f"Graph size:    {graph.memory_bytes() / 1024 / 1024:.1f} MiB")
+        self.stdout.write(f"Load/build:    {load_seconds * 1000:.0f} ms")
+        
+        snaps, queries, settled, straight, failures = [], [], [], [], 0
+        for _ in range(options['queries']):
+            a, b = rng.randrange(len(graph)), rng.randrange(len(graph))
+            start = {'lat': float(graph.lat[a]) + rng.uniform(-0.01, 0.01), 'lon': float(graph.lon[a])}
+            end = {'lat': float(graph.lat[b]), 'lon': float(graph.lon[b]) + rng.uniform(-0.01, 0.01)}
+            
+            t0 = time.perf_counter()
+            graph.nearest_node(start['lat'], start['lon'])
+            snaps.append(time.perf_counter() - t0)
+            
+            t0 = time.perf_counter()
+            try:
+                result = graph.route(start, end)
+            except NoRoute:
+                failures += 1
+                continue
+            queries.append(time.perf_counter() - t0)
+            settled.append(result['settled'])
+            crow = haversine_miles(start['lat'], start['lon'], end['lat'], end['lon'])
+            if crow > 1:
+                straight.append(result['distance'] / crow)
+        
+        self._report('snap', snaps)
+        self._report('route', queries)
+        if settled:
+            self.stdout.write(f"Settled nodes: median {int(np.median(settled))}, max {max(settled)}")
+        if straight:
+            self.stdout.write(f"Road/straight: median {np.median(straight):.2f}")
+        if failures:
+            self.stdout.write(self.style.WARNING(f"{failures} queries had no route"))
+    
+    def _report(self, label, samples):
+        if not samples:
+            return
+        samples = sorted(samples)
+        p50 = samples[len(samples) // 2] * 1000
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000
+        self.stdout.write(f"{label:<8} n={len(samples):<6} p50={p50:8.2f} ms  p99={p99:8.2f} ms")
+    
+    def _synthetic_grid(self, side, rng):
+        '''
+        Jittered side x side street grid over roughly a 300 x 300 mile state,
+        with a motorway every 25 rows and columns and residential streets between
+        '''
+        lat0, lon0, step = 38.0, -92.0, 4.3 / side
+        lat = np.empty(side * side)
+        lon = np.empty(side * side)
+        for row in range(side):
+            for col in range(side):
+                lat[row * side + col] = lat0 + row * step + rng.uniform(-0.2, 0.2) * step
+                lon[row * side + col] = lon0 + col * step * 1.3 + rng.uniform(-0.2, 0.2) * step
+        
+        sources, targets, speeds = [], [], []
+        for row in range(side):
+            for col in range(side):
+                node = row * side + col
+                for other, major in ((node + 1, row % 25 == 0), (node + side, col % 25 == 0)):
+                    if (other == node + 1 and col + 1 == side) or other >= side * side:
+                        continue
+                    speed = HIGHWAY_SPEEDS['motorway' if major else 'residential']
+                    sources += [node, other]
+                    targets += [other, node]
+                    speeds += [speed, speed]
+        
+        sources, targets = np.array(sources), np.array(targets)
+        miles = haversine_miles(lat[sources], lon[sources], lat[targets], lon[targets])
+        return RoadGraph.build(lat, lon, sources, targets, miles, speeds)
@@ -0,0 +1,59 @@
+# api/management/commands/convert_log_storage.py - Move saved log segments between LogSegment rows and ELDLog.grid
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import ELDLog, LogSegment
+from api.utils.log_grid import STORAGE_FORMATS, decode_segments, encode_segments, read_segments
+from api.utils.persistence import log_segment_rows
+
+
+class Command(BaseCommand):
+    help = "Convert saved logs' segments to the 'blob' (ELDLog.grid) or 'rows' (LogSegment) storage format"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--to', choices=STORAGE_FORMATS, required=True)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--keep-rows', action='store_true',
+                            help='When converting to blobs, leave the LogSegment rows in place')
+    
+    def handle(self, *args, **options):
+        if options['to'] == 'blob':
+            pending = ELDLog.objects.filter(grid__isnull=True)
+        else:
+            pending = ELDLog.objects.filter(grid__isnull=False)
+        
+        converted = 0
+        last_id = 0
+        while True:
+            # Keyset batches, so each one is a short transaction and progress survives a restart
+            batch = list(pending.filter(id__gt=last_id).order_by('id').prefetch_related('segments')[:options['batch_size']])
+            if not batch:
+                break
+            with transaction.atomic():
+                if options['to'] == 'blob':
+                    self._to_blob(batch, options['keep_rows'])
+                else:
+                    self._to_rows(batch)
+            converted += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f"  {converted} logs converted")
+        
+        self.stdout.write(self.style.SUCCESS(f"Converted {converted} logs to '{options['to']}' storage"))
+    
+    def _to_blob(self, logs, keep_rows):
+        for log in logs:
+            log.grid = encode_segments(read_segments(log))
+        ELDLog.objects.bulk_update(logs, ['grid'])
+        if not keep_rows:
+            LogSegment.objects.filter(log__in=logs).delete()
+    
+    def _to_rows(self, logs):
+        # Rows kept by --keep-rows are replaced, so converting back never duplicates them
+        LogSegment.objects.filter(log__in=logs).delete()
+        LogSegment.objects.bulk_create([
+            row for log in logs for row in log_segment_rows(log, decode_segments(log.grid))
+        ])
+        for log in logs:
+            log.grid = None
+        ELDLog.objects.bulk_update(logs, ['grid'])
@@ -0,0 +1,44 @@
+# api/management/commands/geocode_batch.py - Bulk geocode a file of addresses
+
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.utils.batch_geocoder import BatchGeocoder, summarize
+
+
+class Command(BaseCommand):
+    help = 'Geocode one location per line from a file (or stdin), writing JSON lines as they resolve'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="Text file with one location per line, or '-' for stdin")
+        parser.add_argument('--output', help='Write JSON lines here instead of stdout')
+        parser.add_argument('--workers', type=int, help='OpenRouteService worker threads')
+    
+    def handle(self, *args, **options):
+        try:
+            handle = sys.stdin if options['input'] == '-' else open(options['input'], encoding='utf-8')
+        except OSError as e:
+            raise CommandError(f"Could not read {options['input']}: {e}")
+        with handle:
+            locations = [line.strip() for line in handle if line.strip()]
+        
+        if not locations:
+            raise CommandError('No locations to geocode')
+        
+        output = open(options['output'], 'w', encoding='utf-8') if options['output'] else self.stdout
+        lines, summary = summarize(BatchGeocoder(workers=options['workers']).run(locations))
+        try:
+            for line in lines:
+                output.write(json.dumps(line) + '\n')
+                output.flush()
+        finally:
+            if options['output']:
+                output.close()
+        
+        self.stderr.write(
+            f"{summary['total']} locations: {summary['ok']} resolved "
+            f"({summary['cached']} from cache/gazetteer), {summary['not_found']} not found, "
+            f"{summary['invalid']} invalid in {summary['seconds']}s"
+        )
@@ -0,0 +1,78 @@
+# api/management/commands/geocode_hit_rate.py - Replay trip locations to compare cache key strategies
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import Trip
+from api.utils.location_normalizer import FuzzyNameIndex, normalize_location
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay historical trip locations and report the geocode cache hit rate '
+        'with the old lower() key versus normalized keys plus fuzzy matching'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--file', help='Replay locations from a text file (one per line) instead of trips')
+        parser.add_argument('--threshold', type=float, default=0.8,
+                            help='Trigram similarity threshold for fuzzy matches')
+        parser.add_argument('--show-merges', action='store_true',
+                            help='Print every fuzzy match so they can be reviewed')
+    
+    def handle(self, *args, **options):
+        locations = self._locations(options['file'])
+        if not locations:
+            raise CommandError('No locations to replay')
+        
+        # Before: exact match on location_name.strip().lower()
+        seen = set()
+        before_hits = 0
+        for location in locations:
+            key = location.strip().lower()
+            if key in seen:
+                before_hits += 1
+            seen.add(key)
+        
+        # After: normalized key, then fuzzy match against resolved names
+        names = FuzzyNameIndex(threshold=options['threshold'])
+        exact_hits = fuzzy_hits = 0
+        for location in locations:
+            key = normalize_location(location)
+            target, score = names.match(key)
+            if target == key:
+                exact_hits += 1
+            elif target is not None:
+                fuzzy_hits += 1
+                if options['show_merges']:
+                    self.stdout.write(f"  {location!r} -> {target!r} ({score:.2f})")
+            else:
+                names.add(key)
+        
+        total = len(locations)
+        after_hits = exact_hits + fuzzy_hits
+        self.stdout.write(f"Lookups replayed:          {total}")
+        self.stdout.write(f"Distinct lower() keys:     {len(seen)}")
+        self.stdout.write(f"Distinct canonical names:  {len(names)}")
+        self.stdout.write(f"Hit rate before:           {before_hits / total:.1%} ({before_hits} hits)")
+        self.stdout.write(
+            f"Hit rate after:            {after_hits / total:.1%} "
+            f"({exact_hits} normalized + {fuzzy_hits} fuzzy)"
+        )
+    
+    def _locations(self, path):
+        if path:
+            try:
+                with open(path, encoding='utf-8') as handle:
+                    return [line.strip() for line in handle if line.strip()]
+            except OSError as e:
+                raise CommandError(f"Could not read {path}: {e}")
+        
+        locations = []
+        trips = Trip.objects.order_by('created_at').values_list(
+            'current_location', 'pickup_location', 'dropoff_location'
+        )
+        for current_location, pickup_location, dropoff_location in trips.iterator():
+            locations.extend(
+                name for name in (current_location, pickup_location, dropoff_location) if name
+            )
+        return locations
@@ -0,0 +1,53 @@
+# api/management/commands/simulate_fleet.py - Fleet-scale HOS what-if runs
+
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from api.utils.fleet_simulator import FleetSimulator
+from api.utils.hos_calculator import HOSCalculator
+
+
+class Command(BaseCommand):
+    help = 'Simulate HOS schedules for many random trips and print summary distributions'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--trips', type=int, default=50000)
+        parser.add_argument('--min-miles', type=float, default=100)
+        parser.add_argument('--max-miles', type=float, default=3000)
+        parser.add_argument('--max-cycle-hours', type=float, default=70)
+        parser.add_argument('--seed', type=int, default=7)
+    
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        n = options['trips']
+        trips = {
+            'pickup_miles': rng.uniform(0, 300, n),
+            'delivery_miles': rng.uniform(options['min_miles'], options['max_miles'], n),
+            'speed_mph': rng.uniform(45, 65, n),
+            # Whole minutes, so HOSCalculator sees exactly the same day boundaries
+            'start_hour': rng.integers(0, 24 * 60, n) / 60,
+            'cycle_hours': rng.uniform(0, options['max_cycle_hours'], n),
+        }
+        simulator = FleetSimulator(HOSCalculator().engine)
+        
+        started = time.perf_counter()
+        result = simulator.run(**trips)
+        elapsed = time.perf_counter() - started
+        
+        self.stdout.write(f"Simulated {n} trips in {elapsed:.2f}s ({n / elapsed:,.0f} trips/s)")
+        self.stdout.write(f"{'':18}{'p10':>8}{'p50':>8}{'p90':>8}{'p99':>8}{'max':>8}")
+        for label, values in (
+            ('Arrival (h)', result['arrival_hours']),
+            ('Total (h)', result['total_hours']),
+            ('Driving (h)', result['driving_hours']),
+            ('Duty (h)', result['duty_hours']),
+            ('Rests', result['rests']),
+            ('Breaks', result['breaks']),
+            ('Fuel stops', result['fuel_stops']),
+            ('Restarts', result['restarts']),
+        ):
+            p10, p50, p90, p99 = np.percentile(values, [10, 50, 90, 99])
+            self.stdout.write(f"{label:18}{p10:8.1f}{p50:8.1f}{p90:8.1f}{p99:8.1f}{values.max():8.1f}")
+        self.stdout.write(f"Trips needing a 34-hour restart: {np.mean(result['restarts'] > 0):.1%}")
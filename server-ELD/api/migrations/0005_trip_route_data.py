@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_geocodelease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='route_data',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
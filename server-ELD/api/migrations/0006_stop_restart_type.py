@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_trip_route_data'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stop',
+            name='stop_type',
+            field=models.CharField(choices=[('start', 'Start'), ('pickup', 'Pickup'), ('dropoff', 'Dropoff'), ('fuel', 'Fuel'), ('rest', 'Rest'), ('restart', 'Restart'), ('break', 'Break')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_stop_restart_type'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stop',
+            name='stop_type',
+            field=models.CharField(choices=[('start', 'Start'), ('pickup', 'Pickup'), ('dropoff', 'Dropoff'), ('fuel', 'Fuel'), ('rest', 'Rest'), ('restart', 'Restart'), ('sleeper', 'Sleeper Berth'), ('break', 'Break')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_stop_sleeper_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eldlog',
+            name='grid',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_eldlog_grid'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='eldlog',
+            index=models.Index(fields=['log_date', 'id'], name='eldlog_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eldlog',
+            index=models.Index(fields=['driver_name', 'log_date', 'id'], name='eldlog_driver_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eldlog',
+            index=models.Index(fields=['carrier_name', 'log_date', 'id'], name='eldlog_carrier_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eldlog',
+            index=models.Index(fields=['vehicle_number', 'log_date', 'id'], name='eldlog_vehicle_date_id_idx'),
+        ),
+    ]
@@ -13,6 +13,8 @@ class Trip(models.Model):
     total_duration_hours = models.FloatField(null=True, blank=True)
     driving_hours = models.FloatField(null=True, blank=True)
     rest_hours = models.FloatField(null=True, blank=True)
+    # Segments with geometry plus the stop timeline, for map positions (see utils/polyline.py)
+    route_data = models.JSONField(null=True, blank=True)
     
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True)
@@ -32,6 +34,8 @@ class Stop(models.Model):
         ('dropoff', 'Dropoff'),
         ('fuel', 'Fuel'),
         ('rest', 'Rest'),
+        ('restart', 'Restart'),
+        ('sleeper', 'Sleeper Berth'),
         ('break', 'Break'),
     ]
     
@@ -78,9 +82,18 @@ class ELDLog(models.Model):
     on_duty_hours = models.FloatField(default=0)
     
     remarks = models.TextField(blank=True)
+    # Run-length encoded segments (see utils/log_grid.py); when set, used instead of LogSegment rows
+    grid = models.BinaryField(null=True, blank=True)
     
     class Meta:
         ordering = ['log_date']
+        # Keyset pages of /api/v2/driver-logs/ walk (log_date, id), optionally within one driver, carrier or vehicle
+        indexes = [
+            models.Index(fields=['log_date', 'id'], name='eldlog_date_id_idx'),
+            models.Index(fields=['driver_name', 'log_date', 'id'], name='eldlog_driver_date_id_idx'),
+            models.Index(fields=['carrier_name', 'log_date', 'id'], name='eldlog_carrier_date_id_idx'),
+            models.Index(fields=['vehicle_number', 'log_date', 'id'], name='eldlog_vehicle_date_id_idx'),
+        ]
     
     def __str__(self):
         return f"Log Day {self.day_number} - {self.log_date}"
@@ -104,3 +117,43 @@ class LogSegment(models.Model):
     
     def __str__(self):
         return f"{self.get_status_display()}: {self.start_time} - {self.end_time}"
+
+
+class GeocodeCacheEntry(models.Model):
+    # Normalized lookup key (see GeocodingService.geocode)
+    key = models.CharField(max_length=255, unique=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    source = models.CharField(max_length=50, blank=True)
+    
+    # found=False records a negative result so failed lookups aren't retried on every request
+    found = models.BooleanField(default=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        if not self.found:
+            return f"{self.key}: not found"
+        return f"{self.key}: ({self.latitude}, {self.longitude})"
+
+
+class GeocodeLease(models.Model):
+    # Held by the worker currently resolving `key`, so other workers wait for its result
+    key = models.CharField(max_length=255, unique=True)
+    owner = models.CharField(max_length=100)
+    expires_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"{self.key} leased by {self.owner}"
+
+
+class GeocodeVersion(models.Model):
+    # Bumped when `key` is invalidated so every worker drops plans and copies built on the old
+    # coordinates; the empty key versions the whole cache
+    key = models.CharField(max_length=255, unique=True)
+    version = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.key or '*'} v{self.version}"
@@ -1,19 +1,91 @@
 # api/serializers.py - DRF serializers for API data
 
+from datetime import time
+
+from django.conf import settings
 from rest_framework import serializers
 from .models import Trip, Stop, ELDLog, LogSegment
+from .utils.keyset import decode_cursor
+from .utils.log_grid import read_segments
 
 
 
 class TripInputSerializer(serializers.Serializer):
     origin = serializers.CharField(max_length=255)        
     destination = serializers.CharField(max_length=255)   
-    waypoints = serializers.ListField(required=False)      
+    # waypoints[0] is the pickup; any further waypoints are deliveries before the destination
+    waypoints = serializers.ListField(
+        child=serializers.CharField(max_length=255), required=False,
+        max_length=getattr(settings, 'ROUTE_MAX_WAYPOINTS', 25)
+    )
+    optimize_stops = serializers.BooleanField(required=False, default=False)
+    # Search 7/3 and 8/2 split sleeper-berth rests for a faster schedule
+    split_sleeper = serializers.BooleanField(required=False, default=False)
     current_cycle_hours = serializers.FloatField(min_value=0, max_value=70, required=False, default=0)
+    # On-duty hours for each of the last 7 days, oldest first; replaces current_cycle_hours
+    duty_history = serializers.ListField(
+        child=serializers.FloatField(min_value=0, max_value=24), required=False, max_length=7
+    )
     driver_name = serializers.CharField(max_length=255, required=False)
     carrier_name = serializers.CharField(max_length=255, required=False)
 
 
+class StartTimeSweepSerializer(TripInputSerializer):
+    split_sleeper = None
+    # Start times: earliest_start today, then every step_minutes for sweep_hours
+    earliest_start = serializers.TimeField(required=False, default=time(0, 0))
+    sweep_hours = serializers.FloatField(min_value=0, max_value=168, required=False, default=24)
+    step_minutes = serializers.IntegerField(min_value=5, max_value=24 * 60, required=False, default=30)
+    # Optional daily receiving hours the final dropoff must arrive within
+    receiving_window_start = serializers.TimeField(required=False)
+    receiving_window_end = serializers.TimeField(required=False)
+    # Skip starts whose last rest stop is closer than this to the dropoff
+    min_rest_distance_miles = serializers.FloatField(min_value=0, required=False, default=0)
+    
+    @staticmethod
+    def start_count(data):
+        return int(data['sweep_hours'] * 60 // data['step_minutes']) + 1
+    
+    def validate(self, data):
+        if ('receiving_window_start' in data) != ('receiving_window_end' in data):
+            raise serializers.ValidationError('Give both receiving_window_start and receiving_window_end, or neither.')
+        limit = getattr(settings, 'START_TIME_SWEEP_MAX_STARTS', 1000)
+        if self.start_count(data) > limit:
+            raise serializers.ValidationError(f"At most {limit} start times per sweep.")
+        return data
+
+
+class QuoteQuerySerializer(serializers.Serializer):
+    miles = serializers.FloatField(min_value=0, max_value=getattr(settings, 'QUOTE_MAX_MILES', 10000))
+    # Whole numbers only, so a handful of precomputed tables serve every quote
+    cycle_hours = serializers.IntegerField(min_value=0, max_value=70, required=False, default=0)
+    speed_mph = serializers.IntegerField(min_value=30, max_value=80, required=False, default=55)
+
+
+class TripReplanSerializer(serializers.Serializer):
+    current_time = serializers.DateTimeField()
+    # Where the truck is: a route mile, or [lat, lon] snapped onto the current leg
+    route_mile = serializers.FloatField(min_value=0, required=False)
+    coordinates = serializers.ListField(
+        child=serializers.FloatField(), min_length=2, max_length=2, required=False
+    )
+    # HOS clocks at current_time; the defaults are a driver fresh off a 10-hour rest
+    driving_hours = serializers.FloatField(min_value=0, max_value=11, required=False, default=0)
+    window_hours = serializers.FloatField(min_value=0, max_value=14, required=False, default=0)
+    since_break_hours = serializers.FloatField(min_value=0, max_value=8, required=False, default=0)
+    fuel_miles = serializers.FloatField(min_value=0, required=False, default=0)
+    cycle_hours = serializers.FloatField(min_value=0, max_value=70, required=False, default=0)
+    
+    def validate(self, data):
+        if ('route_mile' in data) == ('coordinates' in data):
+            raise serializers.ValidationError('Give either route_mile or coordinates.')
+        if 'coordinates' in data:
+            lat, lon = data['coordinates']
+            if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                raise serializers.ValidationError({'coordinates': 'Coordinates out of range.'})
+        return data
+
+
 class LogSegmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = LogSegment
@@ -21,7 +93,7 @@ class LogSegmentSerializer(serializers.ModelSerializer):
 
 
 class ELDLogSerializer(serializers.ModelSerializer):
-    segments = LogSegmentSerializer(many=True, read_only=True)
+    segments = serializers.SerializerMethodField()
     summary = serializers.SerializerMethodField()
     
     class Meta:
@@ -31,6 +103,15 @@ class ELDLogSerializer(serializers.ModelSerializer):
             'total_miles', 'segments', 'summary', 'remarks'
         ]
     
+    def get_segments(self, obj):
+        # Rows or grid blob, in the LogSegmentSerializer shape
+        return [{
+            'status': segment['status'],
+            'start_time': segment['start'],
+            'end_time': segment['end'],
+            'location': segment['location'],
+        } for segment in read_segments(obj)]
+    
     def get_summary(self, obj):
         return {
             'offDuty': obj.off_duty_hours,
@@ -63,17 +144,93 @@ class StopSerializer(serializers.ModelSerializer):
     
 
 
+class SaveLogSegmentSerializer(serializers.Serializer):
+    status = serializers.IntegerField(min_value=0, max_value=3)
+    start = serializers.FloatField(min_value=0, max_value=24)
+    end = serializers.FloatField(min_value=0, max_value=24)
+    location = serializers.CharField(max_length=255, required=False, allow_blank=True, default='')
+    
+    def validate(self, data):
+        if data['end'] < data['start']:
+            raise serializers.ValidationError('end must not be before start.')
+        return data
+
+
 class SaveLogSerializer(serializers.Serializer):
     date = serializers.CharField()
-    segments = serializers.ListField()
-    totalMiles = serializers.FloatField()
-    summary = serializers.DictField()
-    tripData = serializers.DictField()
+    segments = SaveLogSegmentSerializer(many=True)
+    totalMiles = serializers.FloatField(required=False, default=0)
+    # Ignored: the hours are recomputed from the segments
+    summary = serializers.DictField(required=False)
+    tripData = serializers.DictField(required=False)
     remarks = serializers.CharField(required=False, allow_blank=True)
     driver = serializers.CharField(required=False)
     carrier = serializers.CharField(required=False)    
 
 
+class DriverLogsQuerySerializer(serializers.Serializer):
+    driver = serializers.CharField(required=False)
+    carrier = serializers.CharField(required=False)
+    vehicle = serializers.CharField(required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=getattr(settings, 'DRIVER_LOGS_MAX_PAGE_SIZE', 200),
+                                     required=False, default=getattr(settings, 'DRIVER_LOGS_PAGE_SIZE', 50))
+    cursor = serializers.CharField(required=False)
+    
+    def validate_cursor(self, value):
+        try:
+            return decode_cursor(value)
+        except ValueError:
+            raise serializers.ValidationError('Invalid cursor.')
+    
+    def validate(self, data):
+        if 'date_from' in data and 'date_to' in data and data['date_to'] < data['date_from']:
+            raise serializers.ValidationError('date_to must not be before date_from.')
+        return data
+
+
+class BatchGeocodeSerializer(serializers.Serializer):
+    locations = serializers.ListField(
+        child=serializers.CharField(max_length=255, allow_blank=True),
+        allow_empty=False
+    )
+    
+    def validate_locations(self, value):
+        limit = getattr(settings, 'GEOCODE_BATCH_MAX_LOCATIONS', 10000)
+        if len(value) > limit:
+            raise serializers.ValidationError(f"At most {limit} locations per batch.")
+        return value
+
+
+class DistanceMatrixSerializer(serializers.Serializer):
+    # Each point is a location name, a [lat, lon] pair or a {"lat": .., "lon": ..} object
+    origins = serializers.ListField(child=serializers.JSONField(), allow_empty=False)
+    destinations = serializers.ListField(child=serializers.JSONField(), required=False, allow_empty=False)
+    
+    def validate(self, data):
+        origins = data['origins']
+        destinations = data.get('destinations', origins)
+        limit = getattr(settings, 'DISTANCE_MATRIX_MAX_CELLS', 250000)
+        if len(origins) * len(destinations) > limit:
+            raise serializers.ValidationError(f"At most {limit} origin/destination pairs per request.")
+        
+        for field in ('origins', 'destinations'):
+            for point in data.get(field, []):
+                if isinstance(point, str):
+                    if not point.strip():
+                        raise serializers.ValidationError({field: 'Location names cannot be blank.'})
+                    continue
+                try:
+                    lat, lon = (point['lat'], point['lon']) if isinstance(point, dict) else point
+                    lat, lon = float(lat), float(lon)
+                except (KeyError, TypeError, ValueError):
+                    raise serializers.ValidationError({field: f"Invalid point: {point!r}"})
+                if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                    raise serializers.ValidationError({field: f"Coordinates out of range: {point!r}"})
+        return data
+
+
 class RouteResponseSerializer(serializers.Serializer):
     totalDistance = serializers.FloatField()
     totalDuration = serializers.CharField()
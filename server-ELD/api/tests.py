@@ -0,0 +1,713 @@
+# api/tests.py - API and planner regression tests
+
+import io
+import random
+import threading
+import time
+from contextlib import redirect_stdout
+from datetime import date, datetime, timedelta
+from unittest import mock
+
+import numpy as np
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import ELDLog, GeocodeLease, LogSegment, Trip
+from .utils.batch_geocoder import BatchGeocoder, summarize
+from .utils.cache import MISSING
+from .utils.duty_bitmap import DutyDay
+from .utils.fleet_simulator import FleetSimulator
+from .utils.geocode_cache import GeocodeCache
+from .utils.geocoding import GeocodingService, _abandoned
+from .utils.geocoding_providers import GeocodingProvider, ProviderUnavailable
+from .utils.hos_calculator import HOSCalculator
+from .utils.hos_engine import EPSILON, CycleTracker, HOSEngine, HOSState, StopRecord
+from .utils.keyset import logs_before
+from .utils.location_normalizer import FuzzyNameIndex, normalize_location
+from .utils.log_generator import LogGenerator
+from .utils.log_grid import decode_segments, encode_segments, read_segments
+from .utils.persistence import log_segment_rows, save_log
+from .utils.quick_quote import QUOTE_HOURS_TOLERANCE, calculated_quote, get_quote_table
+from .utils.rate_limit import RateLimitExceeded
+from .utils.replanner import stop_points
+from .utils.road_graph import DEFAULT_SPEED_MPH, HIGHWAY_SPEEDS, edge_speed_mph
+from .utils.route_plan_cache import RoutePlanCache
+from .utils.sleeper_planner import SleeperPlanner, SplitState
+
+PLACES = {'Chicago, IL': (41.88, -87.63), 'Denver, CO': (39.74, -104.99), 'Seattle, WA': (47.6, -122.33)}
+
+
+def fake_geocode_many(self, names, deadline=None, concurrent=True):
+    return {name: {'lat': PLACES[name][0], 'lon': PLACES[name][1], 'source': 'test'} for name in names}
+
+
+class TripReplanTests(TestCase):
+    CLOCKS = {'driving_hours': 2, 'window_hours': 3, 'since_break_hours': 2, 'fuel_miles': 120, 'cycle_hours': 30}
+    
+    def setUp(self):
+        self.client = APIClient(SERVER_NAME='localhost')
+        with mock.patch.object(GeocodingService, 'geocode_many', fake_geocode_many), redirect_stdout(io.StringIO()):
+            response = self.client.post('/api/calculate-route/', {
+                'origin': 'Chicago, IL', 'waypoints': ['Denver, CO'], 'destination': 'Seattle, WA'
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.trip = Trip.objects.latest('id')
+    
+    def replan(self, now, route_mile):
+        with redirect_stdout(io.StringIO()):
+            response = self.client.post(f"/api/trips/{self.trip.id}/replan/", dict(
+                self.CLOCKS, current_time=now.isoformat(), route_mile=route_mile
+            ), format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.trip.refresh_from_db()
+        return response.data, list(self.trip.stops.order_by('order'))
+    
+    def assertTimelineMatchesStops(self, rows):
+        timeline, points = self.trip.route_data['timeline'], stop_points(self.trip.route_data)
+        self.assertEqual(len(points), len(rows))
+        for row, point in zip(rows, points):
+            self.assertAlmostEqual(timeline['seconds'][point], (row.arrival_time - rows[0].arrival_time).total_seconds(),
+                                   delta=1)
+    
+    def test_replans_in_a_row_keep_only_passed_stops(self):
+        rows = list(self.trip.stops.order_by('order'))
+        # Running late: still at mile 100 two hours after the first break was due to end
+        data, rows = self.replan(rows[1].departure_time + timedelta(hours=2), 100)
+        self.assertEqual(data['keptStops'], 1)
+        self.assertTimelineMatchesStops(rows)
+        
+        # Still late on the next update: past the new break's departure time but not its mile
+        break_mile = self.trip.route_data['timeline']['miles'][stop_points(self.trip.route_data)[1]]
+        self.assertGreater(break_mile, 300)
+        data, rows = self.replan(rows[1].departure_time + timedelta(minutes=5), 300)
+        self.assertEqual(data['keptStops'], 1)
+        self.assertTimelineMatchesStops(rows)
+        miles = self.trip.route_data['timeline']['miles']
+        self.assertEqual(miles, sorted(miles))
+        self.assertIn(300, miles)
+
+
+class SleeperPlannerWindowTests(SimpleTestCase):
+    def setUp(self):
+        self.planner = SleeperPlanner(HOSEngine())
+        self.node = SplitState.from_state(HOSState(), (StopRecord('start', 0.0, 0.0, 0.0, 0, 0.0), None))
+    
+    def sleep(self, length):
+        self.assertTrue(self.planner._split_rest(self.node, length))
+    
+    def test_abandoned_period_counts_against_window(self):
+        node = self.node
+        node.drive(8, 440)
+        self.sleep(3)
+        node.drive(1, 55)
+        node.on_duty(0.5)
+        # 2 hours does not pair with 3, so the 3-hour period is back in the window
+        self.sleep(2)
+        self.assertAlmostEqual(node.window, 8 + 3 + 1.5)
+        self.assertAlmostEqual(node.strict_window, 8 + 3 + 1.5 + 2)
+        
+        # The planner may only drive until the window (still leaving out the 2 hours) runs out
+        allowance = self.planner.engine.max_window - node.window
+        self.assertAlmostEqual(allowance, 1.5)
+        node.drive(allowance, allowance * 55)
+        self.assertGreaterEqual(node.window, self.planner.engine.max_window - EPSILON)
+        
+        # Pairing the 2 hours with 8 restarts the clocks from the end of the 2 hours
+        self.sleep(8)
+        self.assertAlmostEqual(node.window, allowance)
+        self.assertIsNone(node.strict_window)
+
+
+def split_rule_violations(records, pairs):
+    '''
+    Replay StopRecords and list (limit, time, hours) wherever driving passes
+    11 hours, the window 14 hours or driving 8 hours without a 30-minute
+    break. Consecutive sleeper periods with no full rest between them that
+    satisfy `pairs` restart the clocks from the end of the first; a first
+    period that gets paired is left out of the window.
+    '''
+    intervals, clock = [], records[0].start
+    for record in records:
+        if record.start > clock + EPSILON:
+            intervals.append(('drive', clock, record.start))
+        intervals.append((record.kind, record.start, record.end))
+        clock = max(clock, record.end)
+    
+    periods = [index for index, (kind, _, _) in enumerate(intervals) if kind == 'sleeper']
+    partner = {}  # second period -> first
+    for first, second in zip(periods, periods[1:]):
+        rested = any(kind in ('rest', 'restart') for kind, _, _ in intervals[first + 1:second])
+        if not rested and pairs(intervals[first][2] - intervals[first][1], intervals[second][2] - intervals[second][1]):
+            partner[second] = first
+    paired_first = set(partner.values())
+    
+    violations = []
+    anchor, excluded, driving, since_period, since_break = intervals[0][1], 0.0, 0.0, 0.0, 0.0
+    for index, (kind, start, end) in enumerate(intervals):
+        length = end - start
+        if kind == 'drive':
+            driving += length
+            since_period += length
+            since_break += length
+            for limit, hours, allowed in (('11-hour', driving, 11), ('14-hour', end - anchor - excluded, 14),
+                                          ('break', since_break, 8)):
+                if hours > allowed + 1e-6:
+                    violations.append((limit, round(end, 2), round(hours, 2)))
+            continue
+        
+        if length >= 0.5 - EPSILON:
+            since_break = 0.0
+        if kind in ('rest', 'restart'):
+            anchor, excluded, driving = end, 0.0, 0.0
+        elif kind == 'sleeper':
+            if index in partner:
+                anchor, excluded, driving = intervals[partner[index]][2], length, since_period
+            elif index in paired_first:
+                excluded += length
+            since_period = 0.0
+    return violations
+
+
+class SleeperPlannerPlanTests(SimpleTestCase):
+    SEGMENTS = [{'distance': miles, 'duration_hours': miles / 55, 'stop_type': stop_type}
+                for miles, stop_type in ((100, 'pickup'), (800, 'dropoff'), (900, 'dropoff'), (700, 'dropoff'))]
+    
+    def test_long_route_plan_is_compliant_and_no_slower(self):
+        calculator = HOSCalculator()
+        plan = calculator.planner.plan(self.SEGMENTS, calculator.initial_state(datetime(2026, 10, 17, 6)))
+        pairs = calculator.planner.pairs
+        
+        self.assertEqual(split_rule_violations(plan['records'], pairs), [])
+        self.assertEqual(split_rule_violations(plan['baseline_records'], pairs), [])
+        self.assertLessEqual(plan['state'].clock, plan['baseline_state'].clock)
+        self.assertAlmostEqual(plan['records'][-1].route_mile, 2500)
+        
+        # The replay does catch a schedule that skips a rest
+        rest = next(index for index, record in enumerate(plan['records']) if record.kind in ('rest', 'sleeper'))
+        self.assertNotEqual(split_rule_violations(plan['records'][:rest] + plan['records'][rest + 1:], pairs), [])
+
+
+class SaveLogTests(TestCase):
+    # A zero-length segment sharing a start minute with a real one, after it in input order
+    SEGMENTS = [{'status': 0, 'start': 0, 'end': 6}, {'status': 2, 'start': 6, 'end': 10},
+                {'status': 3, 'start': 6, 'end': 6}, {'status': 0, 'start': 10, 'end': 24}]
+    
+    def test_empty_segment_does_not_hide_a_real_one(self):
+        day = DutyDay.from_segments(self.SEGMENTS)
+        self.assertEqual(day.gaps(), [])
+        self.assertEqual(day.empty, [(2, 360)])
+        self.assertEqual(day.totals(), {'offDuty': 20.0, 'sleeper': 0.0, 'driving': 4.0, 'onDuty': 0.0})
+    
+    def test_save_log_warns_about_empty_segment(self):
+        client = APIClient(SERVER_NAME='localhost')
+        with redirect_stdout(io.StringIO()):
+            response = client.post('/api/save-log/', {'date': '10/17/2026', 'segments': self.SEGMENTS}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['summary']['driving'], 4.0)
+        self.assertEqual(response.data['warnings'], ['Segment 3 at 06:00 is shorter than a minute; ignored'])
+
+
+class CountingLimiter:
+    def __init__(self, exhausted=False):
+        self.calls = 0
+        self.exhausted = exhausted
+    
+    def acquire(self, max_wait):
+        self.calls += 1
+        if self.exhausted:
+            raise RateLimitExceeded('no token within max_wait')
+
+
+class GeocodingProviderTests(SimpleTestCase):
+    def provider(self, limiter):
+        provider = GeocodingProvider(failure_threshold=1, reset_timeout=30, limiter=limiter, max_wait=5)
+        provider.name = 'test'
+        return provider
+    
+    def test_open_circuit_does_not_take_a_token(self):
+        limiter = CountingLimiter()
+        provider = self.provider(limiter)
+        provider.breaker.record_failure()
+        with self.assertRaisesMessage(ProviderUnavailable, 'circuit open'):
+            provider.lookup('Chicago, IL')
+        self.assertEqual(limiter.calls, 0)
+    
+    def test_rate_limited_trial_call_is_given_back(self):
+        provider = self.provider(CountingLimiter(exhausted=True))
+        provider.breaker.record_failure()
+        provider.breaker.opened_at -= provider.breaker.reset_timeout
+        with self.assertRaisesMessage(ProviderUnavailable, 'rate limited'):
+            provider.lookup('Chicago, IL')
+        # The trial was never made, so the next call may still make it
+        self.assertTrue(provider.breaker.allow())
+    
+    def test_unexpected_error_ends_the_trial_call(self):
+        response = mock.Mock(status_code=200, json=mock.Mock(return_value={}))
+        for failing in ({'_request': mock.Mock(side_effect=RuntimeError('bug'))},
+                        {'_request': mock.Mock(return_value=response), '_parse': mock.Mock(side_effect=AttributeError('bug'))}):
+            with self.subTest(failing=sorted(failing)):
+                provider = self.provider(CountingLimiter())
+                provider.breaker.record_failure()
+                provider.breaker.opened_at -= provider.breaker.reset_timeout
+                with mock.patch.multiple(provider, **failing), redirect_stdout(io.StringIO()), \
+                        self.assertRaisesMessage(Exception, 'bug'):
+                    provider.lookup('Chicago, IL')
+                self.assertEqual(provider.breaker.state, provider.breaker.OPEN)
+                self.assertEqual(provider.stats.counts['failures'], 1)
+
+
+class EdgeSpeedTests(SimpleTestCase):
+    def test_maxspeed_units(self):
+        # OSM speeds without a unit are km/h
+        self.assertAlmostEqual(edge_speed_mph('primary', '80'), 49.7, places=1)
+        self.assertAlmostEqual(edge_speed_mph('motorway', '130'), 80.8, places=1)
+        self.assertAlmostEqual(edge_speed_mph('primary', '80 km/h'), 49.7, places=1)
+        self.assertAlmostEqual(edge_speed_mph('primary', '50;70'), 31.1, places=1)
+        self.assertEqual(edge_speed_mph('motorway', '65 mph'), 65)
+        self.assertEqual(edge_speed_mph('motorway', '65mph'), 65)
+    
+    def test_unusable_maxspeed_falls_back_to_highway_default(self):
+        self.assertEqual(edge_speed_mph('motorway', 'signals'), HIGHWAY_SPEEDS['motorway'])
+        self.assertEqual(edge_speed_mph('trunk', '0'), HIGHWAY_SPEEDS['trunk'])
+        self.assertEqual(edge_speed_mph('footway', ''), DEFAULT_SPEED_MPH)
+
+
+class DriverLogsTests(TestCase):
+    DRIVERS = ['A. Driver', 'B. Driver', 'C. Driver']
+    CARRIERS = ['Acme Freight', 'Blue Line']
+    VEHICLES = ['T-100', 'T-200', 'T-300', '']
+    SEGMENTS = [{'status': 0, 'start': 0.0, 'end': 6.0, 'location': 'Yard'},
+                {'status': 2, 'start': 6.0, 'end': 17.0, 'location': ''},
+                {'status': 1, 'start': 17.0, 'end': 24.0, 'location': 'Truck stop'}]
+    
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(7)
+        trips = [Trip.objects.create(current_location='A', pickup_location='B', dropoff_location='C')
+                 for _ in range(30)]
+        # Few distinct dates, so many logs share one and the id tiebreak matters; half are blob-stored
+        logs = ELDLog.objects.bulk_create([
+            ELDLog(trip=rng.choice(trips), log_date=date(2024, 1, 1) + timedelta(days=rng.randrange(90)),
+                   day_number=1, driver_name=rng.choice(cls.DRIVERS), carrier_name=rng.choice(cls.CARRIERS),
+                   vehicle_number=rng.choice(cls.VEHICLES), grid=encode_segments(cls.SEGMENTS) if i % 2 else None)
+            for i in range(300)
+        ])
+        LogSegment.objects.bulk_create([
+            row for log in logs if log.grid is None for row in log_segment_rows(log, cls.SEGMENTS)
+        ])
+    
+    def setUp(self):
+        self.client = APIClient(SERVER_NAME='localhost')
+    
+    def test_v1_query_count_does_not_grow_with_logs(self):
+        # Logs with their trips, then their segments
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/driver-logs/')
+        self.assertEqual(len(response.data), 300)
+    
+    def test_v2_query_count_does_not_grow_with_page_size(self):
+        for limit in (1, 10, 200):
+            with self.subTest(limit=limit), self.assertNumQueries(2):
+                response = self.client.get('/api/v2/driver-logs/', {'limit': limit})
+            self.assertEqual(len(response.data['results']), limit)
+    
+    def test_v2_pages_match_unpaginated_query(self):
+        for filters in ({}, {'driver': self.DRIVERS[0]}, {'carrier': self.CARRIERS[1], 'vehicle': self.VEHICLES[0]},
+                        {'date_from': '2024-02-01', 'date_to': '2024-03-15'}):
+            with self.subTest(filters=filters):
+                expected = ELDLog.objects.all()
+                for param, field in (('driver', 'driver_name'), ('carrier', 'carrier_name'),
+                                     ('vehicle', 'vehicle_number')):
+                    if param in filters:
+                        expected = expected.filter(**{field: filters[param]})
+                if 'date_from' in filters:
+                    expected = expected.filter(log_date__gte=filters['date_from'], log_date__lte=filters['date_to'])
+                expected = list(expected.order_by('-log_date', '-id').values_list('id', flat=True))
+                
+                seen, cursor = [], None
+                for _ in range(len(expected) + 1):
+                    params = dict(filters, limit=17, **({'cursor': cursor} if cursor else {}))
+                    with self.assertNumQueries(2):
+                        response = self.client.get('/api/v2/driver-logs/', params)
+                    seen += [log['id'] for log in response.data['results']]
+                    cursor = response.data['nextCursor']
+                    if not cursor:
+                        break
+                self.assertEqual(seen, expected)
+    
+    def test_v2_rejects_bad_input(self):
+        for params in ({'cursor': 'zzz'}, {'limit': 0}, {'date_from': '2024-02-01', 'date_to': '2024-01-01'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/api/v2/driver-logs/', params).status_code, 400)
+    
+    def test_later_driver_page_uses_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('query plan check is SQLite-specific')
+        logs = logs_before(ELDLog.objects.filter(driver_name=self.DRIVERS[0]), (date(2024, 2, 15), 10 ** 9))
+        sql, params = logs.order_by('-log_date', '-id')[:50].query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('USING INDEX eldlog_driver_date_id_idx', plan)
+
+
+class QuickQuoteParityTests(SimpleTestCase):
+    COUNTS = ('rests', 'breaks', 'fuel_stops', 'restarts')
+    
+    def test_quotes_match_calculate_stops(self):
+        rng = random.Random(7)
+        for _ in range(2000):
+            speed, cycle_hours = rng.choice([45, 55, 60, 65]), rng.choice([0, 0, 20, 45, 60, 69])
+            table = get_quote_table(speed, cycle_hours)
+            miles = rng.uniform(0, 6000)
+            if rng.random() < 0.3 and len(table.miles):
+                # Land right on an event, where an off-by-one would show
+                miles = min(6000.0, max(0.0, float(rng.choice(table.miles)) + rng.choice([-1e-3, 0.0, 1e-3])))
+            
+            quote, expected = table.quote(miles), calculated_quote(miles, speed, cycle_hours)
+            with self.subTest(miles=miles, speed=speed, cycle_hours=cycle_hours):
+                self.assertAlmostEqual(quote['total_hours'], expected['total_hours'], delta=QUOTE_HOURS_TOLERANCE)
+                self.assertEqual({key: quote[key] for key in self.COUNTS}, {key: expected[key] for key in self.COUNTS})
+
+
+class HangingProvider:
+    limiter = None
+    max_wait = None
+    
+    def __init__(self, name, release, timeout=0.2):
+        self.name = name
+        self.release = release
+        self.timeout = timeout
+    
+    def hedge_delay(self, default=2.0, minimum=0.25):
+        return 0.05
+    
+    def lookup(self, location_name):
+        self.release.wait(10)
+        return None
+
+
+class GeocodingDeadlineTests(SimpleTestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        self.service = GeocodingService()
+    
+    def test_hung_providers_do_not_hold_the_lookup(self):
+        self.service.providers = [HangingProvider('primary', self.release), HangingProvider('fallback', self.release)]
+        started = time.monotonic()
+        with redirect_stdout(io.StringIO()):
+            result = self.service._lookup_hedged('Chicago, IL')
+        self.assertEqual(result, (None, False))
+        self.assertLess(time.monotonic() - started, 1)
+    
+    def test_running_lookups_past_the_deadline_stay_counted(self):
+        self.service.geocode = lambda name: self.release.wait(10)
+        # Lookups abandoned by other tests may still be winding down, so count relative to them
+        before = _abandoned.count
+        with redirect_stdout(io.StringIO()):
+            results = self.service.geocode_many(['Chicago, IL', 'Denver, CO'], deadline=0.05)
+        self.assertEqual(results, {'Chicago, IL': None, 'Denver, CO': None})
+        self.assertEqual(_abandoned.count, before + 2)
+        
+        self.release.set()
+        for _ in range(100):
+            if _abandoned.count <= before:
+                break
+            time.sleep(0.01)
+        self.assertLessEqual(_abandoned.count, before)
+
+
+def calculate_trip(pickup_miles, delivery_miles, speed, start_hour, cycle_hours):
+    '''
+    One FleetSimulator trip scheduled through HOSCalculator.calculate_stops, in the simulator's result keys
+    '''
+    segments = [
+        {'start': 'Current', 'end': 'Pickup', 'distance': pickup_miles, 'duration_hours': pickup_miles / speed,
+         'start_coords': {'lat': 40.0, 'lon': -100.0}, 'end_coords': {'lat': 40.0, 'lon': -99.0},
+         'stop_type': 'pickup'},
+        {'start': 'Pickup', 'end': 'Dropoff', 'distance': delivery_miles, 'duration_hours': delivery_miles / speed,
+         'start_coords': {'lat': 40.0, 'lon': -99.0}, 'end_coords': {'lat': 40.0, 'lon': -90.0},
+         'stop_type': 'dropoff'},
+    ]
+    start_time = datetime(2024, 1, 1) + timedelta(minutes=round(start_hour * 60))
+    with redirect_stdout(io.StringIO()):
+        timeline = HOSCalculator(current_cycle_hours=cycle_hours).calculate_stops(
+            {'segments': segments}, start_time=start_time
+        )
+    
+    stops = timeline['stops']
+    hours = lambda moment: (moment - start_time).total_seconds() / 3600
+    count = lambda kind: sum(1 for stop in stops if stop['type'] == kind)
+    on_duty = sum(stop['duration_hours'] for stop in stops if stop['type'] in ('pickup', 'dropoff', 'fuel', 'break'))
+    driving = hours(stops[-1]['departure_time']) - sum(stop['duration_hours'] for stop in stops)
+    return {
+        'arrival_hours': hours(stops[-1]['arrival_time']),
+        'total_hours': hours(stops[-1]['departure_time']),
+        'driving_hours': driving,
+        'duty_hours': driving + on_duty,
+        'rests': count('rest'),
+        'breaks': count('break'),
+        'fuel_stops': count('fuel'),
+        'restarts': count('restart'),
+    }
+
+
+class FleetSimulatorParityTests(SimpleTestCase):
+    def test_simulated_trips_match_calculate_stops(self):
+        rng = np.random.default_rng(7)
+        n = 1000
+        trips = {
+            'pickup_miles': rng.uniform(0, 300, n),
+            'delivery_miles': rng.uniform(100, 3000, n),
+            'speed_mph': rng.uniform(45, 65, n),
+            # Whole minutes, so HOSCalculator sees exactly the same day boundaries
+            'start_hour': rng.integers(0, 24 * 60, n) / 60,
+            'cycle_hours': rng.uniform(0, 70, n),
+        }
+        result = FleetSimulator(HOSCalculator().engine).run(**trips)
+        
+        for i in rng.choice(n, size=150, replace=False).tolist():
+            expected = calculate_trip(*(trips[key][i] for key in
+                                        ('pickup_miles', 'delivery_miles', 'speed_mph', 'start_hour', 'cycle_hours')))
+            with self.subTest(trip=i):
+                for key, value in expected.items():
+                    self.assertAlmostEqual(float(result[key][i]), value, delta=1e-6, msg=key)
+
+
+class FuzzyNameIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = FuzzyNameIndex(threshold=0.8)
+        for name in ('500 W Madison St, Chicago, IL', 'Oklahoma City, OK', 'North Platte, NE',
+                     '100 Main St Apt B, Springfield, IL'):
+            self.index.add(normalize_location(name))
+    
+    def match(self, name):
+        return self.index.match(normalize_location(name))[0]
+    
+    def test_spelling_variant_matches(self):
+        self.assertEqual(self.match('Oaklahoma City, OK'), normalize_location('Oklahoma City, OK'))
+        self.assertEqual(self.match('500 W Madisn St, Chicago, IL'), normalize_location('500 W Madison St, Chicago, IL'))
+    
+    def test_other_side_of_the_street_does_not_match(self):
+        self.assertIsNone(self.match('500 E Madison St, Chicago, IL'))
+        self.assertIsNone(self.match('South Platte, NE'))
+        self.assertIsNone(self.match('100 Main St Apt C, Springfield, IL'))
+
+
+class CountingProvider:
+    def __init__(self, delay=0.0, result=None):
+        self.delay = delay
+        self.result = result
+        self.calls = 0
+    
+    def lookup(self, location_name, max_wait=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self.result
+
+
+class BatchGeocoderTests(SimpleTestCase):
+    def setUp(self):
+        self.primary = CountingProvider(delay=0.01)
+        self.fallback = CountingProvider(delay=0.01)
+        self.service = mock.Mock(providers=[self.primary, self.fallback], local_provider=None)
+        self.service.cache.get.return_value = MISSING
+        self.locations = [f"Town {i}, KS" for i in range(200)]
+    
+    def workers(self):
+        return [thread for thread in threading.enumerate() if thread.name.startswith('batch-geocode')]
+    
+    def test_closing_the_stream_stops_the_workers(self):
+        lines, _ = summarize(BatchGeocoder(service=self.service, workers=2).run(self.locations))
+        with redirect_stdout(io.StringIO()):
+            next(lines)
+            lines.close()
+            for thread in self.workers():
+                thread.join(2)
+        self.assertEqual(self.workers(), [])
+        self.assertLess(self.primary.calls + self.fallback.calls, 20)
+    
+    def test_fallback_stops_looking_up_after_the_deadline(self):
+        geocoder = BatchGeocoder(service=self.service, workers=4, fallback_deadline=0.001)
+        with redirect_stdout(io.StringIO()):
+            lines = list(geocoder.run(self.locations[:20]))
+        self.assertEqual([line['status'] for line in lines], ['not_found'] * 20)
+        self.assertEqual(self.primary.calls, 20)
+        self.assertEqual(self.fallback.calls, 0)
+        self.service.cache.set.assert_not_called()
+
+
+class GeocodeInvalidationTests(TestCase):
+    def test_invalidation_reaches_other_workers(self):
+        worker, other = GeocodeCache(fuzzy_threshold=None), GeocodeCache(fuzzy_threshold=None)
+        key = normalize_location('Chicago, IL')
+        with redirect_stdout(io.StringIO()):
+            other.set(key, {'lat': 41.88, 'lon': -87.63, 'source': 'test'})
+            before = other.location_versions(['Denver, CO', 'Chicago, IL'])
+            worker.invalidate(key)
+            after = other.location_versions(['Denver, CO', 'Chicago, IL'])
+        
+        self.assertNotEqual(
+            RoutePlanCache.lane_key('v1', ['Denver, CO', 'Chicago, IL'], versions=before),
+            RoutePlanCache.lane_key('v1', ['Denver, CO', 'Chicago, IL'], versions=after),
+        )
+        self.assertEqual(before[:2], after[:2])
+        self.assertIs(other.memory.get(key), MISSING)
+        self.assertIs(other.get(key), MISSING)
+
+
+class LogGridTests(TestCase):
+    # Uncovered gaps (UNSET runs) at 06:00-06:30 and 11:00-12:00, repeated locations, one non-ASCII
+    SEGMENTS = [
+        {'status': 0, 'start': 0.0, 'end': 6.0, 'location': 'Chicago, IL'},
+        {'status': 2, 'start': 6.5, 'end': 10.25, 'location': 'Joliet, IL'},
+        {'status': 3, 'start': 10.25, 'end': 11.0, 'location': 'Joliet, IL'},
+        {'status': 2, 'start': 12.0, 'end': 18.0, 'location': 'Chicago, IL'},
+        {'status': 1, 'start': 18.0, 'end': 24.0, 'location': 'Montréal, QC'},
+    ]
+    
+    def test_round_trip(self):
+        blob = encode_segments(self.SEGMENTS)
+        self.assertEqual(decode_segments(blob), self.SEGMENTS)
+        self.assertEqual(blob.count('Chicago, IL'.encode('utf-8')), 1)
+        self.assertEqual(decode_segments(encode_segments([])), [])
+    
+    def test_convert_log_storage_round_trip(self):
+        logs = [
+            save_log({'current_location': 'Chicago, IL'}, self.SEGMENTS, storage='rows',
+                     log_date=date(2026, 10, day), day_number=day)
+            for day in (1, 2, 3)
+        ]
+        rows = LogSegment.objects.count()
+        
+        for options in ({}, {'keep_rows': True}):
+            with self.subTest(**options):
+                call_command('convert_log_storage', to='blob', stdout=io.StringIO(), **options)
+                self.assertFalse(ELDLog.objects.filter(grid__isnull=True).exists())
+                self.assertEqual(LogSegment.objects.count(), rows if options else 0)
+                
+                call_command('convert_log_storage', to='rows', stdout=io.StringIO())
+                self.assertEqual(LogSegment.objects.count(), rows)
+                for log in ELDLog.objects.filter(id__in=[log.id for log in logs]):
+                    self.assertIsNone(log.grid)
+                    self.assertEqual(read_segments(log), self.SEGMENTS)
+
+
+class DailyLogTests(SimpleTestCase):
+    def test_multi_day_logs_split_at_midnight(self):
+        segments = [
+            {'start': 'Chicago, IL', 'end': 'Joliet, IL', 'distance': 45.0, 'duration_hours': 45 / 55,
+             'start_coords': {'lat': 41.88, 'lon': -87.63}, 'end_coords': {'lat': 41.53, 'lon': -88.08},
+             'stop_type': 'pickup'},
+            {'start': 'Joliet, IL', 'end': 'Seattle, WA', 'distance': 2050.0, 'duration_hours': 2050 / 55,
+             'start_coords': {'lat': 41.53, 'lon': -88.08}, 'end_coords': {'lat': 47.6, 'lon': -122.33},
+             'stop_type': 'dropoff'},
+        ]
+        with redirect_stdout(io.StringIO()):
+            timeline = HOSCalculator().calculate_stops({'segments': segments}, start_time=datetime(2026, 10, 17, 22, 30))
+        logs = list(LogGenerator().generate_logs(timeline))
+        
+        self.assertGreaterEqual(len(logs), 4)
+        for log in logs:
+            with self.subTest(day=log['day_number']):
+                # Each key is rounded to 0.1h on its own
+                self.assertAlmostEqual(sum(log['summary'].values()), 24.0, delta=0.2)
+                self.assertEqual(log['segments'][0]['start'], 0)
+                self.assertEqual(log['segments'][-1]['end'], 24)
+                for previous, segment in zip(log['segments'], log['segments'][1:]):
+                    self.assertEqual(segment['start'], previous['end'])
+        self.assertAlmostEqual(sum(log['total_miles'] for log in logs), 2095.0, delta=0.05 * len(logs))
+
+
+class CycleTrackerTests(SimpleTestCase):
+    def test_hours_roll_off_on_day_nine(self):
+        cycle = CycleTracker()
+        cycle.add(6, 10)
+        self.assertEqual(cycle.used_at(7 * 24 + 23), 10)
+        self.assertEqual(cycle.used_at(8 * 24), 0)
+    
+    def test_history_rolls_off_oldest_first(self):
+        cycle = CycleTracker(history=[1, 2, 3, 4, 5, 6, 7])
+        self.assertEqual(cycle.used_at(0), 28)
+        self.assertEqual(cycle.used_at(24), 27)
+        self.assertEqual(cycle.used_at(2 * 24), 25)
+    
+    def test_add_splits_at_midnight(self):
+        # Clock 0 is 20:00, so 2h of the 5 fall before midnight
+        cycle = CycleTracker(day_start=20)
+        cycle.add(2, 5)
+        self.assertEqual(list(cycle.totals)[-2:], [2, 3])
+        self.assertEqual(cycle.used_at(8 * 24 - 20), 3)
+    
+    def test_restart_when_the_cycle_runs_out(self):
+        segments = [
+            {'distance': 50.0, 'duration_hours': 1.0, 'stop_type': 'pickup'},
+            {'distance': 2000.0, 'duration_hours': 2000 / 55, 'stop_type': 'dropoff'},
+        ]
+        calculator = HOSCalculator(current_cycle_hours=65)
+        records, state = calculator.schedule(segments, datetime(2026, 10, 17, 6))
+        restarts = [record for record in records if record.kind == 'restart']
+        self.assertEqual(len(restarts), state.restarts)
+        self.assertGreaterEqual(state.restarts, 1)
+        self.assertEqual(restarts[0].duration, HOSCalculator.RESTART_HOURS)
+        
+        # Replay the schedule: on-duty time never takes the cycle past 70 hours
+        cycle = CycleTracker(history=[65], day_start=6)
+        for previous, record in zip(records, records[1:]):
+            cycle.add(previous.end, record.start - previous.end)  # driving
+            if record.kind == 'restart':
+                cycle.restart(record.end)
+            elif record.kind in ('pickup', 'dropoff', 'fuel', 'break'):
+                cycle.add(record.start, record.duration)
+            self.assertLessEqual(cycle.used_at(record.end), 70 + EPSILON, record)
+
+
+class CycleRestartResponseTests(TestCase):
+    TRIP = {'origin': 'Chicago, IL', 'waypoints': ['Denver, CO'], 'destination': 'Seattle, WA'}
+    
+    def setUp(self):
+        self.client = APIClient(SERVER_NAME='localhost')
+    
+    def test_calculate_route_reports_restarts(self):
+        with mock.patch.object(GeocodingService, 'geocode_many', fake_geocode_many), redirect_stdout(io.StringIO()):
+            response = self.client.post('/api/calculate-route/', dict(self.TRIP, current_cycle_hours=69), format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertGreaterEqual(response.data['cycleRestarts'], 1)
+        self.assertEqual(response.data['cycleRestarts'], [stop['type'] for stop in response.data['stops']].count('restart'))
+    
+    def test_duty_history_reaches_the_calculator(self):
+        with mock.patch.object(GeocodingService, 'geocode_many', fake_geocode_many), \
+                mock.patch('api.views.HOSCalculator', wraps=HOSCalculator) as calculator, redirect_stdout(io.StringIO()):
+            response = self.client.post('/api/calculate-route/', dict(self.TRIP, current_cycle_hours=0, duty_history=[10] * 7),
+                                        format='json')
+            self.assertEqual(response.status_code, 200, response.data)
+            self.assertEqual(calculator.call_args.kwargs['duty_history'], [10.0] * 7)
+            
+            for history in ([1] * 8, [25]):
+                with self.subTest(duty_history=history):
+                    response = self.client.post('/api/calculate-route/', dict(self.TRIP, duty_history=history), format='json')
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn('duty_history', response.data['details'])
+
+
+class GeocodeLeaseTests(TestCase):
+    def setUp(self):
+        self.cache = GeocodeCache(fuzzy_threshold=None)
+        now = timezone.now()
+        for key, expires_at in (('denver co', now - timedelta(minutes=5)), ('seattle wa', now - timedelta(seconds=1)),
+                                ('chicago il', now + timedelta(minutes=1))):
+            GeocodeLease.objects.create(key=key, owner='gone', expires_at=expires_at)
+    
+    def test_acquiring_a_lease_clears_expired_ones(self):
+        self.assertTrue(self.cache.acquire_lease('joliet il', 'worker'))
+        self.assertFalse(self.cache.acquire_lease('chicago il', 'worker'))
+        self.assertEqual(set(GeocodeLease.objects.values_list('key', flat=True)), {'chicago il', 'joliet il'})
+    
+    def test_purge_expired_includes_leases(self):
+        self.assertEqual(self.cache.purge_expired(), 2)
+        self.assertEqual(list(GeocodeLease.objects.values_list('key', flat=True)), ['chicago il'])
@@ -5,15 +5,27 @@ from . import views
 urlpatterns = [
     # Route calculation
     path('calculate-route/', views.CalculateRouteView.as_view(), name='calculate-route'),
+    path('calculate-route/sweep/', views.StartTimeSweepView.as_view(), name='start-time-sweep'),
+    
+    path('quote/', views.QuickQuoteView.as_view(), name='quick-quote'),
+    
+    path('distance-matrix/', views.DistanceMatrixView.as_view(), name='distance-matrix'),
     
     # Log management - THESE WERE MISSING!
     path('save-log/', views.SaveLogView.as_view(), name='save-log'),
     path('driver-logs/', views.DriverLogsView.as_view(), name='driver-logs'),
+    path('v2/driver-logs/', views.DriverLogsV2View.as_view(), name='driver-logs-v2'),
     path('today-mileage/', views.TodayMileageView.as_view(), name='today-mileage'),
     
     # Trip management
     path('trips/', views.TripListView.as_view(), name='trip-list'),
     path('trips/<int:pk>/', views.TripDetailView.as_view(), name='trip-detail'),
+    path('trips/<int:pk>/position/', views.TripPositionView.as_view(), name='trip-position'),
+    path('trips/<int:pk>/replan/', views.TripReplanView.as_view(), name='trip-replan'),
+    
+    # Geocoding diagnostics
+    path('geocoding-stats/', views.GeocodingStatsView.as_view(), name='geocoding-stats'),
+    path('geocode/batch/', views.BatchGeocodeView.as_view(), name='geocode-batch'),
     
     path('download-logs-pdf/', views.DownloadLogsPDFView.as_view(), name='download_logs_pdf'),
 ]
\ No newline at end of file
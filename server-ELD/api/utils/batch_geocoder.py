@@ -0,0 +1,201 @@
+# api/utils/batch_geocoder.py - Bulk geocoding with deduplication and per-provider rate limits
+
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from .cache import MISSING
+from .geocoding import GeocodingService
+from .geocoding_providers import ProviderUnavailable
+from .location_normalizer import normalize_location
+
+_DONE = object()
+
+
+class BatchGeocoder:
+    '''
+    Geocode thousands of location strings in one pass.
+    
+    Inputs are deduplicated on their normalized key, then checked against the
+    gazetteer and the geocode cache. Only the remaining misses go to the
+    network: a pool of OpenRouteService workers drains the miss queue as fast
+    as its rate limit allows, and anything it cannot resolve is handed to a
+    single Nominatim worker. Both are paced by the providers' shared token
+    buckets, queueing for up to max_wait seconds per call rather than being
+    rejected. Results are yielded as soon as each key resolves.
+    
+    Closing the generator (a client dropping the stream) stops both workers
+    before their next lookup, and the fallback worker gives up on whatever
+    is still queued once fallback_deadline seconds have passed, so an
+    abandoned or oversized batch cannot keep spending provider quota.
+    '''
+    
+    def __init__(self, service=None, workers=None, max_wait=None, fallback_deadline=None):
+        self.service = service or GeocodingService()
+        self.workers = workers or getattr(settings, 'GEOCODE_BATCH_WORKERS', 4)
+        self.max_wait = max_wait or getattr(settings, 'GEOCODE_BATCH_MAX_WAIT', 300)
+        self.fallback_deadline = fallback_deadline or getattr(settings, 'GEOCODE_BATCH_FALLBACK_DEADLINE', 600)
+        self.primary, self.fallback = self.service.providers[0], self.service.providers[1]
+    
+    def run(self, locations):
+        '''
+        Yield one dict per input location, in resolution order:
+        {'index', 'query', 'status', 'lat', 'lon', 'source', 'cached'}
+        where status is 'ok', 'not_found' or 'invalid'
+        '''
+        groups = {}  # key -> input positions sharing it
+        for index, location in enumerate(locations):
+            key = normalize_location(location) if isinstance(location, str) else ''
+            if not key:
+                yield self._line(index, location, None, status='invalid')
+                continue
+            groups.setdefault(key, []).append(index)
+        
+        misses = []
+        for key, indexes in groups.items():
+            name = locations[indexes[0]]
+            result = self._resolve_offline(name, key)
+            if result is MISSING:
+                misses.append((key, name))
+                continue
+            for index in indexes:
+                yield self._line(index, locations[index], result, cached=True)
+        
+        if not misses:
+            return
+        
+        schedule = self._schedule(misses)
+        try:
+            for key, result in schedule:
+                for index in groups[key]:
+                    yield self._line(index, locations[index], result, cached=False)
+        finally:
+            schedule.close()
+    
+    def _resolve_offline(self, name, key):
+        if self.service.local_provider is not None:
+            local = self.service.local_provider.lookup(name)
+            if local:
+                return local
+        return self.service.cache.get(key)
+    
+    def _schedule(self, misses):
+        '''
+        Run misses through the provider workers and yield (key, result) pairs
+        '''
+        stop = threading.Event()
+        deadline = time.monotonic() + self.fallback_deadline
+        results = queue.Queue()
+        primary_queue = queue.Queue()
+        fallback_queue = queue.Queue()
+        for item in misses:
+            primary_queue.put(item)
+        
+        pending = {'count': len(misses)}
+        pending_lock = threading.Lock()
+        
+        def finish(key, result, answered):
+            if result or answered:
+                self.service.cache.set(key, result)
+            results.put((key, result))
+            with pending_lock:
+                pending['count'] -= 1
+                if pending['count'] == 0:
+                    fallback_queue.put(_DONE)
+        
+        def primary_worker():
+            try:
+                while not stop.is_set():
+                    try:
+                        key, name = primary_queue.get_nowait()
+                    except queue.Empty:
+                        return
+                    try:
+                        result = self.primary.lookup(name, max_wait=self.max_wait)
+                    except Exception as e:
+                        # Includes ProviderUnavailable; the fallback gets a go either way
+                        if not isinstance(e, ProviderUnavailable):
+                            print(f"❌ Batch geocode error for {name}: {e}")
+                        result = None
+                    if result:
+                        finish(key, result, True)
+                    else:
+                        fallback_queue.put((key, name))
+            finally:
+                connections.close_all()
+        
+        def fallback_worker():
+            try:
+                while True:
+                    item = fallback_queue.get()
+                    if item is _DONE or stop.is_set():
+                        return
+                    key, name = item
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        finish(key, None, False)
+                        continue
+                    try:
+                        result = self.fallback.lookup(name, max_wait=min(self.max_wait, remaining))
+                    except Exception as e:
+                        if not isinstance(e, ProviderUnavailable):
+                            print(f"❌ Batch geocode error for {name}: {e}")
+                        finish(key, None, False)
+                    else:
+                        finish(key, result, True)
+            finally:
+                connections.close_all()
+        
+        threads = [
+            threading.Thread(target=primary_worker, name=f'batch-geocode-{i}', daemon=True)
+            for i in range(min(self.workers, len(misses)))
+        ]
+        threads.append(threading.Thread(target=fallback_worker, name='batch-geocode-fallback', daemon=True))
+        for thread in threads:
+            thread.start()
+        
+        try:
+            for _ in range(len(misses)):
+                yield results.get()
+        finally:
+            stop.set()
+            fallback_queue.put(_DONE)  # wake the fallback worker if it is idle
+    
+    def _line(self, index, query, result, status=None, cached=False):
+        if status is None:
+            status = 'ok' if result else 'not_found'
+        line = {'index': index, 'query': query, 'status': status}
+        if result:
+            line.update({
+                'lat': result['lat'],
+                'lon': result['lon'],
+                'source': result.get('source', ''),
+                'cached': cached,
+            })
+        return line
+
+
+def summarize(lines):
+    '''
+    Pass lines through while counting statuses; the counts end up in the
+    returned dict once the generator is exhausted
+    '''
+    summary = {'total': 0, 'ok': 0, 'not_found': 0, 'invalid': 0, 'cached': 0}
+    started = time.monotonic()
+    
+    def counted():
+        try:
+            for line in lines:
+                summary['total'] += 1
+                summary[line['status']] += 1
+                if line.get('cached'):
+                    summary['cached'] += 1
+                yield line
+        finally:
+            lines.close()
+        summary['seconds'] = round(time.monotonic() - started, 2)
+    
+    return counted(), summary
@@ -0,0 +1,79 @@
+# api/utils/cache.py - In-process LRU cache with per-entry TTL
+
+import threading
+import time
+from collections import OrderedDict
+
+# Returned by LRUCache.get on a miss, so a cached None can be told apart from no entry
+MISSING = object()
+
+
+class LRUCache:
+    '''
+    Thread-safe, size-bounded LRU cache with an optional TTL per entry
+    '''
+    
+    def __init__(self, max_entries=1024, default_ttl=None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._data = OrderedDict()  # key -> (expires_at or None, value)
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key, default=MISSING):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            
+            expires_at, value = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.default_ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+    
+    def delete(self, key):
+        with self._lock:
+            return self._data.pop(key, None) is not None
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def keys(self):
+        with self._lock:
+            return list(self._data.keys())
+    
+    def __len__(self):
+        return len(self._data)
+    
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+        }
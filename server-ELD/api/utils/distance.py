@@ -0,0 +1,46 @@
+# api/utils/distance.py - Vectorized great-circle distances
+
+import numpy as np
+
+EARTH_RADIUS_MILES = 3958.8
+
+
+def haversine_miles(lat1, lon1, lat2, lon2):
+    '''
+    Great-circle distance in miles. Accepts scalars or NumPy arrays, which
+    are broadcast against each other; returns a float for scalar input.
+    '''
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    # arcsin(sqrt(a)) == atan2(sqrt(a), sqrt(1-a)) for a in [0, 1]; clip guards rounding
+    miles = 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    
+    return float(miles) if miles.ndim == 0 else miles
+
+
+def as_lat_lon_array(points):
+    '''
+    Convert points given as (lat, lon) pairs or {'lat', 'lon'} dicts to an
+    (N, 2) float array
+    '''
+    if isinstance(points, np.ndarray):
+        return points.reshape(-1, 2).astype(np.float64, copy=False)
+    return np.array(
+        [(p['lat'], p['lon']) if isinstance(p, dict) else (p[0], p[1]) for p in points],
+        dtype=np.float64
+    ).reshape(-1, 2)
+
+
+def distance_matrix(origins, destinations=None):
+    '''
+    N x M matrix of great-circle miles between every origin and destination
+    (N x N between the origins when destinations is None), in one pass
+    '''
+    origins = as_lat_lon_array(origins)
+    destinations = origins if destinations is None else as_lat_lon_array(destinations)
+    
+    return haversine_miles(
+        origins[:, 0][:, None], origins[:, 1][:, None],
+        destinations[:, 0][None, :], destinations[:, 1][None, :]
+    )
@@ -0,0 +1,118 @@
+# api/utils/duty_bitmap.py - Minute-resolution duty status for one log day
+
+import numpy as np
+
+from .log_generator import OFF_DUTY, SUMMARY_KEYS
+
+MINUTES_PER_DAY = 24 * 60
+# Slot value for minutes no segment covers
+UNSET = 255
+
+
+def format_minute(minute):
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def _runs(mask):
+    '''
+    (start, end) minute pairs of the True runs in a boolean array
+    '''
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.view(np.int8), [0]))))
+    return list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+
+class DutyDay:
+    '''
+    A day's duty statuses as 1440 uint8 slots, one per minute: 0 off duty,
+    1 sleeper berth, 2 driving, 3 on duty, or UNSET where no segment says.
+    
+    Segment times are rounded to the nearest minute. Building the slots,
+    totals, gap and overlap detection and the conversion back to merged
+    segments are all array operations, with no per-minute Python loop.
+    '''
+    
+    def __init__(self, slots, owner, locations, overlaps=(), empty=()):
+        self.slots = slots          # duty status per minute
+        self.owner = owner          # index into locations of the segment covering each minute, -1 for none
+        self.locations = locations
+        self.overlaps = list(overlaps)
+        self.empty = list(empty)    # (index, start minute) of segments shorter than a minute, which were ignored
+    
+    @classmethod
+    def from_segments(cls, segments):
+        '''
+        Build from segment dicts with status, start and end (hours, 0 - 24)
+        and an optional location. Minutes claimed by more than one segment
+        are listed in .overlaps as (start, end) minute pairs; segments that
+        round to no minutes are left out and listed in .empty.
+        '''
+        count = len(segments)
+        status = np.fromiter((segment['status'] for segment in segments), dtype=np.uint8, count=count)
+        start, end = (
+            np.clip(np.rint(np.fromiter((segment[key] for segment in segments), dtype=np.float64, count=count) * 60),
+                    0, MINUTES_PER_DAY).astype(np.int64)
+            for key in ('start', 'end')
+        )
+        locations = [segment.get('location') or '' for segment in segments]
+        
+        # Segments covering each minute: +1 where one starts, -1 where it ends
+        edges = np.bincount(start, minlength=MINUTES_PER_DAY + 1) - np.bincount(end, minlength=MINUTES_PER_DAY + 1)
+        coverage = np.cumsum(edges[:-1])
+        
+        # Without overlaps each minute belongs to the last segment starting at or before it.
+        # Empty segments are not ranked, or one sharing a start minute could take over a real segment's minutes.
+        nonempty = np.flatnonzero(end > start)
+        owner = np.full(MINUTES_PER_DAY, -1, dtype=np.int64)
+        if len(nonempty):
+            order = nonempty[np.argsort(start[nonempty], kind='stable')]
+            minute = np.arange(MINUTES_PER_DAY)
+            latest = np.searchsorted(start[order], minute, side='right') - 1
+            candidate = order[np.maximum(latest, 0)]
+            inside = (latest >= 0) & (minute < end[candidate])
+            owner[inside] = candidate[inside]
+        covered = owner >= 0
+        
+        slots = np.full(MINUTES_PER_DAY, UNSET, dtype=np.uint8)
+        slots[covered] = status[owner[covered]]
+        empty = [(index, int(start[index])) for index in np.flatnonzero(end <= start).tolist()]
+        return cls(slots, owner, locations, _runs(coverage > 1), empty)
+    
+    def gaps(self):
+        '''
+        (start, end) minute pairs with no duty status
+        '''
+        return _runs(self.slots == UNSET)
+    
+    def fill_gaps(self, status=OFF_DUTY):
+        '''
+        Give every unset minute `status`; returns the gaps that were filled
+        '''
+        gaps = self.gaps()
+        self.slots[self.slots == UNSET] = status
+        return gaps
+    
+    def totals(self):
+        '''
+        Hours in each status, keyed like a log summary
+        '''
+        minutes = np.bincount(self.slots[self.slots != UNSET], minlength=len(SUMMARY_KEYS))
+        return {key: round(minutes[status] / 60, 2) for status, key in enumerate(SUMMARY_KEYS)}
+    
+    def to_segments(self):
+        '''
+        Segments in hours, one per run of the same status (adjacent segments
+        with equal status are merged, keeping the first one's location).
+        Unset minutes are left out.
+        '''
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(self.slots)) + 1))
+        ends = np.append(starts[1:], MINUTES_PER_DAY)
+        keep = self.slots[starts] != UNSET
+        starts, ends = starts[keep], ends[keep]
+        owners = self.owner[starts]
+        return [{
+            'status': int(status),
+            'start': start / 60,
+            'end': end / 60,
+            'location': self.locations[owner] if owner >= 0 else ''
+        } for status, start, end, owner in zip(self.slots[starts].tolist(), starts.tolist(),
+                                               ends.tolist(), owners.tolist())]
@@ -0,0 +1,177 @@
+# api/utils/fleet_simulator.py - Vectorized HOS what-if runs over many trips at once
+
+import numpy as np
+
+from .hos_engine import EPSILON
+
+
+class FleetSimulator:
+    '''
+    Runs the HOSEngine rules over whole arrays of trips.
+    
+    Every trip is current location -> pickup -> dropoff at a constant
+    speed. Each pass moves every unfinished trip on by one event (a stretch
+    of driving, a rest, restart, fuel stop, break, pickup or dropoff) with
+    the same priorities as HOSEngine._drive, so the number of passes is
+    the event count of the longest trip rather than the number of trips.
+    The 70-hour/8-day cycle is an (N, days) ring buffer of daily on-duty
+    totals (_CycleBuffer).
+    '''
+    
+    def __init__(self, engine, weekly_limit=70, weekly_days=8):
+        self.engine = engine
+        self.weekly_limit = weekly_limit
+        self.weekly_days = weekly_days
+    
+    def run(self, pickup_miles, delivery_miles, speed_mph=55.0, start_hour=0.0, cycle_hours=0.0):
+        '''
+        Arguments are arrays (or scalars, broadcast): miles to the pickup and
+        from pickup to dropoff, average speed, the hour of day the trip
+        starts and the cycle hours already used (booked on the previous
+        day, as HOSCalculator does). Returns a dict of per-trip arrays:
+        arrival_hours at the final dropoff, total_hours, driving_hours,
+        duty_hours (driving plus on-duty), rests, breaks, fuel_stops and
+        restarts.
+        '''
+        engine = self.engine
+        pickup_miles, delivery_miles, speed, start_hour, cycle_hours = np.broadcast_arrays(
+            *(np.asarray(value, dtype=np.float64)
+              for value in (pickup_miles, delivery_miles, speed_mph, start_hour, cycle_hours))
+        )
+        n = pickup_miles.size
+        miles = np.column_stack((pickup_miles.ravel(), delivery_miles.ravel()))
+        hours = miles / speed.ravel()[:, None]
+        speed = speed.ravel()
+        
+        cycle = _CycleBuffer(self.weekly_days, start_hour.ravel() % 24, cycle_hours.ravel())
+        
+        clock, driving, window, since_break = np.zeros(n), np.zeros(n), np.zeros(n), np.zeros(n)
+        fuel_miles, done = np.zeros(n), np.zeros(n)
+        segment = np.zeros(n, dtype=np.int64)
+        arrival = np.zeros(n)
+        counts = {kind: np.zeros(n, dtype=np.int64) for kind in ('rests', 'breaks', 'fuel_stops', 'restarts')}
+        driving_total, on_duty_total = np.zeros(n), np.zeros(n)
+        
+        active = np.arange(n)
+        while active.size:
+            seg = segment[active]
+            left = hours[active, seg] - done[active]
+            
+            # Segment finished: pickup or dropoff, 1 hour on duty
+            at_stop = active[left <= EPSILON]
+            arrival[at_stop] = clock[at_stop]
+            self._on_duty(cycle, at_stop, engine.stop_hours, clock, window, since_break, on_duty_total)
+            segment[at_stop] += 1
+            done[at_stop] = 0.0
+            
+            moving = active[left > EPSILON]
+            left = left[left > EPSILON]
+            limit = (driving[moving] >= engine.max_driving - EPSILON) | (window[moving] >= engine.max_window - EPSILON)
+            available = np.maximum(0.0, self.weekly_limit - cycle.used(moving, clock[moving]))
+            exhausted = ~limit & (available <= EPSILON)
+            fuel = ~limit & ~exhausted & (speed[moving] > 0) \
+                & (fuel_miles[moving] >= engine.fuel_interval_miles - EPSILON)
+            breaking = ~limit & ~exhausted & ~fuel & (since_break[moving] >= engine.break_after - EPSILON)
+            drive = ~(limit | exhausted | fuel | breaking)
+            
+            for mask, rest_hours, counter in ((limit, engine.rest_hours, 'rests'),
+                                              (exhausted, engine.restart_hours, 'restarts')):
+                trips = moving[mask]
+                clock[trips] += rest_hours
+                driving[trips] = window[trips] = since_break[trips] = 0.0
+                counts[counter][trips] += 1
+            restarted = moving[exhausted]
+            cycle.roll(restarted, clock[restarted])
+            cycle.totals[restarted] = 0.0
+            
+            trips = moving[fuel]
+            self._on_duty(cycle, trips, engine.fuel_hours, clock, window, since_break, on_duty_total)
+            fuel_miles[trips] = 0.0
+            counts['fuel_stops'][trips] += 1
+            
+            trips = moving[breaking]
+            self._on_duty(cycle, trips, engine.break_hours, clock, window, since_break, on_duty_total)
+            counts['breaks'][trips] += 1
+            
+            trips = moving[drive]
+            trip_speed = speed[trips]
+            step = np.minimum.reduce([
+                left[drive],
+                engine.max_driving - driving[trips],
+                engine.max_window - window[trips],
+                engine.break_after - since_break[trips],
+                available[drive],
+                np.divide(engine.fuel_interval_miles - fuel_miles[trips], trip_speed,
+                          out=left[drive].copy(), where=trip_speed > 0),
+            ])
+            cycle.add(trips, clock[trips], step)
+            clock[trips] += step
+            driving[trips] += step
+            window[trips] += step
+            since_break[trips] += step
+            fuel_miles[trips] += step * trip_speed
+            done[trips] += step
+            driving_total[trips] += step
+            
+            active = active[segment[active] < 2]
+        
+        shape = pickup_miles.shape
+        result = {
+            'arrival_hours': arrival,
+            'total_hours': clock,
+            'driving_hours': driving_total,
+            'duty_hours': driving_total + on_duty_total,
+            **counts,
+        }
+        return {key: value.reshape(shape) for key, value in result.items()}
+    
+    def _on_duty(self, cycle, trips, hours, clock, window, since_break, on_duty_total):
+        cycle.add(trips, clock[trips], np.full(trips.size, float(hours)))
+        clock[trips] += hours
+        window[trips] += hours
+        on_duty_total[trips] += hours
+        if hours >= 0.5 - EPSILON:
+            since_break[trips] = 0.0
+
+
+class _CycleBuffer:
+    '''
+    CycleTracker for many trips: row i holds trip i's daily on-duty totals,
+    with day d in column d % days
+    '''
+    
+    def __init__(self, days, day_start, previous_day_hours):
+        self.days = days
+        self.day_start = day_start
+        self.day = np.zeros(len(day_start), dtype=np.int64)
+        self.totals = np.zeros((len(day_start), days))
+        self.totals[:, -1] = previous_day_hours     # column of day -1
+    
+    def roll(self, trips, clock):
+        '''
+        Move each trip on to the day of `clock`, clearing the days that passed
+        '''
+        day = np.floor((self.day_start[trips] + clock + EPSILON) / 24).astype(np.int64)
+        gap = day - self.day[trips]
+        for ahead in range(1, min(int(gap.max(initial=0)), self.days) + 1):
+            rows = trips[gap >= ahead]
+            self.totals[rows, (self.day[rows] + ahead) % self.days] = 0.0
+        self.day[trips] = np.maximum(self.day[trips], day)
+    
+    def used(self, trips, clock):
+        self.roll(trips, clock)
+        return self.totals[trips].sum(axis=1)
+    
+    def add(self, trips, clock, hours):
+        '''
+        Book on-duty time starting at `clock`, split at each trip's midnight
+        '''
+        clock, hours = clock.copy(), hours.copy()
+        while trips.size:
+            self.roll(trips, clock)
+            chunk = np.minimum(hours, (self.day[trips] + 1) * 24 - self.day_start[trips] - clock)
+            self.totals[trips, self.day[trips] % self.days] += chunk
+            clock += chunk
+            hours -= chunk
+            keep = hours > EPSILON
+            trips, clock, hours = trips[keep], clock[keep], hours[keep]
@@ -0,0 +1,262 @@
+# api/utils/gazetteer.py - Offline place-name geocoder backed by a local gazetteer file
+
+import math
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+
+from .location_normalizer import normalize_location, trigrams
+
+
+class GazetteerIndex:
+    '''
+    Compact, read-only place-name index.
+    
+    Places are stored column-wise in typed arrays. Every lookup key (name,
+    "name admin1", ...) is kept in one sorted list that maps to a place id,
+    which gives exact and prefix lookup by bisection. Trigram postings are
+    packed into a single uint32 array with an offset table for fuzzy lookup.
+    '''
+    
+    def __init__(self):
+        self.names = []                   # place id -> display name
+        self.lat = array('d')
+        self.lon = array('d')
+        self.population = array('Q')
+        
+        self.keys = []                    # sorted, unique lookup keys
+        self.key_place = array('I')       # key position -> place id
+        
+        self._trigram_offsets = {}        # trigram -> (start, count) in _postings
+        self._postings = array('I')       # key positions, grouped by trigram
+    
+    def __len__(self):
+        return len(self.names)
+    
+    @classmethod
+    def build(cls, places):
+        '''
+        Build an index from an iterable of dicts with name, lat, lon and
+        optionally admin1, country, population and aliases
+        '''
+        index = cls()
+        best = {}  # key -> place id; on duplicates the most populous place wins
+        
+        for place in places:
+            place_id = len(index.names)
+            population = int(place.get('population') or 0)
+            index.names.append(place['name'])
+            index.lat.append(float(place['lat']))
+            index.lon.append(float(place['lon']))
+            index.population.append(population)
+            
+            for key in cls._place_keys(place):
+                current = best.get(key)
+                if current is None or index.population[current] < population:
+                    best[key] = place_id
+        
+        index.keys = sorted(best)
+        index.key_place = array('I', (best[key] for key in index.keys))
+        
+        postings = {}
+        for position, key in enumerate(index.keys):
+            for gram in trigrams(key):
+                postings.setdefault(gram, []).append(position)
+        
+        for gram, positions in postings.items():
+            index._trigram_offsets[gram] = (len(index._postings), len(positions))
+            index._postings.extend(positions)
+        
+        return index
+    
+    @staticmethod
+    def _place_keys(place):
+        names = {place['name']}
+        names.update(place.get('aliases') or [])
+        admin1 = place.get('admin1') or ''
+        country = place.get('country') or ''
+        
+        for name in names:
+            base = normalize_location(name)
+            if not base:
+                continue
+            yield base
+            if admin1:
+                yield normalize_location(f"{name} {admin1}")
+                if country:
+                    yield normalize_location(f"{name} {admin1} {country}")
+            if country:
+                yield normalize_location(f"{name} {country}")
+    
+    def _result(self, position):
+        place_id = self.key_place[position]
+        return {
+            'lon': self.lon[place_id],
+            'lat': self.lat[place_id],
+            'source': 'gazetteer',
+            'name': self.names[place_id],
+        }
+    
+    def lookup(self, text):
+        '''
+        Exact match on the normalized key
+        '''
+        key = normalize_location(text)
+        position = bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            return self._result(position)
+        return None
+    
+    def prefix(self, text, limit=10):
+        '''
+        Places whose key starts with text, most populous first
+        '''
+        key = normalize_location(text)
+        if not key:
+            return []
+        
+        start = bisect_left(self.keys, key)
+        end = bisect_left(self.keys, key + '\uffff', lo=start)
+        positions = sorted(
+            range(start, end),
+            key=lambda p: self.population[self.key_place[p]],
+            reverse=True
+        )
+        
+        results, seen = [], set()
+        for position in positions:
+            place_id = self.key_place[position]
+            if place_id not in seen:
+                seen.add(place_id)
+                results.append(self._result(position))
+                if len(results) >= limit:
+                    break
+        return results
+    
+    def fuzzy(self, text, threshold=0.8):
+        '''
+        Best key by trigram (Jaccard) similarity, if it reaches threshold.
+        Returns (result, similarity), with result None below the threshold.
+        '''
+        key = normalize_location(text)
+        grams = trigrams(key)
+        if not key or not grams:
+            return None, 0.0
+        
+        # Prefix filtering: a key sharing at least `needed` trigrams with the
+        # query must contain one of its (len - needed + 1) rarest trigrams, so
+        # only those posting lists are scanned. Candidates are then scored exactly.
+        needed = max(1, math.ceil(threshold * len(grams)))
+        rarest = sorted(grams, key=lambda g: self._trigram_offsets.get(g, (0, 0))[1])
+        candidates = set()
+        for gram in rarest[:len(grams) - needed + 1]:
+            span = self._trigram_offsets.get(gram)
+            if span is not None:
+                start, count = span
+                candidates.update(self._postings[start:start + count])
+        
+        best_position, best_score = None, 0.0
+        for position in candidates:
+            other = trigrams(self.keys[position])
+            common = len(grams & other)
+            score = common / (len(grams) + len(other) - common)
+            if score > best_score:
+                best_position, best_score = position, score
+        
+        if best_position is None or best_score < threshold:
+            return None, best_score
+        return self._result(best_position), best_score
+    
+    def memory_bytes(self):
+        '''
+        Approximate size of the index payload (strings, arrays and tables)
+        '''
+        total = sum(sys.getsizeof(name) for name in self.names)
+        total += sum(sys.getsizeof(key) for key in self.keys)
+        total += sys.getsizeof(self.names) + sys.getsizeof(self.keys)
+        for column in (self.lat, self.lon, self.population, self.key_place, self._postings):
+            total += column.buffer_info()[1] * column.itemsize
+        total += sys.getsizeof(self._trigram_offsets)
+        total += sum(sys.getsizeof(gram) + 64 for gram in self._trigram_offsets)
+        return total
+
+
+def read_gazetteer_file(path, min_population=0):
+    '''
+    Yield place dicts from a gazetteer TSV.
+    
+    Accepts the GeoNames dump layout (geonameid, name, asciiname,
+    alternatenames, latitude, longitude, ..., country code [8],
+    admin1 code [10], population [14]) or a short custom layout for depots
+    and terminals: name, latitude, longitude[, admin1[, country]].
+    Lines starting with '#' are ignored.
+    '''
+    with open(path, encoding='utf-8') as handle:
+        for line in handle:
+            if not line.strip() or line.startswith('#'):
+                continue
+            columns = line.rstrip('\n').split('\t')
+            
+            try:
+                if len(columns) >= 15:
+                    population = int(columns[14] or 0)
+                    if population < min_population:
+                        continue
+                    aliases = [columns[2]] if columns[2] and columns[2] != columns[1] else []
+                    yield {
+                        'name': columns[1],
+                        'aliases': aliases,
+                        'lat': float(columns[4]),
+                        'lon': float(columns[5]),
+                        'country': columns[8],
+                        'admin1': columns[10],
+                        'population': population,
+                    }
+                elif len(columns) >= 3:
+                    yield {
+                        'name': columns[0],
+                        'lat': float(columns[1]),
+                        'lon': float(columns[2]),
+                        'admin1': columns[3] if len(columns) > 3 else '',
+                        'country': columns[4] if len(columns) > 4 else '',
+                    }
+            except ValueError:
+                print(f"⚠️ Skipping malformed gazetteer line: {line[:80]!r}")
+
+
+def load_gazetteer(path, min_population=0):
+    '''
+    Read a gazetteer file and build its index
+    '''
+    return GazetteerIndex.build(read_gazetteer_file(path, min_population))
+
+
+_gazetteer = None
+_gazetteer_loaded = False
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer():
+    '''
+    Return the process-wide gazetteer index, or None if GAZETTEER_PATH is unset
+    '''
+    global _gazetteer, _gazetteer_loaded
+    
+    if not _gazetteer_loaded:
+        with _gazetteer_lock:
+            if not _gazetteer_loaded:
+                path = getattr(settings, 'GAZETTEER_PATH', '')
+                if path:
+                    try:
+                        _gazetteer = load_gazetteer(
+                            path,
+                            min_population=getattr(settings, 'GAZETTEER_MIN_POPULATION', 0)
+                        )
+                        print(f"📚 Gazetteer loaded: {len(_gazetteer)} places from {path}")
+                    except OSError as e:
+                        print(f"⚠️ Could not load gazetteer {path}: {e}")
+                _gazetteer_loaded = True
+    return _gazetteer
@@ -0,0 +1,342 @@
+# api/utils/geocode_cache.py - Layered geocode cache (in-process LRU + database)
+
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cache import LRUCache, MISSING
+from .location_normalizer import FuzzyNameIndex, normalize_location
+
+
+class GeocodeCache:
+    '''
+    Two-level cache for geocoding results.
+    
+    Level 1 is a per-process LRU. Level 2 is the GeocodeCacheEntry table, which
+    is shared by every worker and survives restarts. Negative results (None)
+    are cached too, with a shorter TTL. GeocodeLease rows let one worker
+    resolve a key while the others wait for its result.
+    
+    Invalidation bumps a GeocodeVersion row so it reaches every worker:
+    location_versions() drops local copies whose version moved, and its
+    result is part of each route plan key.
+    '''
+    
+    def __init__(self, max_entries=2048, ttl_seconds=30 * 24 * 3600,
+                 negative_ttl_seconds=900, fuzzy_threshold=0.8,
+                 names_refresh_seconds=60):
+        self.memory = LRUCache(max_entries=max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        
+        # Trigram index over resolved names; None disables fuzzy matching
+        self.names = FuzzyNameIndex(threshold=fuzzy_threshold) if fuzzy_threshold else None
+        self.names_refresh_seconds = names_refresh_seconds
+        self._names_synced_at = None
+        self._names_synced_until = None
+        
+        self._versions = {}  # key -> GeocodeVersion last seen by this process
+        
+        self._lock = threading.Lock()
+        self.counters = {
+            'memory_hits': 0,
+            'store_hits': 0,
+            'fuzzy_hits': 0,
+            'negative_hits': 0,
+            'misses': 0,
+            'store_errors': 0,
+            'lease_waits': 0,
+        }
+    
+    def get(self, key):
+        '''
+        Return the cached result for key, None for a cached negative result,
+        or MISSING if the key has to be looked up.
+        
+        An exact miss falls back to the fuzzy name index, so a near-duplicate
+        of an already resolved name reuses that name's coordinates.
+        '''
+        value, level = self._lookup(key)
+        
+        if value is MISSING and self.names is not None:
+            self._sync_names()
+            target, score = self.names.match(key)
+            if target is not None and target != key:
+                value, _ = self._lookup(target)
+                if value is not MISSING:
+                    print(f"🔗 Fuzzy cache match: '{key}' -> '{target}' ({score:.2f})")
+                    level = 'fuzzy_hits'
+        
+        if value is MISSING:
+            self._count('misses')
+            return MISSING
+        
+        self._count(level)
+        if value is None:
+            self._count('negative_hits')
+        return value
+    
+    def _lookup(self, key):
+        value = self.memory.get(key)
+        if value is not MISSING:
+            return value, 'memory_hits'
+        
+        entry = self._load(key)
+        if entry is None:
+            return MISSING, None
+        return self._remember(key, entry), 'store_hits'
+    
+    def _sync_names(self):
+        '''
+        Add names resolved by any worker since the last sync to the fuzzy index
+        '''
+        from ..models import GeocodeCacheEntry
+        
+        now = time.monotonic()
+        if self._names_synced_at is not None and now - self._names_synced_at < self.names_refresh_seconds:
+            return
+        
+        entries = GeocodeCacheEntry.objects.filter(found=True, expires_at__gt=timezone.now())
+        if self._names_synced_until is not None:
+            entries = entries.filter(updated_at__gt=self._names_synced_until)
+        
+        try:
+            for key, updated_at in entries.order_by('updated_at').values_list('key', 'updated_at')[:self.names.max_entries]:
+                self.names.add(normalize_location(key), key)
+                self._names_synced_until = updated_at
+        except DatabaseError as e:
+            print(f"⚠️ Could not sync fuzzy geocode names: {e}")
+        self._names_synced_at = now
+    
+    def set(self, key, result):
+        '''
+        Store a geocoding result (or None for "not found") under key
+        '''
+        ttl = self.ttl_seconds if result else self.negative_ttl_seconds
+        self.memory.set(key, result, ttl=ttl)
+        if result and self.names is not None:
+            self.names.add(normalize_location(key), key)
+        
+        from ..models import GeocodeCacheEntry
+        
+        try:
+            # Single-statement upsert: concurrent writers never deadlock on a read-then-write
+            GeocodeCacheEntry.objects.bulk_create(
+                [GeocodeCacheEntry(
+                    key=key,
+                    latitude=result['lat'] if result else None,
+                    longitude=result['lon'] if result else None,
+                    source=result.get('source', '') if result else '',
+                    found=bool(result),
+                    expires_at=timezone.now() + timedelta(seconds=ttl),
+                )],
+                update_conflicts=True,
+                unique_fields=['key'],
+                update_fields=['latitude', 'longitude', 'source', 'found', 'expires_at', 'updated_at'],
+            )
+        except DatabaseError as e:
+            print(f"⚠️ Could not persist geocode cache entry for '{key}': {e}")
+            self._count('store_errors')
+    
+    def invalidate(self, key=None):
+        '''
+        Drop one key, or the whole cache when key is None. Other workers
+        notice through the version bump on their next location_versions().
+        '''
+        from ..models import GeocodeCacheEntry
+        from .route_plan_cache import get_route_plan_cache
+        
+        self._bump_version(key or '')
+        
+        # Route plans built on the old coordinates go too
+        plans = get_route_plan_cache()
+        if key is None:
+            self.memory.clear()
+            GeocodeCacheEntry.objects.all().delete()
+            if plans is not None:
+                plans.invalidate()
+        else:
+            self.memory.delete(key)
+            GeocodeCacheEntry.objects.filter(key=key).delete()
+            if plans is not None:
+                plans.invalidate_location(key)
+    
+    def location_versions(self, names):
+        '''
+        Invalidation versions of the whole cache and of each location, as a
+        tuple for route plan keys; None if the store is unavailable. Local
+        copies of keys whose version moved since the last call are dropped.
+        '''
+        from ..models import GeocodeVersion
+        
+        keys = [''] + [normalize_location(name) for name in names]
+        try:
+            stored = dict(GeocodeVersion.objects.filter(key__in=set(keys)).values_list('key', 'version'))
+        except DatabaseError as e:
+            print(f"⚠️ Geocode versions unavailable: {e}")
+            self._count('store_errors')
+            return None
+        
+        with self._lock:
+            for key in set(keys):
+                version = stored.get(key, 0)
+                if self._versions.get(key, 0) == version:
+                    continue
+                if key:
+                    self.memory.delete(key)
+                else:
+                    self.memory.clear()
+                self._versions[key] = version
+        return tuple(stored.get(key, 0) for key in keys)
+    
+    def _bump_version(self, key):
+        from ..models import GeocodeVersion
+        
+        if GeocodeVersion.objects.filter(key=key).update(version=F('version') + 1):
+            return
+        try:
+            with transaction.atomic():
+                GeocodeVersion.objects.create(key=key, version=1)
+        except IntegrityError:
+            GeocodeVersion.objects.filter(key=key).update(version=F('version') + 1)
+    
+    def purge_expired(self):
+        '''
+        Delete expired cache entries and leases from the persistent store
+        '''
+        from ..models import GeocodeCacheEntry, GeocodeLease
+        
+        now = timezone.now()
+        deleted, _ = GeocodeCacheEntry.objects.filter(expires_at__lte=now).delete()
+        leases, _ = GeocodeLease.objects.filter(expires_at__lte=now).delete()
+        return deleted + leases
+    
+    def acquire_lease(self, key, owner, seconds=15):
+        '''
+        Try to become the one worker resolving key. Returns True if this
+        owner now holds the lease (a new one, or one that had expired).
+        Leases left behind by workers that died are cleared on the way.
+        '''
+        from ..models import GeocodeLease
+        
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=seconds)
+        try:
+            GeocodeLease.objects.filter(expires_at__lte=now).delete()
+            with transaction.atomic():
+                GeocodeLease.objects.create(key=key, owner=owner, expires_at=expires_at)
+            return True
+        except IntegrityError:
+            # Someone holds it; take it over only if it has expired
+            return GeocodeLease.objects.filter(
+                key=key, expires_at__lte=now
+            ).update(owner=owner, expires_at=expires_at) == 1
+        except DatabaseError as e:
+            print(f"⚠️ Geocode lease unavailable for '{key}': {e}")
+            self._count('store_errors')
+            return True
+    
+    def release_lease(self, key, owner):
+        from ..models import GeocodeLease
+        
+        try:
+            GeocodeLease.objects.filter(key=key, owner=owner).delete()
+        except DatabaseError as e:
+            print(f"⚠️ Could not release geocode lease for '{key}': {e}")
+    
+    def wait_for(self, key, timeout=10, poll_interval=0.1):
+        '''
+        Wait for another worker holding the lease on key to store a result.
+        Returns the result, or MISSING if the lease was dropped or timed out
+        without one.
+        '''
+        from ..models import GeocodeLease
+        
+        deadline = time.monotonic() + timeout
+        while True:
+            entry = self._load(key)
+            if entry is not None:
+                self._count('lease_waits')
+                return self._remember(key, entry)
+            
+            try:
+                leased = GeocodeLease.objects.filter(
+                    key=key, expires_at__gt=timezone.now()
+                ).exists()
+            except DatabaseError:
+                leased = False
+            
+            if not leased or time.monotonic() >= deadline:
+                return MISSING
+            time.sleep(poll_interval)
+    
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        
+        hits = counters['memory_hits'] + counters['store_hits'] + counters['fuzzy_hits']
+        lookups = hits + counters['misses']
+        counters['hit_rate'] = round(hits / lookups, 3) if lookups else 0.0
+        counters['memory'] = self.memory.stats()
+        counters['fuzzy_names'] = len(self.names) if self.names is not None else 0
+        return counters
+    
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+    
+    def _load(self, key):
+        from ..models import GeocodeCacheEntry
+        
+        try:
+            return GeocodeCacheEntry.objects.filter(
+                key=key, expires_at__gt=timezone.now()
+            ).first()
+        except DatabaseError as e:
+            print(f"⚠️ Geocode cache store unavailable: {e}")
+            self._count('store_errors')
+            return None
+    
+    def _remember(self, key, entry):
+        value = self._entry_to_result(entry)
+        
+        # Keep the in-process copy no longer than the stored entry is valid
+        remaining = (entry.expires_at - timezone.now()).total_seconds()
+        self.memory.set(key, value, ttl=max(remaining, 0))
+        return value
+    
+    def _entry_to_result(self, entry):
+        if not entry.found:
+            return None
+        return {
+            'lon': entry.longitude,
+            'lat': entry.latitude,
+            'source': entry.source,
+        }
+
+
+_geocode_cache = None
+_geocode_cache_lock = threading.Lock()
+
+
+def get_geocode_cache():
+    '''
+    Return the process-wide GeocodeCache, creating it from settings on first use
+    '''
+    global _geocode_cache
+    
+    if _geocode_cache is None:
+        with _geocode_cache_lock:
+            if _geocode_cache is None:
+                _geocode_cache = GeocodeCache(
+                    max_entries=getattr(settings, 'GEOCODE_CACHE_MAX_ENTRIES', 2048),
+                    ttl_seconds=getattr(settings, 'GEOCODE_CACHE_TTL_SECONDS', 30 * 24 * 3600),
+                    negative_ttl_seconds=getattr(settings, 'GEOCODE_NEGATIVE_TTL_SECONDS', 900),
+                    fuzzy_threshold=getattr(settings, 'GEOCODE_FUZZY_THRESHOLD', 0.8),
+                )
+    return _geocode_cache
@@ -1,152 +1,282 @@
 # geocoding.py
-import requests
+import os
+import socket
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout, as_completed, wait
 from django.conf import settings
+from django.db import connections
+from .cache import MISSING
+from .geocode_cache import get_geocode_cache
+from .distance import haversine_miles
+from .geocoding_providers import ProviderUnavailable, get_local_provider, get_providers
+from .location_normalizer import normalize_location
+from .singleflight import SingleFlight
+
+
+_executors = {}
+_executor_lock = threading.Lock()
+
+# Coalesces concurrent lookups of the same key across threads in this process
+_in_flight = SingleFlight()
+_WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class AbandonedLookups:
+    '''
+    Batch lookups given up on at their deadline. One that had already
+    started cannot be cancelled: it keeps its pool thread until its
+    provider calls return, so it is counted until it really finishes.
+    '''
+    
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+    
+    def add(self, future):
+        if future.cancel():
+            return False
+        with self._lock:
+            self.count += 1
+        future.add_done_callback(self._finished)
+        return True
+    
+    def _finished(self, future):
+        with self._lock:
+            self.count -= 1
+
+
+_abandoned = AbandonedLookups()
+
+
+def _get_executor(name='geocode'):
+    '''
+    Named thread pools shared by all geocoding calls in this process.
+    Batch lookups and provider hedging use separate pools so a full batch
+    pool can never starve the provider calls it is waiting on.
+    '''
+    if name not in _executors:
+        with _executor_lock:
+            if name not in _executors:
+                _executors[name] = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'GEOCODE_MAX_WORKERS', 8),
+                    thread_name_prefix=name
+                )
+    return _executors[name]
+
 
 class GeocodingService:
     def __init__(self):
         self.openroute_api_key = settings.OPENROUTE_API_KEY
-        self.cache = {}
+        # Shared by every GeocodingService in the process and backed by the database
+        self.cache = get_geocode_cache()
+        # Pooled HTTP clients in fallback order: OpenRouteService, then Nominatim
+        self.providers = get_providers()
+        # Offline gazetteer, consulted before the cache and any network provider
+        self.local_provider = get_local_provider()
     
     def geocode(self, location_name):
         """Geocode a location name to coordinates"""
         if not location_name or location_name.strip() == "":
             return None
-            
-        location_name = location_name.strip()
         
-        # Check cache first
-        if location_name.lower() in self.cache:
-            print(f"📍 Using cached coordinates for: {location_name}")
-            return self.cache[location_name.lower()]
+        location_name = location_name.strip()
+        cache_key = normalize_location(location_name)
+        if not cache_key:
+            return None
         
-        print(f"🔍 Geocoding: {location_name}")
+        if self.local_provider is not None:
+            local = self.local_provider.lookup(location_name)
+            if local:
+                print(f"📚 Gazetteer hit for: {location_name}")
+                return local
         
-        # Try OpenRouteService first
-        result = self._geocode_openroute(location_name)
+        # Check cache first (a cached None means the lookup failed recently)
+        cached = self.cache.get(cache_key)
+        if cached is not MISSING:
+            print(f"📍 Using cached coordinates for: {location_name}")
+            return cached
         
-        # If OpenRouteService fails, try OpenStreetMap Nominatim as fallback
-        if not result:
-            print(f"🔄 OpenRouteService failed, trying Nominatim for: {location_name}")
-            result = self._geocode_nominatim(location_name)
+        # Concurrent misses for the same key in this process share one lookup
+        return _in_flight.do(cache_key, lambda: self._resolve(location_name, cache_key))
+    
+    def _resolve(self, location_name, cache_key):
+        '''
+        Look location_name up with the providers, unless another worker
+        already holds the lease for it, in which case wait for its result
+        '''
+        owner = f"{_WORKER_ID}:{threading.get_ident()}"
+        leased = self.cache.acquire_lease(
+            cache_key, owner, seconds=getattr(settings, 'GEOCODE_LEASE_SECONDS', 15)
+        )
         
-        if result:
-            print(f"✅ Geocoding successful: {location_name} -> {result}")
-            self.cache[location_name.lower()] = result
-        else:
-            print(f"❌ Geocoding failed: {location_name}")
+        if not leased:
+            print(f"⏳ Waiting for another worker to geocode: {location_name}")
+            waited = self.cache.wait_for(
+                cache_key, timeout=getattr(settings, 'GEOCODE_LEASE_WAIT_SECONDS', 10)
+            )
+            if waited is not MISSING:
+                return waited
         
-        return result
-    
-    def _geocode_openroute(self, location_name):
-        """Try OpenRouteService with retries"""
-        for attempt in range(3):
-            try:
-                print(f"  Trying OpenRouteService (attempt {attempt + 1}/3)...")
-                
-                response = requests.get(
-                    "https://api.openrouteservice.org/geocode/search",
-                    params={
-                        'api_key': self.openroute_api_key,
-                        'text': location_name,
-                        'size': 1
-                    },
-                    timeout=10
-                )
-                
-                print(f"  OpenRouteService status: {response.status_code}")
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if data.get('features') and len(data['features']) > 0:
-                        coords = data['features'][0]['geometry']['coordinates']
-                        # OpenRouteService returns [lon, lat]
-                        result = {
-                            'lon': coords[0],
-                            'lat': coords[1],
-                            'source': 'openroute'
-                        }
-                        print(f"  ✅ OpenRouteService found: {result}")
-                        return result
-                    else:
-                        print(f"  ❌ OpenRouteService: No features found in response")
-                
-            except requests.exceptions.Timeout:
-                print(f"  ⏰ Timeout on attempt {attempt + 1} for '{location_name}'")
-                if attempt < 2:
-                    time.sleep(2)
-                continue
-            except Exception as e:
-                print(f"  ❌ OpenRouteService error: {e}")
-                break
-        
-        return None
-    
-    def _geocode_nominatim(self, location_name):
-        """Fallback to OpenStreetMap Nominatim"""
         try:
-            print(f"  Trying Nominatim...")
+            print(f"🔍 Geocoding: {location_name}")
             
-            response = requests.get(
-                "https://nominatim.openstreetmap.org/search",
-                params={
-                    'q': location_name,
-                    'format': 'json',
-                    'limit': 1
-                },
-                timeout=10,
-                headers={'User-Agent': 'ELD-Log-Generator/1.0'}
-            )
+            result, answered = self._lookup_hedged(location_name)
+            
+            if result:
+                print(f"✅ Geocoding successful: {location_name} -> {result}")
+            else:
+                print(f"❌ Geocoding failed: {location_name}")
             
-            print(f"  Nominatim status: {response.status_code}")
+            # Only remember a miss if a provider actually answered "not found"
+            if result or answered:
+                self.cache.set(cache_key, result)
             
-            if response.status_code == 200:
-                data = response.json()
-                if data and len(data) > 0:
-                    # Nominatim returns {'lat': '1.234', 'lon': '5.678'} as strings
-                    result = {
-                        'lon': float(data[0]['lon']),
-                        'lat': float(data[0]['lat']),
-                        'source': 'nominatim'
-                    }
-                    print(f"  ✅ Nominatim found: {result}")
-                    return result
+            return result
+        finally:
+            if leased:
+                self.cache.release_lease(cache_key, owner)
+    
+    def geocode_many(self, location_names, deadline=None, concurrent=True):
+        '''
+        Geocode several locations at once.
+        
+        Unique names are looked up in parallel and the whole batch shares one
+        deadline (seconds), so latency follows the slowest lookup instead of
+        the sum. Returns {location_name: result}; names that failed or did not
+        finish before the deadline map to None.
+        '''
+        if deadline is None:
+            deadline = getattr(settings, 'GEOCODE_DEADLINE_SECONDS', 20)
+        
+        # Deduplicate on the cache key so "Chicago, IL" and "chicago il" share one lookup
+        unique = {}
+        for name in location_names:
+            if name and name.strip():
+                unique.setdefault(normalize_location(name), name)
+        
+        if not concurrent or len(unique) <= 1:
+            by_key = {key: self.geocode(name) for key, name in unique.items()}
+        else:
+            executor = _get_executor()
+            futures = {
+                key: executor.submit(self._geocode_in_thread, name)
+                for key, name in unique.items()
+            }
+            done, not_done = wait(futures.values(), timeout=deadline)
+            
+            by_key = {}
+            for key, future in futures.items():
+                if future in done and future.exception() is None:
+                    by_key[key] = future.result()
                 else:
-                    print(f"  ❌ Nominatim: No results found")
-                    
-        except Exception as e:
-            print(f"  ❌ Nominatim error: {e}")
+                    if future in not_done:
+                        still_running = _abandoned.add(future)
+                        print(f"⏰ Geocoding deadline ({deadline}s) exceeded for: {unique[key]}"
+                              + (" (lookup still running)" if still_running else ""))
+                    else:
+                        print(f"❌ Geocoding error for {unique[key]}: {future.exception()}")
+                    by_key[key] = None
         
-        return None
+        return {
+            name: by_key.get(normalize_location(name)) if name and name.strip() else None
+            for name in location_names
+        }
     
-    def calculate_distance(self, coord1, coord2):
-        """Calculate approximate distance using Haversine formula"""
-        from math import radians, sin, cos, sqrt, atan2
+    def _geocode_in_thread(self, location_name):
+        try:
+            return self.geocode(location_name)
+        finally:
+            # Worker threads get their own DB connections; don't leave them open
+            connections.close_all()
+    
+    def _lookup_hedged(self, location_name):
+        '''
+        Query the primary provider, hedging to the fallback provider if the
+        primary has not answered within its observed p95 (or has failed).
+        The first non-empty answer wins.
         
-        # Extract lat/lon from coordinate dictionaries
-        lat1, lon1 = coord1[0], coord1[1]  # coord1 is (lat, lon) tuple
-        lat2, lon2 = coord2[0], coord2[1]  # coord2 is (lat, lon) tuple
+        Each provider is waited on for at most its request timeout plus its
+        rate-limit wait, so a hung call cannot hold this thread (and its
+        geocode pool slot) any longer than that.
         
-        # Convert to radians
-        lat1, lon1 = radians(lat1), radians(lon1)
-        lat2, lon2 = radians(lat2), radians(lon2)
+        Returns (result, answered) where answered is True if at least one
+        provider gave a definitive response.
+        '''
+        primary, fallback = self.providers[0], self.providers[1]
+        executor = _get_executor('geocode-hedge')
+        answered = False
         
-        # Haversine formula
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
+        pending = {executor.submit(primary.lookup, location_name): primary}
+        give_up_at = time.monotonic() + self._call_budget(primary)
+        done, _ = wait(pending, timeout=primary.hedge_delay(
+            default=getattr(settings, 'GEOCODE_HEDGE_DEFAULT_DELAY', 2.0),
+            minimum=getattr(settings, 'GEOCODE_HEDGE_MIN_DELAY', 0.25)
+        ))
         
-        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-        c = 2 * atan2(sqrt(a), sqrt(1-a))
+        if done:
+            future = done.pop()
+            del pending[future]
+            try:
+                result = future.result()
+                answered = True
+                if result:
+                    return result, answered
+            except ProviderUnavailable as e:
+                print(f"🔄 {e}, trying {fallback.name} for: {location_name}")
+        else:
+            print(f"🔀 {primary.name} slower than p95, hedging with {fallback.name} for: {location_name}")
         
-        # Earth radius in miles
-        radius = 3958.8
-        distance = radius * c
+        pending[executor.submit(fallback.lookup, location_name)] = fallback
+        give_up_at = max(give_up_at, time.monotonic() + self._call_budget(fallback))
+        try:
+            for future in as_completed(pending, timeout=max(0.0, give_up_at - time.monotonic())):
+                try:
+                    result = future.result()
+                except ProviderUnavailable as e:
+                    print(f"  {e}")
+                    continue
+                answered = True
+                if result:
+                    return result, answered
+        except FuturesTimeout:
+            print(f"⏰ No provider answered in time for: {location_name}")
         
-        print(f"📏 Distance calculation: {distance:.1f} miles")
-        return distance
-
+        return None, answered
+    
+    @staticmethod
+    def _call_budget(provider):
+        '''
+        Longest a provider lookup should take: waiting for a rate-limit token, then the request
+        '''
+        return provider.timeout + ((provider.max_wait or 0) if provider.limiter is not None else 0)
+    
+    def stats(self):
+        '''
+        Per-provider latency/error stats and cache hit counters
+        '''
+        providers = {
+            provider.name: dict(
+                provider.stats.snapshot(),
+                circuit=provider.breaker.state,
+                rate_limit=provider.limiter.stats() if provider.limiter is not None else None
+            )
+            for provider in self.providers
+        }
+        if self.local_provider is not None:
+            providers[self.local_provider.name] = dict(
+                self.local_provider.stats.snapshot(),
+                places=len(self.local_provider.index)
+            )
+        
+        return {
+            'providers': providers,
+            'cache': self.cache.stats(),
+            'in_flight': _in_flight.stats(),
+            'abandoned_lookups': _abandoned.count,
+        }
+    
+    def calculate_distance(self, coord1, coord2):
+        """Great-circle distance in miles between two (lat, lon) tuples"""
+        return haversine_miles(coord1[0], coord1[1], coord2[0], coord2[1])
 
-class OpenRouteService:
-    """Placeholder for routing functionality"""
-    def __init__(self):
-        self.api_key = settings.OPENROUTE_API_KEY
\ No newline at end of file
@@ -0,0 +1,360 @@
+# api/utils/geocoding_providers.py - HTTP clients for the geocoding providers
+
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+from .rate_limit import RateLimitExceeded, get_rate_limiter
+
+
+class ProviderUnavailable(Exception):
+    '''
+    The provider could not answer (circuit open, timeout, HTTP or payload error)
+    '''
+    pass
+
+
+class CircuitBreaker:
+    '''
+    Per-provider circuit breaker.
+    
+    closed    -> calls go through; consecutive failures are counted
+    open      -> calls are rejected until reset_timeout has passed
+    half_open -> one trial call is let through; success closes, failure re-opens
+    '''
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+    
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Let exactly one trial request through
+                self.state = self.HALF_OPEN
+                return True
+            return False
+    
+    def release_trial(self):
+        '''
+        Give back a trial call that was allowed but never made, so the next call can have it
+        '''
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+    
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self.opened_at = None
+    
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class ProviderStats:
+    '''
+    Rolling latency window and outcome counters for one provider
+    '''
+    
+    def __init__(self, window=200):
+        self.latencies = deque(maxlen=window)
+        self.counts = {
+            'requests': 0,
+            'successes': 0,
+            'not_found': 0,
+            'failures': 0,
+            'timeouts': 0,
+            'short_circuited': 0,
+            'rate_limited': 0,
+        }
+        self._lock = threading.Lock()
+    
+    def record(self, outcome, latency=None):
+        with self._lock:
+            self.counts[outcome] += 1
+            if outcome not in ('short_circuited', 'rate_limited'):
+                self.counts['requests'] += 1
+            if latency is not None:
+                self.latencies.append(latency)
+    
+    def percentile(self, pct):
+        with self._lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[index]
+    
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self.counts)
+        p50 = self.percentile(50)
+        p95 = self.percentile(95)
+        counts['error_rate'] = round(
+            (counts['failures'] + counts['timeouts']) / counts['requests'], 3
+        ) if counts['requests'] else 0.0
+        counts['latency_p50_ms'] = round(p50 * 1000, 1) if p50 is not None else None
+        counts['latency_p95_ms'] = round(p95 * 1000, 1) if p95 is not None else None
+        return counts
+
+
+class GeocodingProvider:
+    '''
+    Base class for a geocoding HTTP API.
+    
+    Each provider keeps one requests.Session with a keep-alive connection
+    pool, its own circuit breaker and latency stats. lookup() makes exactly
+    one attempt; there is no retry loop.
+    '''
+    
+    name = None
+    
+    def __init__(self, timeout=10, pool_size=10, failure_threshold=5, reset_timeout=30,
+                 limiter=None, max_wait=None):
+        self.timeout = timeout
+        # Token bucket shared by every worker (see rate_limit.py); None means unlimited
+        self.limiter = limiter
+        self.max_wait = max_wait
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.stats = ProviderStats()
+    
+    def lookup(self, location_name, max_wait=None):
+        '''
+        Return {'lat', 'lon', 'source'}, or None if the provider found nothing.
+        Raises ProviderUnavailable if it could not answer at all, including
+        when the rate limit would make it wait longer than max_wait seconds
+        (defaults to the provider's configured max_wait).
+        '''
+        # Breaker first: an open circuit should not spend shared quota or wait for a token
+        if not self.breaker.allow():
+            self.stats.record('short_circuited')
+            raise ProviderUnavailable(f"{self.name} circuit open")
+        
+        if self.limiter is not None:
+            try:
+                self.limiter.acquire(self.max_wait if max_wait is None else max_wait)
+            except RateLimitExceeded as e:
+                self.breaker.release_trial()
+                self.stats.record('rate_limited')
+                raise ProviderUnavailable(f"{self.name} rate limited ({e})")
+        
+        started = time.monotonic()
+        try:
+            response = self._request(location_name)
+        except requests.exceptions.Timeout:
+            print(f"  ⏰ {self.name} timeout for '{location_name}'")
+            self.stats.record('timeouts', time.monotonic() - started)
+            self.breaker.record_failure()
+            raise ProviderUnavailable(f"{self.name} timed out")
+        except requests.exceptions.RequestException as e:
+            print(f"  ❌ {self.name} error: {e}")
+            self.stats.record('failures')
+            self.breaker.record_failure()
+            raise ProviderUnavailable(f"{self.name} request failed: {e}")
+        except Exception:
+            # Anything else is a bug, but it must not leave a half-open trial outstanding
+            self.stats.record('failures')
+            self.breaker.record_failure()
+            raise
+        
+        latency = time.monotonic() - started
+        print(f"  {self.name} status: {response.status_code} ({latency * 1000:.0f} ms)")
+        
+        if response.status_code != 200:
+            self.stats.record('failures', latency)
+            self.breaker.record_failure()
+            raise ProviderUnavailable(f"{self.name} returned HTTP {response.status_code}")
+        
+        try:
+            result = self._parse(response.json())
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            print(f"  ❌ {self.name} returned an unexpected payload: {e}")
+            self.stats.record('failures', latency)
+            self.breaker.record_failure()
+            raise ProviderUnavailable(f"{self.name} returned an unexpected payload")
+        except Exception:
+            self.stats.record('failures', latency)
+            self.breaker.record_failure()
+            raise
+        
+        # An empty answer is still a healthy provider
+        self.breaker.record_success()
+        self.stats.record('successes' if result else 'not_found', latency)
+        return result
+    
+    def hedge_delay(self, default=2.0, minimum=0.25):
+        '''
+        How long to wait on this provider before hedging: its observed p95
+        '''
+        p95 = self.stats.percentile(95)
+        if p95 is None:
+            return default
+        return min(max(p95, minimum), self.timeout)
+    
+    def _request(self, location_name):
+        raise NotImplementedError
+    
+    def _parse(self, data):
+        raise NotImplementedError
+
+
+class OpenRouteProvider(GeocodingProvider):
+    name = 'openroute'
+    
+    def __init__(self, api_key, **kwargs):
+        super().__init__(**kwargs)
+        self.api_key = api_key
+    
+    def _request(self, location_name):
+        return self.session.get(
+            "https://api.openrouteservice.org/geocode/search",
+            params={
+                'api_key': self.api_key,
+                'text': location_name,
+                'size': 1
+            },
+            timeout=self.timeout
+        )
+    
+    def _parse(self, data):
+        if not data.get('features'):
+            return None
+        coords = data['features'][0]['geometry']['coordinates']
+        # OpenRouteService returns [lon, lat]
+        return {
+            'lon': coords[0],
+            'lat': coords[1],
+            'source': 'openroute'
+        }
+
+
+class NominatimProvider(GeocodingProvider):
+    name = 'nominatim'
+    
+    def _request(self, location_name):
+        return self.session.get(
+            "https://nominatim.openstreetmap.org/search",
+            params={
+                'q': location_name,
+                'format': 'json',
+                'limit': 1
+            },
+            timeout=self.timeout,
+            headers={'User-Agent': 'ELD-Log-Generator/1.0'}
+        )
+    
+    def _parse(self, data):
+        if not data:
+            return None
+        # Nominatim returns {'lat': '1.234', 'lon': '5.678'} as strings
+        return {
+            'lon': float(data[0]['lon']),
+            'lat': float(data[0]['lat']),
+            'source': 'nominatim'
+        }
+
+
+class GazetteerProvider:
+    '''
+    Offline provider over the in-memory gazetteer index (see gazetteer.py).
+    No network, so no session or circuit breaker; it just answers or doesn't.
+    '''
+    
+    name = 'gazetteer'
+    
+    def __init__(self, index, fuzzy_threshold=None):
+        self.index = index
+        self.fuzzy_threshold = fuzzy_threshold
+        self.stats = ProviderStats()
+    
+    def lookup(self, location_name):
+        started = time.perf_counter()
+        result = self.index.lookup(location_name)
+        if result is None and self.fuzzy_threshold:
+            result, _ = self.index.fuzzy(location_name, self.fuzzy_threshold)
+        self.stats.record('successes' if result else 'not_found', time.perf_counter() - started)
+        return result
+
+
+_providers = None
+_providers_lock = threading.Lock()
+_local_provider = None
+_local_provider_loaded = False
+
+
+def get_providers():
+    '''
+    Return the process-wide providers in fallback order, so connection pools,
+    breaker state and stats outlive a single GeocodingService
+    '''
+    global _providers
+    
+    if _providers is None:
+        with _providers_lock:
+            if _providers is None:
+                options = {
+                    'timeout': getattr(settings, 'GEOCODE_PROVIDER_TIMEOUT', 10),
+                    'pool_size': getattr(settings, 'GEOCODE_POOL_SIZE', 10),
+                    'failure_threshold': getattr(settings, 'GEOCODE_BREAKER_FAILURES', 5),
+                    'reset_timeout': getattr(settings, 'GEOCODE_BREAKER_RESET_SECONDS', 30),
+                }
+                rates = getattr(settings, 'GEOCODE_PROVIDER_RATES', {})
+                _providers = [
+                    OpenRouteProvider(
+                        settings.OPENROUTE_API_KEY,
+                        limiter=get_rate_limiter(OpenRouteProvider.name),
+                        max_wait=rates.get(OpenRouteProvider.name, {}).get('max_wait'),
+                        **options
+                    ),
+                    NominatimProvider(
+                        limiter=get_rate_limiter(NominatimProvider.name),
+                        max_wait=rates.get(NominatimProvider.name, {}).get('max_wait'),
+                        **options
+                    ),
+                ]
+    return _providers
+
+
+def get_local_provider():
+    '''
+    Return the process-wide GazetteerProvider, or None when no gazetteer is configured
+    '''
+    global _local_provider, _local_provider_loaded
+    
+    if not _local_provider_loaded:
+        with _providers_lock:
+            if not _local_provider_loaded:
+                from .gazetteer import get_gazetteer
+                
+                index = get_gazetteer()
+                if index is not None:
+                    _local_provider = GazetteerProvider(
+                        index,
+                        fuzzy_threshold=getattr(settings, 'GAZETTEER_FUZZY_THRESHOLD', None)
+                    )
+                _local_provider_loaded = True
+    return _local_provider
@@ -1,8 +1,13 @@
 # api/utils/hos_calculator.py - Updated with start_time support
 
 from datetime import datetime, timedelta
+from django.conf import settings
 from typing import List, Dict
 
+from .hos_engine import CycleTracker, HOSEngine, HOSState
+from .polyline import route_polyline
+from .sleeper_planner import SleeperPlanner
+
 
 class HOSCalculator:
     '''
@@ -17,154 +22,72 @@ class HOSCalculator:
     REQUIRED_BREAK_MINUTES = 30
     WEEKLY_LIMIT = 70
     WEEKLY_DAYS = 8
+    RESTART_HOURS = 34
     
-    def __init__(self, current_cycle_hours=0):
-        self.current_cycle_hours = current_cycle_hours
-        self.available_hours = self.WEEKLY_LIMIT - current_cycle_hours
+    FUEL_INTERVAL_MILES = 1000
     
-    def calculate_stops(self, route_data, start_time=None):
+    def __init__(self, current_cycle_hours=0, duty_history=None):
+        '''
+        duty_history: the driver's on-duty hours for each of the days before
+        the trip, oldest first. Without it current_cycle_hours is all
+        counted on the previous day, the latest it could possibly expire.
+        '''
+        if duty_history is None:
+            duty_history = [current_cycle_hours] if current_cycle_hours else []
+        self.duty_history = list(duty_history)[-(self.WEEKLY_DAYS - 1):]
+        self.current_cycle_hours = sum(self.duty_history)
+        self.available_hours = max(0, self.WEEKLY_LIMIT - self.current_cycle_hours)
+        self.engine = HOSEngine(
+            max_driving=self.MAX_DRIVING_HOURS,
+            max_window=self.MAX_DUTY_WINDOW,
+            rest_hours=self.REQUIRED_REST_HOURS,
+            break_after=self.BREAK_AFTER_DRIVING_HOURS,
+            break_hours=self.REQUIRED_BREAK_MINUTES / 60,
+            fuel_interval_miles=self.FUEL_INTERVAL_MILES,
+            restart_hours=self.RESTART_HOURS,
+        )
+        self.planner = SleeperPlanner(
+            self.engine, cpu_budget=getattr(settings, 'SLEEPER_PLANNER_CPU_SECONDS', 0.5)
+        )
+    
+    def calculate_stops(self, route_data, start_time=None, split_sleeper=False):
         '''
         Generate HOS-compliant stop schedule
         
         Args:
-            route_data: Dictionary with segment1, segment2, and coordinates
+            route_data: Dictionary with the route 'segments' (current -> pickup
+                -> ... -> dropoff) and, when built by RouteCalculator, its 'polyline'
             start_time: datetime object for when the trip starts (defaults to 6 AM today)
+            split_sleeper: search 7/3 and 8/2 sleeper-berth splits for a faster
+                schedule; the result then also has a 'sleeper_plan' comparison
         '''
-        stops = []
-        
         # ✅ FIX: Use provided start_time or default to 6 AM
         if start_time is None:
-            current_time = datetime.now().replace(hour=6, minute=0, second=0, microsecond=0)
-        else:
-            current_time = start_time
-        
-        print(f"🕐 HOSCalculator starting at: {current_time.strftime('%I:%M %p')}")
-        
-        # Calculate total segments
-        segment1 = route_data['segment1']  # Current to Pickup
-        segment2 = route_data['segment2']  # Pickup to Dropoff
-        
-        total_distance = route_data['total_distance']
-        
-        # Track driving hours and duty hours
-        current_driving_hours = 0
-        current_duty_hours = 0
-        hours_since_break = 0
-        day_number = 1
-        
-        # START
-        stops.append({
-            'type': 'start',
-            'location': segment1['start'],
-            'latitude': segment1['start_coords']['lat'],
-            'longitude': segment1['start_coords']['lon'],
-            'arrival_time': current_time,
-            'departure_time': current_time,  # ✅ FIX: Start immediately, no 1-hour delay
-            'duration_hours': 0,
-            'notes': 'Trip start - Pre-trip inspection completed',
-            'order': len(stops)
-        })
+            start_time = datetime.now().replace(hour=6, minute=0, second=0, microsecond=0)
         
-        # No need to add 1 hour here - pre-trip is instant
-        # current_time stays the same
-        
-        # Drive to PICKUP
-        drive_time_to_pickup = segment1['duration_hours']
-        fuel_stops_to_pickup = segment1['fuel_stops_needed']
-        
-        result = self._drive_segment(
-            stops, current_time, current_driving_hours, current_duty_hours,
-            hours_since_break, drive_time_to_pickup, fuel_stops_to_pickup,
-            segment1['start_coords'], segment1['end_coords'],
-            segment1['start'], segment1['end']
-        )
-        
-        stops = result['stops']
-        current_time = result['current_time']
-        current_driving_hours = result['current_driving_hours']
-        current_duty_hours = result['current_duty_hours']
-        hours_since_break = result['hours_since_break']
-        
-        # PICKUP
-        stops.append({
-            'type': 'pickup',
-            'location': segment1['end'],
-            'latitude': segment1['end_coords']['lat'],
-            'longitude': segment1['end_coords']['lon'],
-            'arrival_time': current_time,
-            'departure_time': current_time + timedelta(hours=1),
-            'duration_hours': 1,
-            'notes': 'Load cargo - 1 hour',
-            'order': len(stops)
-        })
-        
-        current_time += timedelta(hours=1)
-        current_duty_hours += 1
-        
-        # Check if rest is needed after pickup
-        if current_duty_hours >= self.MAX_DUTY_WINDOW or \
-           current_driving_hours >= self.MAX_DRIVING_HOURS:
-            
-            stops.append({
-                'type': 'rest',
-                'location': segment1['end'],
-                'latitude': segment1['end_coords']['lat'],
-                'longitude': segment1['end_coords']['lon'],
-                'arrival_time': current_time,
-                'departure_time': current_time + timedelta(hours=self.REQUIRED_REST_HOURS),
-                'duration_hours': self.REQUIRED_REST_HOURS,
-                'notes': 'Required 10-hour rest - HOS compliance',
-                'order': len(stops)
-            })
-            
-            current_time += timedelta(hours=self.REQUIRED_REST_HOURS)
-            current_driving_hours = 0
-            current_duty_hours = 0
-            hours_since_break = 0
-            day_number += 1
-        
-        # Drive to DROPOFF
-        drive_time_to_dropoff = segment2['duration_hours']
-        fuel_stops_to_dropoff = segment2['fuel_stops_needed']
-        
-        result = self._drive_segment(
-            stops, current_time, current_driving_hours, current_duty_hours,
-            hours_since_break, drive_time_to_dropoff, fuel_stops_to_dropoff,
-            segment2['start_coords'], segment2['end_coords'],
-            segment2['start'], segment2['end']
-        )
+        print(f"🕐 HOSCalculator starting at: {start_time.strftime('%I:%M %p')}")
         
-        stops = result['stops']
-        current_time = result['current_time']
-        current_driving_hours = result['current_driving_hours']
-        current_duty_hours = result['current_duty_hours']
-        
-        # DROPOFF
-        stops.append({
-            'type': 'dropoff',
-            'location': segment2['end'],
-            'latitude': segment2['end_coords']['lat'],
-            'longitude': segment2['end_coords']['lon'],
-            'arrival_time': current_time,
-            'departure_time': current_time + timedelta(hours=1),
-            'duration_hours': 1,
-            'notes': 'Unload cargo - Trip complete',
-            'order': len(stops)
-        })
+        segments = route_data['segments']  # Current -> pickup -> ... -> dropoff
+        plan = None
+        if split_sleeper:
+            plan = self.planner.plan(segments, self.initial_state(start_time))
+            records, state = plan['records'], plan['state']
+        else:
+            records, state = self.schedule(segments, start_time)
+        polyline = route_data.get('polyline') or route_polyline(segments)
+        stops = self.to_stop_dicts(records, segments, polyline, start_time)
         
-        # Calculate totals
-        total_driving_hours = sum(s.get('duration_hours', 0) for s in stops 
-                                 if s['type'] not in ['rest', 'pickup', 'dropoff', 'start'])
-        total_rest_hours = sum(s.get('duration_hours', 0) for s in stops 
-                              if s['type'] == 'rest')
-        total_hours = (stops[-1]['departure_time'] - stops[0]['arrival_time']).total_seconds() / 3600
+        total_driving_hours = state.total_driving
+        total_rest_hours = state.total_rest
+        total_hours = records[-1].end - records[0].start
         
         print(f"✅ HOS calculation complete:")
         print(f"  Start: {stops[0]['arrival_time'].strftime('%I:%M %p')}")
         print(f"  End: {stops[-1]['departure_time'].strftime('%I:%M %p')}")
         print(f"  Total hours: {total_hours:.1f}h")
+        print(f"  Cycle: {self.current_cycle_hours:.1f}h used at start, {state.restarts} restart(s)")
         
-        return {
+        result = {
             'stops': stops,
             'total_driving_hours': round(total_driving_hours, 1),
             'total_rest_hours': round(total_rest_hours, 1),
@@ -172,8 +95,97 @@ class HOSCalculator:
             'total_duration_formatted': self._format_duration(total_hours),
             'driving_time_formatted': self._format_duration(total_driving_hours),
             'rest_time_formatted': self._format_duration(total_rest_hours),
-            'total_days': day_number
+            'total_days': state.rests + 1,
+            'cycle_hours_used': round(state.cycle.used_at(state.clock), 1),
+            'cycle_restarts': state.restarts
         }
+        if plan:
+            baseline = plan['baseline_state']
+            result['sleeper_plan'] = {
+                'total_hours': round(state.clock, 1),
+                'baseline_total_hours': round(baseline.clock, 1),
+                'hours_saved': round(baseline.clock - state.clock, 1),
+                'baseline_rest_hours': round(baseline.total_rest, 1),
+                'baseline_stops': len(plan['baseline_records']),
+                'split_rests': sum(1 for record in records if record.kind == 'sleeper'),
+                'nodes': plan['nodes'],
+                'timed_out': plan['timed_out'],
+            }
+        return result
+    
+    def schedule(self, segments, start_time=None):
+        '''
+        Run the HOS engine over route segments; returns (StopRecords, final HOSState).
+        start_time places the 70-hour/8-day cycle's day boundaries.
+        '''
+        return self.engine.schedule(segments, self.initial_state(start_time))
+    
+    def initial_state(self, start_time=None):
+        day_start = start_time.hour + start_time.minute / 60 if start_time else 0.0
+        return HOSState(CycleTracker(self.WEEKLY_LIMIT, self.WEEKLY_DAYS, self.duty_history, day_start))
+    
+    def to_stop_dicts(self, records, segments, polyline, start_time, prior_deliveries=0):
+        '''
+        Turn StopRecords into the stop dicts used by the views and models.
+        En-route stops are located on the polyline in one vectorized lookup.
+        prior_deliveries counts dropoffs made before these records (re-plans).
+        '''
+        latitudes, longitudes = polyline.points_at([record.route_mile for record in records])
+        deliveries = prior_deliveries + sum(1 for record in records if record.kind == 'dropoff')
+        delivered = prior_deliveries
+        
+        stops = []
+        for record, lat, lon in zip(records, latitudes.tolist(), longitudes.tolist()):
+            if record.kind == 'dropoff':
+                delivered += 1
+            segment = segments[record.segment]
+            if record.kind == 'start':
+                location, coords = segment['start'], segment['start_coords']
+            elif record.kind in ('pickup', 'dropoff'):
+                location, coords = segment['end'], segment['end_coords']
+            elif record.fraction <= 0 and record.segment > 0:
+                # Waiting at the previous stop before setting off on this segment
+                location, coords = segment['start'], segment['start_coords']
+            else:
+                location = self._interpolate_location(segment['start'], segment['end'],
+                                                      record.fraction, record.route_mile)
+                coords = {'lat': lat, 'lon': lon}
+            
+            arrival = start_time + timedelta(hours=record.start)
+            stops.append({
+                'type': record.kind,
+                'location': location,
+                'latitude': coords['lat'],
+                'longitude': coords['lon'],
+                'arrival_time': arrival,
+                'departure_time': arrival + timedelta(hours=record.duration),
+                'duration_hours': record.duration,
+                'notes': self._stop_notes(record.kind, delivered, deliveries),
+                'order': len(stops),
+                'route_mile': round(record.route_mile, 1)
+            })
+        return stops
+    
+    def _stop_notes(self, kind, delivered, deliveries):
+        if kind == 'start':
+            return 'Trip start - Pre-trip inspection completed'
+        if kind == 'pickup':
+            return 'Load cargo - 1 hour'
+        if kind == 'dropoff':
+            if delivered == deliveries:
+                return 'Unload cargo - Trip complete'
+            return f'Unload cargo - delivery {delivered} of {deliveries}'
+        if kind == 'rest':
+            return f'Required {self.REQUIRED_REST_HOURS}-hour rest - HOS compliance'
+        if kind == 'sleeper':
+            return 'Sleeper berth - split rest period'
+        if kind == 'restart':
+            return f'{self.RESTART_HOURS}-hour restart - {self.WEEKLY_LIMIT}-hour/{self.WEEKLY_DAYS}-day cycle reached'
+        if kind == 'break':
+            return f'Required {self.REQUIRED_BREAK_MINUTES}-minute break'
+        if kind == 'fuel':
+            return 'Fuel stop - 30 minutes'
+        return ''
     
     def needs_break(self):
         """Check if driver needs a break"""
@@ -192,141 +204,19 @@ class HOSCalculator:
         """Track break time"""
         pass  # Tracked internally in calculate_stops
     
-    def _drive_segment(self, stops, current_time, current_driving_hours, 
-                      current_duty_hours, hours_since_break, segment_drive_time,
-                      fuel_stops_count, start_coords, end_coords, start_loc, end_loc):
-        '''
-        Handle driving a segment with breaks and rest periods
-        '''
-        remaining_drive_time = segment_drive_time
-        distance_driven = 0
-        
-        while remaining_drive_time > 0:
-            # Check if break needed (every 8 hours of driving)
-            if hours_since_break >= self.BREAK_AFTER_DRIVING_HOURS:
-                # 30-minute break
-                stops.append({
-                    'type': 'break',
-                    'location': self._interpolate_location(
-                        start_loc, end_loc, 
-                        distance_driven / segment_drive_time if segment_drive_time > 0 else 0
-                    ),
-                    'latitude': self._interpolate_coords(start_coords, end_coords, 
-                        distance_driven / segment_drive_time if segment_drive_time > 0 else 0)['lat'],
-                    'longitude': self._interpolate_coords(start_coords, end_coords,
-                        distance_driven / segment_drive_time if segment_drive_time > 0 else 0)['lon'],
-                    'arrival_time': current_time,
-                    'departure_time': current_time + timedelta(minutes=self.REQUIRED_BREAK_MINUTES),
-                    'duration_hours': 0.5,
-                    'notes': 'Required 30-minute break',
-                    'order': len(stops)
-                })
-                current_time += timedelta(minutes=self.REQUIRED_BREAK_MINUTES)
-                current_duty_hours += 0.5
-                hours_since_break = 0
-            
-            # Check if rest needed (11-hour driving or 14-hour duty limit)
-            if current_driving_hours >= self.MAX_DRIVING_HOURS or \
-               current_duty_hours >= self.MAX_DUTY_WINDOW:
-                
-                coords = self._interpolate_coords(start_coords, end_coords,
-                    distance_driven / segment_drive_time if segment_drive_time > 0 else 0)
-                
-                stops.append({
-                    'type': 'rest',
-                    'location': self._interpolate_location(
-                        start_loc, end_loc,
-                        distance_driven / segment_drive_time if segment_drive_time > 0 else 0
-                    ),
-                    'latitude': coords['lat'],
-                    'longitude': coords['lon'],
-                    'arrival_time': current_time,
-                    'departure_time': current_time + timedelta(hours=self.REQUIRED_REST_HOURS),
-                    'duration_hours': self.REQUIRED_REST_HOURS,
-                    'notes': 'Required 10-hour rest - HOS compliance',
-                    'order': len(stops)
-                })
-                
-                current_time += timedelta(hours=self.REQUIRED_REST_HOURS)
-                current_driving_hours = 0
-                current_duty_hours = 0
-                hours_since_break = 0
-                continue
-            
-            # Calculate how much we can drive
-            can_drive_before_break = self.BREAK_AFTER_DRIVING_HOURS - hours_since_break
-            can_drive_before_limit = min(
-                self.MAX_DRIVING_HOURS - current_driving_hours,
-                self.MAX_DUTY_WINDOW - current_duty_hours
-            )
-            can_drive = min(can_drive_before_break, can_drive_before_limit, remaining_drive_time)
-            
-            # Add fuel stop if needed (every 1000 miles approximately)
-            if fuel_stops_count > 0 and distance_driven + can_drive * 55 >= 1000:
-                fuel_drive_time = (1000 - distance_driven) / 55
-                
-                current_time += timedelta(hours=fuel_drive_time)
-                current_driving_hours += fuel_drive_time
-                current_duty_hours += fuel_drive_time
-                hours_since_break += fuel_drive_time
-                remaining_drive_time -= fuel_drive_time
-                distance_driven = 0
-                fuel_stops_count -= 1
-                
-                fraction = (segment_drive_time - remaining_drive_time) / segment_drive_time if segment_drive_time > 0 else 0
-                coords = self._interpolate_coords(start_coords, end_coords, fraction)
-                
-                # Fuel stop
-                stops.append({
-                    'type': 'fuel',
-                    'location': self._interpolate_location(start_loc, end_loc, fraction),
-                    'latitude': coords['lat'],
-                    'longitude': coords['lon'],
-                    'arrival_time': current_time,
-                    'departure_time': current_time + timedelta(minutes=30),
-                    'duration_hours': 0.5,
-                    'notes': 'Fuel stop - 30 minutes',
-                    'order': len(stops)
-                })
-                
-                current_time += timedelta(minutes=30)
-                current_duty_hours += 0.5
-                # Fuel stop can count as break
-                hours_since_break = 0
-                continue
-            
-            # Drive
-            current_time += timedelta(hours=can_drive)
-            current_driving_hours += can_drive
-            current_duty_hours += can_drive
-            hours_since_break += can_drive
-            remaining_drive_time -= can_drive
-            distance_driven += can_drive * 55
-        
-        return {
-            'stops': stops,
-            'current_time': current_time,
-            'current_driving_hours': current_driving_hours,
-            'current_duty_hours': current_duty_hours,
-            'hours_since_break': hours_since_break
-        }
-    
-    def _interpolate_coords(self, start_coords, end_coords, fraction):
-        """Interpolate coordinates between start and end"""
-        lat = start_coords['lat'] + (end_coords['lat'] - start_coords['lat']) * fraction
-        lon = start_coords['lon'] + (end_coords['lon'] - start_coords['lon']) * fraction
-        return {'lat': lat, 'lon': lon}
-    
-    def _interpolate_location(self, start, end, fraction):
+    def _interpolate_location(self, start, end, fraction, route_mile=None):
         '''
         Create a location name between start and end
         '''
         if fraction < 0.3:
-            return f"En route from {start}"
+            name = f"En route from {start}"
         elif fraction > 0.7:
-            return f"Approaching {end}"
+            name = f"Approaching {end}"
         else:
-            return f"En route: {start} to {end}"
+            name = f"En route: {start} to {end}"
+        if route_mile is not None:
+            name += f" (mile {route_mile:.0f})"
+        return name
     
     def _format_duration(self, hours):
         '''
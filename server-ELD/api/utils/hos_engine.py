@@ -0,0 +1,256 @@
+# api/utils/hos_engine.py - Event-driven HOS scheduling with compact stop records
+
+from collections import deque
+
+# Tolerance for comparing hour clocks, well below a second
+EPSILON = 1e-9
+
+
+class StopRecord:
+    '''
+    One scheduled stop. Times are hours from the trip start; coordinates and
+    display text are only worked out when records are turned into dicts.
+    '''
+    __slots__ = ('kind', 'start', 'duration', 'route_mile', 'segment', 'fraction')
+    
+    def __init__(self, kind, start, duration, route_mile, segment, fraction):
+        self.kind = kind
+        self.start = start
+        self.duration = duration
+        self.route_mile = route_mile
+        self.segment = segment      # index of the segment the stop is on
+        self.fraction = fraction    # how far through that segment, 0.0 - 1.0
+    
+    @property
+    def end(self):
+        return self.start + self.duration
+    
+    def __repr__(self):
+        return f"StopRecord({self.kind!r}, start={self.start:.2f}h, {self.duration}h, mile {self.route_mile:.1f})"
+
+
+class CycleTracker:
+    '''
+    Rolling on-duty total for the 70-hour/8-day rule.
+    
+    Keeps one on-duty total per calendar day for the last `days` days
+    (today included) and their running sum, so adding time or crossing
+    midnight is O(1): the oldest day drops out of the sum as a new one is
+    appended. Days are counted from `day_start`, the hour of the day at
+    clock 0, so hours roll off at the driver's local midnight.
+    '''
+    __slots__ = ('limit', 'days', 'totals', 'used', 'day', 'day_start')
+    
+    def __init__(self, limit=70, days=8, history=(), day_start=0.0):
+        '''
+        history: on-duty hours for the days before the trip, oldest first;
+        only the most recent days - 1 entries can still count
+        '''
+        self.limit = limit
+        self.days = days
+        previous = [float(hours) for hours in history][-(days - 1):] if days > 1 else []
+        self.totals = deque([0.0] * (days - 1 - len(previous)) + previous + [0.0], maxlen=days)
+        self.used = sum(self.totals)
+        self.day = 0
+        self.day_start = day_start
+    
+    def _roll(self, clock):
+        day = int((self.day_start + clock + EPSILON) // 24)
+        if day - self.day >= self.days:
+            self.totals.extend([0.0] * self.days)
+            self.used = 0.0
+        else:
+            for _ in range(day - self.day):
+                self.used -= self.totals[0]
+                self.totals.append(0.0)
+        self.day = max(day, self.day)
+    
+    def used_at(self, clock):
+        '''
+        On-duty hours in the window ending on the day of `clock`
+        '''
+        self._roll(clock)
+        return self.used
+    
+    def available(self, clock):
+        '''
+        Hours that can still be driven at `clock`
+        '''
+        return max(0.0, self.limit - self.used_at(clock))
+    
+    def add(self, clock, hours):
+        '''
+        Count on-duty time starting at `clock`, split at midnight
+        '''
+        while hours > EPSILON:
+            self._roll(clock)
+            chunk = min(hours, (self.day + 1) * 24 - self.day_start - clock)
+            self.totals[-1] += chunk
+            self.used += chunk
+            clock += chunk
+            hours -= chunk
+    
+    def copy(self):
+        other = CycleTracker.__new__(CycleTracker)
+        other.limit, other.days, other.day, other.day_start = self.limit, self.days, self.day, self.day_start
+        other.totals = deque(self.totals, maxlen=self.days)
+        other.used = self.used
+        return other
+    
+    def restart(self, clock):
+        '''
+        34 consecutive hours off duty ending at `clock` starts a new cycle
+        '''
+        self._roll(clock)
+        self.totals.extend([0.0] * self.days)
+        self.used = 0.0
+
+
+class HOSState:
+    '''
+    HOS clocks, all in hours: elapsed time, driving since the last 10-hour
+    rest, time since the 14-hour window opened, driving since the last
+    30-minute interruption, plus miles since the last fuel stop and the
+    70-hour/8-day cycle
+    '''
+    __slots__ = ('clock', 'driving', 'window', 'since_break', 'fuel_miles', 'cycle',
+                 'total_driving', 'total_rest', 'rests', 'restarts')
+    
+    def __init__(self, cycle=None):
+        self.cycle = cycle or CycleTracker()
+        self.clock = 0.0
+        self.driving = 0.0
+        self.window = 0.0
+        self.since_break = 0.0
+        self.fuel_miles = 0.0
+        self.total_driving = 0.0
+        self.total_rest = 0.0
+        self.rests = 0
+        self.restarts = 0
+    
+    def copy(self):
+        other = self.__class__.__new__(self.__class__)
+        for cls in type(self).__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                setattr(other, name, getattr(self, name))
+        other.cycle = self.cycle.copy()
+        return other
+    
+    def drive(self, hours, miles):
+        self.cycle.add(self.clock, hours)
+        self.clock += hours
+        self.driving += hours
+        self.window += hours
+        self.since_break += hours
+        self.fuel_miles += miles
+        self.total_driving += hours
+    
+    def on_duty(self, hours):
+        '''
+        On-duty, not driving (loading, fueling, breaks): the 14-hour window
+        keeps running, and 30 minutes or more counts as the required break
+        '''
+        self.cycle.add(self.clock, hours)
+        self.clock += hours
+        self.window += hours
+        if hours >= 0.5 - EPSILON:
+            self.since_break = 0.0
+    
+    def rest(self, hours):
+        self.clock += hours
+        self.driving = 0.0
+        self.window = 0.0
+        self.since_break = 0.0
+        self.total_rest += hours
+        self.rests += 1
+
+    def restart(self, hours):
+        self.rest(hours)
+        self.cycle.restart(self.clock)
+        self.restarts += 1
+
+
+class HOSEngine:
+    '''
+    Schedules a route (a list of segment dicts with distance, duration_hours
+    and stop_type) into StopRecords.
+    
+    Driving is advanced straight to the next limiting event - the 8-hour
+    break, 11-hour driving limit, 14-hour window, 70-hour cycle, fuel range
+    or the end of the segment - whichever comes first, so the work per segment is
+    proportional to the number of stops rather than the hours driven.
+    '''
+    
+    def __init__(self, max_driving=11, max_window=14, rest_hours=10, break_after=8,
+                 break_hours=0.5, fuel_interval_miles=1000, fuel_hours=0.5, stop_hours=1.0,
+                 restart_hours=34):
+        self.max_driving = max_driving
+        self.max_window = max_window
+        self.rest_hours = rest_hours
+        self.break_after = break_after
+        self.break_hours = break_hours
+        self.fuel_interval_miles = fuel_interval_miles
+        self.fuel_hours = fuel_hours
+        self.stop_hours = stop_hours
+        self.restart_hours = restart_hours
+    
+    def schedule(self, segments, state=None):
+        '''
+        Return (records, state): the start record, every en-route stop and
+        each segment's pickup/dropoff, plus the final HOS state
+        '''
+        state = state or HOSState()
+        records = [StopRecord('start', state.clock, 0.0, 0.0, 0, 0.0)]
+        offset = 0.0
+        
+        for index, segment in enumerate(segments):
+            self._drive(state, records, index, segment['distance'], segment['duration_hours'], offset)
+            offset += segment['distance']
+            
+            records.append(StopRecord(segment.get('stop_type', 'dropoff'), state.clock,
+                                      self.stop_hours, offset, index, 1.0))
+            state.on_duty(self.stop_hours)
+        
+        return records, state
+    
+    def _drive(self, state, records, index, miles, hours, offset):
+        speed = miles / hours if hours > 0 else 0.0
+        done = 0.0
+        
+        while hours - done > EPSILON:
+            if state.driving >= self.max_driving - EPSILON or state.window >= self.max_window - EPSILON:
+                records.append(self._record('rest', state, self.rest_hours, offset, speed, done, hours, index))
+                state.rest(self.rest_hours)
+                continue
+            available = state.cycle.available(state.clock)
+            if available <= EPSILON:
+                # Out of cycle hours: only a 34-hour restart gets the driver moving again
+                records.append(self._record('restart', state, self.restart_hours, offset, speed, done, hours, index))
+                state.restart(self.restart_hours)
+                continue
+            if speed and state.fuel_miles >= self.fuel_interval_miles - EPSILON:
+                # Fueling takes 30 minutes, which also satisfies the break
+                records.append(self._record('fuel', state, self.fuel_hours, offset, speed, done, hours, index))
+                state.on_duty(self.fuel_hours)
+                state.fuel_miles = 0.0
+                continue
+            if state.since_break >= self.break_after - EPSILON:
+                records.append(self._record('break', state, self.break_hours, offset, speed, done, hours, index))
+                state.on_duty(self.break_hours)
+                continue
+            
+            # Closed form: drive until the first limit is reached
+            step = min(
+                hours - done,
+                self.max_driving - state.driving,
+                self.max_window - state.window,
+                self.break_after - state.since_break,
+                available,
+                (self.fuel_interval_miles - state.fuel_miles) / speed if speed else hours,
+            )
+            state.drive(step, step * speed)
+            done += step
+    
+    def _record(self, kind, state, duration, offset, speed, done, hours, index):
+        return StopRecord(kind, state.clock, duration, offset + done * speed, index,
+                          done / hours if hours > 0 else 0.0)
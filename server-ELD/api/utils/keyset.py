@@ -0,0 +1,36 @@
+# api/utils/keyset.py - Opaque cursors for keyset pagination of saved logs on (log_date, id)
+
+import base64
+from datetime import date
+
+from django.db.models import Q
+
+
+def encode_cursor(log):
+    '''
+    Cursor pointing just past `log` in newest-first (log_date, id) order
+    '''
+    key = f"{log.log_date.isoformat()},{log.id}"
+    return base64.urlsafe_b64encode(key.encode('ascii')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    '''
+    (log_date, id) from encode_cursor output; raises ValueError if malformed
+    '''
+    try:
+        key = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii')
+        log_date, log_id = key.split(',')
+        return date.fromisoformat(log_date), int(log_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor {cursor!r}") from e
+
+
+def logs_before(queryset, cursor):
+    '''
+    Logs that come after the cursor in newest-first order. The log_date__lte
+    bound is redundant with the OR but lets the (…, log_date, id) indexes
+    serve the page as a range scan instead of filtering every row.
+    '''
+    log_date, log_id = cursor
+    return queryset.filter(Q(log_date__lt=log_date) | Q(id__lt=log_id), log_date__lte=log_date)
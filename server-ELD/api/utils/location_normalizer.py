@@ -0,0 +1,195 @@
+# api/utils/location_normalizer.py - Canonical location keys and fuzzy name matching
+
+import math
+import threading
+import unicodedata
+
+US_STATES = {
+    'al': 'alabama', 'ak': 'alaska', 'az': 'arizona', 'ar': 'arkansas',
+    'ca': 'california', 'co': 'colorado', 'ct': 'connecticut', 'de': 'delaware',
+    'dc': 'district of columbia', 'fl': 'florida', 'ga': 'georgia', 'hi': 'hawaii',
+    'id': 'idaho', 'il': 'illinois', 'in': 'indiana', 'ia': 'iowa',
+    'ks': 'kansas', 'ky': 'kentucky', 'la': 'louisiana', 'me': 'maine',
+    'md': 'maryland', 'ma': 'massachusetts', 'mi': 'michigan', 'mn': 'minnesota',
+    'ms': 'mississippi', 'mo': 'missouri', 'mt': 'montana', 'ne': 'nebraska',
+    'nv': 'nevada', 'nh': 'new hampshire', 'nj': 'new jersey', 'nm': 'new mexico',
+    'ny': 'new york', 'nc': 'north carolina', 'nd': 'north dakota', 'oh': 'ohio',
+    'ok': 'oklahoma', 'or': 'oregon', 'pa': 'pennsylvania', 'ri': 'rhode island',
+    'sc': 'south carolina', 'sd': 'south dakota', 'tn': 'tennessee', 'tx': 'texas',
+    'ut': 'utah', 'vt': 'vermont', 'va': 'virginia', 'wa': 'washington',
+    'wv': 'west virginia', 'wi': 'wisconsin', 'wy': 'wyoming',
+}
+
+# Abbreviations that mean something different as the first word of a place name
+LEADING_ABBREVIATIONS = {
+    'st': 'saint', 'ste': 'sainte', 'ft': 'fort', 'mt': 'mount', 'pt': 'port',
+}
+
+STREET_ABBREVIATIONS = {
+    'st': 'street', 'rd': 'road', 'ave': 'avenue', 'av': 'avenue',
+    'blvd': 'boulevard', 'hwy': 'highway', 'fwy': 'freeway', 'pkwy': 'parkway',
+    'dr': 'drive', 'ln': 'lane', 'ct': 'court',
+}
+
+# Address words that change which place is meant, so two keys only fuzzy-match if theirs agree
+DIRECTIONS = {
+    'n': 'north', 's': 'south', 'e': 'east', 'w': 'west',
+    'ne': 'northeast', 'nw': 'northwest', 'se': 'southeast', 'sw': 'southwest',
+    'north': 'north', 'south': 'south', 'east': 'east', 'west': 'west',
+    'northeast': 'northeast', 'northwest': 'northwest', 'southeast': 'southeast', 'southwest': 'southwest',
+}
+UNIT_DESIGNATORS = {
+    'apt': 'apartment', 'apartment': 'apartment', 'unit': 'unit', 'ste': 'suite', 'suite': 'suite',
+    'bldg': 'building', 'building': 'building', 'fl': 'floor', 'floor': 'floor', 'rm': 'room', 'room': 'room',
+}
+
+# Trailing country tokens dropped once a US state has been recognised
+US_COUNTRY_TOKENS = {'us', 'usa', 'u s', 'u s a', 'united states', 'united states of america'}
+
+
+def tokenize(text):
+    '''
+    Fold accents and case, turn punctuation into spaces and split into tokens
+    '''
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    text = text.replace('&', ' and ')
+    text = ''.join(c if c.isalnum() else ' ' for c in text)
+    return text.split()
+
+
+def normalize_location(text):
+    '''
+    Canonical cache/index key for a free-text location.
+    
+    "Chicago, IL", "chicago il" and " Chicago, Illinois " all become
+    "chicago illinois"; "St. Louis, MO" becomes "saint louis missouri".
+    '''
+    tokens = tokenize(text or '')
+    if not tokens:
+        return ''
+    
+    # Drop a trailing "USA" / "United States" when a state precedes it
+    joined = ' '.join(tokens)
+    for country in sorted(US_COUNTRY_TOKENS, key=len, reverse=True):
+        if joined.endswith(' ' + country):
+            head = joined[:-len(country) - 1].split()
+            if head and (head[-1] in US_STATES or head[-1] in US_STATES.values()
+                         or (head[-1].isdigit() and len(head) > 1)):
+                tokens = head
+            break
+    
+    expanded = []
+    last = len(tokens) - 1
+    for position, token in enumerate(tokens):
+        if position == 0 and token in LEADING_ABBREVIATIONS and last > 0:
+            expanded.append(LEADING_ABBREVIATIONS[token])
+        elif position > 0 and token in US_STATES and (
+            position == last or tokens[position + 1].isdigit()
+        ):
+            # A state code is only expanded at the end, or just before a ZIP code
+            expanded.append(US_STATES[token])
+        elif position > 0 and token in STREET_ABBREVIATIONS and any(t.isdigit() for t in tokens[:position]):
+            # Street suffixes only appear in addresses, which start with a house number
+            expanded.append(STREET_ABBREVIATIONS[token])
+        else:
+            expanded.append(token)
+    
+    return ' '.join(expanded)
+
+
+def exact_tokens(key):
+    '''
+    The parts of a normalized key that must agree exactly for a fuzzy
+    match: numbers (house numbers, ZIP codes), directions and unit
+    designators with the unit that follows them
+    '''
+    tokens = key.split()
+    exact = []
+    for position, token in enumerate(tokens):
+        if any(c.isdigit() for c in token):
+            exact.append(token)
+        elif token in DIRECTIONS:
+            exact.append(DIRECTIONS[token])
+        elif token in UNIT_DESIGNATORS and position > 0:
+            exact.append(UNIT_DESIGNATORS[token])
+            if position < len(tokens) - 1 and not any(c.isdigit() for c in tokens[position + 1]):
+                exact.append(tokens[position + 1])
+    return exact
+
+
+def trigrams(key):
+    '''
+    Set of padded character trigrams for a normalized key
+    '''
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FuzzyNameIndex:
+    '''
+    Mutable trigram index over names that have already been resolved.
+    
+    match() maps a near-duplicate key onto the stored key it most resembles,
+    so spelling variants share one cached coordinate. Keys whose numbers
+    (house numbers, ZIP codes), directions or units differ never match
+    each other: "500 E Madison St" is not "500 W Madison St".
+    '''
+    
+    def __init__(self, threshold=0.8, max_entries=100000):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._normalized = []   # entry id -> normalized key
+        self._targets = []      # entry id -> stored cache key
+        self._ids = {}          # normalized key -> entry id
+        self._postings = {}     # trigram -> set of entry ids
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self._normalized)
+    
+    def add(self, normalized, target=None):
+        target = target or normalized
+        with self._lock:
+            if normalized in self._ids or len(self._normalized) >= self.max_entries:
+                return
+            entry_id = len(self._normalized)
+            self._normalized.append(normalized)
+            self._targets.append(target)
+            self._ids[normalized] = entry_id
+            for gram in trigrams(normalized):
+                self._postings.setdefault(gram, set()).add(entry_id)
+    
+    def match(self, normalized):
+        '''
+        Return (stored_key, similarity) for the best match at or above the
+        threshold, or (None, best_similarity)
+        '''
+        with self._lock:
+            entry_id = self._ids.get(normalized)
+            if entry_id is not None:
+                return self._targets[entry_id], 1.0
+            
+            grams = trigrams(normalized)
+            # Prefix filtering: only the rarest trigrams need to be probed
+            needed = max(1, math.ceil(self.threshold * len(grams)))
+            rarest = sorted(grams, key=lambda g: len(self._postings.get(g, ())))
+            candidates = set()
+            for gram in rarest[:len(grams) - needed + 1]:
+                candidates.update(self._postings.get(gram, ()))
+            
+            exact = exact_tokens(normalized)
+            best_id, best_score = None, 0.0
+            for candidate in candidates:
+                other = self._normalized[candidate]
+                if exact_tokens(other) != exact:
+                    continue
+                other_grams = trigrams(other)
+                common = len(grams & other_grams)
+                score = common / (len(grams) + len(other_grams) - common)
+                if score > best_score:
+                    best_id, best_score = candidate, score
+            
+            if best_id is None or best_score < self.threshold:
+                return None, best_score
+            return self._targets[best_id], best_score
@@ -1,7 +1,12 @@
 # api/utils/log_generator.py - ELD log sheet generation
 
-from datetime import datetime, timedelta
-from typing import List, Dict
+from datetime import timedelta
+
+# Duty status codes, as on LogSegment
+OFF_DUTY, SLEEPER, DRIVING, ON_DUTY = 0, 1, 2, 3
+SUMMARY_KEYS = ('offDuty', 'sleeper', 'driving', 'onDuty')
+# Stops named in the day's remarks
+REMARK_KINDS = ('start', 'pickup', 'dropoff')
 
 
 class LogGenerator:
@@ -9,129 +14,52 @@ class LogGenerator:
     Generate ELD log sheets from stop timeline
     '''
     
-    def generate_logs(self, stops_timeline, route_data):
-        '''
-        Generate daily ELD logs from stops timeline
+    def __init__(self, driver_name='Driver', carrier_name='Carrier'):
+        self.driver_name = driver_name
+        self.carrier_name = carrier_name
+    
+    def generate_logs(self, stops_timeline, route_data=None):
         '''
-        stops = stops_timeline['stops']
-        logs = []
+        Yield one daily log per calendar day, from the day of the first stop
+        to the day of the last.
         
-        # Group stops by day
-        current_day_start = stops[0]['arrival_time'].replace(
-            hour=0, minute=0, second=0, microsecond=0
-        )
-        day_number = 1
-        
-        while current_day_start < stops[-1]['departure_time']:
-            day_end = current_day_start + timedelta(days=1)
-            
-            # Get stops for this day
-            day_stops = [s for s in stops 
-                        if s['arrival_time'] >= current_day_start and 
-                        s['arrival_time'] < day_end]
-            
-            if not day_stops:
-                current_day_start = day_end
-                continue
-            
-            # Generate log for this day
-            log = self._generate_daily_log(
-                day_stops, current_day_start, day_number, 
-                route_data, stops_timeline
-            )
-            logs.append(log)
+        The stops are walked once: each stop and each drive between two
+        stops becomes a duty-status interval, intervals are cut at midnight,
+        and a day is yielded as soon as the timeline passes its end, so
+        callers can stream or stop early.
+        '''
+        day = None
+        for kind, status, start, end, location, miles in self._intervals(stops_timeline['stops']):
+            if day is None:
+                day = _DailyLog(start.replace(hour=0, minute=0, second=0, microsecond=0), 1)
             
-            current_day_start = day_end
-            day_number += 1
+            while end > day.end:
+                if start < day.end:
+                    # Miles are spread evenly over a drive that crosses midnight
+                    part = miles * (day.end - start) / (end - start)
+                    day.add(kind, status, start, day.end, location, part)
+                    miles -= part
+                    start = day.end
+                yield day.to_dict(self.driver_name, self.carrier_name)
+                day = day.next()
+            day.add(kind, status, start, end, location, miles)
         
-        return logs
+        if day is not None:
+            yield day.to_dict(self.driver_name, self.carrier_name)
     
-    def _generate_daily_log(self, day_stops, date, day_number, route_data, stops_timeline):
+    def _intervals(self, stops):
         '''
-        Generate a single day's ELD log
+        (stop type or None for driving, status, start, end, location, miles)
+        for each stop and each drive between stops, in time order
         '''
-        segments = []
-        summary = {
-            'off_duty': 0,
-            'sleeper': 0,
-            'driving': 0,
-            'on_duty': 0
-        }
-        
-        # Calculate miles for this day
-        daily_miles = sum(
-            self._calculate_stop_miles(stop, route_data) 
-            for stop in day_stops
-        )
-        
-        # Generate segments for the day
-        current_hour = 0
-        last_stop_end = 0
-        
-        for stop in day_stops:
-            stop_start_hour = (stop['arrival_time'] - date).total_seconds() / 3600
-            stop_end_hour = (stop['departure_time'] - date).total_seconds() / 3600
-            
-            # Clamp to 0-24 range
-            stop_start_hour = max(0, min(24, stop_start_hour))
-            stop_end_hour = max(0, min(24, stop_end_hour))
-            
-            duration = stop_end_hour - stop_start_hour
-            
-            # Fill gap with off-duty if needed
-            if stop_start_hour > last_stop_end:
-                gap_duration = stop_start_hour - last_stop_end
-                segments.append({
-                    'status': 0,  # Off duty
-                    'start': last_stop_end,
-                    'end': stop_start_hour,
-                    'location': ''
-                })
-                summary['off_duty'] += gap_duration
-            
-            # Add stop segment
-            status = self._get_status_from_stop_type(stop['stop_type'])
-            segments.append({
-                'status': status,
-                'start': stop_start_hour,
-                'end': stop_end_hour,
-                'location': stop['location']
-            })
-            
-            # Update summary
-            status_key = ['off_duty', 'sleeper', 'driving', 'on_duty'][status]
-            summary[status_key] += duration
-            
-            last_stop_end = stop_end_hour
-        
-        # Fill remaining time with off-duty
-        if last_stop_end < 24:
-            segments.append({
-                'status': 0,
-                'start': last_stop_end,
-                'end': 24,
-                'location': ''
-            })
-            summary['off_duty'] += (24 - last_stop_end)
-        
-        # Generate remarks
-        remarks = self._generate_remarks(day_stops, route_data)
-        
-        return {
-            'date': date.strftime('%m/%d/%Y'),
-            'day_number': day_number,
-            'driver': 'John Doe',
-            'carrier': 'Transport Co.',
-            'total_miles': round(daily_miles, 1),
-            'segments': segments,
-            'summary': {
-                'offDuty': round(summary['off_duty'], 1),
-                'sleeper': round(summary['sleeper'], 1),
-                'driving': round(summary['driving'], 1),
-                'onDuty': round(summary['on_duty'], 1)
-            },
-            'remarks': remarks
-        }
+        previous = None
+        for stop in stops:
+            if previous is not None and stop['arrival_time'] > previous['departure_time']:
+                yield (None, DRIVING, previous['departure_time'], stop['arrival_time'], '',
+                       max(0.0, stop.get('route_mile', 0.0) - previous.get('route_mile', 0.0)))
+            yield (stop['type'], self._get_status_from_stop_type(stop['type']),
+                   stop['arrival_time'], stop['departure_time'], stop['location'], 0.0)
+            previous = stop
     
     def _get_status_from_stop_type(self, stop_type):
         '''
@@ -144,32 +72,63 @@ class LogGenerator:
             'dropoff': 3,
             'fuel': 3,
             'rest': 1,
+            'restart': 0,
+            'sleeper': 1,
             'break': 0,
             'driving': 2
         }
         return mapping.get(stop_type, 0)
+
+
+class _DailyLog:
+    '''
+    One calendar day's log as it is filled in: segments in time order, with
+    off duty wherever nothing was scheduled
+    '''
     
-    def _calculate_stop_miles(self, stop, route_data):
-        '''
-        Estimate miles driven during this stop
-        '''
-        if stop['stop_type'] in ['rest', 'break', 'pickup', 'dropoff', 'start']:
-            return 0
-        
-        # Rough estimate: duration * 55 mph average
-        return stop.get('duration_hours', 0) * 55
+    def __init__(self, midnight, day_number):
+        self.start = midnight
+        self.end = midnight + timedelta(days=1)
+        self.day_number = day_number
+        self.hours = 0.0    # how far into the day the segments reach
+        self.segments = []
+        self.totals = [0.0] * len(SUMMARY_KEYS)
+        self.miles = 0.0
+        self.remarks = []
     
-    def _generate_remarks(self, day_stops, route_data):
-        '''
-        Generate remarks for the log
-        '''
-        remarks_parts = []
-        
-        for stop in day_stops:
-            if stop['stop_type'] in ['start', 'pickup', 'dropoff']:
-                remarks_parts.append(f"{stop['location']}")
-        
-        if len(remarks_parts) == 0:
-            return "En route"
-        
-        return " → ".join(remarks_parts)
+    def next(self):
+        return _DailyLog(self.end, self.day_number + 1)
+    
+    def add(self, kind, status, start, end, location, miles):
+        if kind in REMARK_KINDS:
+            self.remarks.append(location)
+        self._segment(status, (start - self.start).total_seconds() / 3600,
+                      (end - self.start).total_seconds() / 3600, location)
+        self.miles += miles
+    
+    def _segment(self, status, start, end, location):
+        if start > self.hours:
+            self._segment(OFF_DUTY, self.hours, start, '')
+        if end <= start:
+            return
+        self.segments.append({
+            'status': status,
+            'start': round(start, 2),
+            'end': round(end, 2),
+            'location': location
+        })
+        self.totals[status] += end - start
+        self.hours = end
+    
+    def to_dict(self, driver_name, carrier_name):
+        self._segment(OFF_DUTY, self.hours, 24.0, '')
+        return {
+            'date': self.start.strftime('%m/%d/%Y'),
+            'day_number': self.day_number,
+            'driver': driver_name,
+            'carrier': carrier_name,
+            'total_miles': round(self.miles, 1),
+            'segments': self.segments,
+            'summary': {key: round(hours, 1) for key, hours in zip(SUMMARY_KEYS, self.totals)},
+            'remarks': ' → '.join(self.remarks) if self.remarks else 'En route'
+        }
@@ -0,0 +1,89 @@
+# api/utils/log_grid.py - Compact binary encoding of a day's duty-status grid
+
+import struct
+
+import numpy as np
+from django.conf import settings
+
+from .duty_bitmap import MINUTES_PER_DAY, UNSET
+
+GRID_VERSION = 1
+# version, run count, location table length in bytes
+HEADER = struct.Struct('<BHI')
+# One run of a single status: minutes it lasts and its index in the location table
+RUN = np.dtype([('status', 'u1'), ('minutes', '<u2'), ('location', '<u2')])
+STORAGE_FORMATS = ('rows', 'blob')
+
+
+def encode_segments(segments):
+    '''
+    Pack segment dicts (status, start and end in hours, location) into bytes:
+    a header, the day's distinct locations (NUL-separated UTF-8, each stored
+    once) and one 5-byte run per segment, starting at midnight. Times are
+    kept to the minute; minutes no segment covers are stored as UNSET runs.
+    '''
+    segments = sorted(segments, key=lambda segment: segment['start'])
+    locations, index = [], {}
+    runs = []
+    cursor = 0
+    for segment in segments:
+        start = min(max(int(round(segment['start'] * 60)), cursor), MINUTES_PER_DAY)
+        end = min(max(int(round(segment['end'] * 60)), start), MINUTES_PER_DAY)
+        if start > cursor:
+            runs.append((UNSET, start - cursor, 0))
+        if end > start:
+            location = segment.get('location') or ''
+            if location not in index:
+                index[location] = len(locations)
+                locations.append(location)
+            runs.append((segment['status'], end - start, index[location]))
+        cursor = max(cursor, end)
+    
+    table = '\0'.join(locations).encode('utf-8')
+    return HEADER.pack(GRID_VERSION, len(runs), len(table)) + table + np.array(runs, dtype=RUN).tobytes()
+
+
+def decode_segments(blob):
+    '''
+    Segment dicts (status, start, end, location) from encode_segments output
+    '''
+    blob = bytes(blob)
+    version, count, table_length = HEADER.unpack_from(blob)
+    if version != GRID_VERSION:
+        raise ValueError(f"Unknown log grid version {version}")
+    offset = HEADER.size
+    locations = blob[offset:offset + table_length].decode('utf-8').split('\0')
+    runs = np.frombuffer(blob, dtype=RUN, count=count, offset=offset + table_length)
+    
+    ends = np.cumsum(runs['minutes'], dtype=np.int64)
+    starts = ends - runs['minutes']
+    keep = runs['status'] != UNSET
+    return [{
+        'status': status,
+        'start': start / 60,
+        'end': end / 60,
+        'location': locations[location]
+    } for status, start, end, location in zip(runs['status'][keep].tolist(), starts[keep].tolist(),
+                                              ends[keep].tolist(), runs['location'][keep].tolist())]
+
+
+def storage_format():
+    storage = getattr(settings, 'ELD_LOG_STORAGE', 'rows')
+    if storage not in STORAGE_FORMATS:
+        raise ValueError(f"ELD_LOG_STORAGE must be one of {STORAGE_FORMATS}, not {storage!r}")
+    return storage
+
+
+def read_segments(log):
+    '''
+    A log's segments from whichever form it is stored in. Row-stored logs
+    read log.segments, so prefetch 'segments' when reading many.
+    '''
+    if log.grid is not None:
+        return decode_segments(log.grid)
+    return [{
+        'status': segment.status,
+        'start': segment.start_time,
+        'end': segment.end_time,
+        'location': segment.location
+    } for segment in sorted(log.segments.all(), key=lambda segment: segment.start_time)]
@@ -0,0 +1,65 @@
+# api/utils/persistence.py - Atomic bulk writes of trips with their stops and logs with their segments
+
+from django.db import transaction
+
+from .log_grid import encode_segments, storage_format
+
+
+def stop_fields(stop):
+    '''
+    Stop model fields from a stop dict as built by HOSCalculator.to_stop_dicts
+    '''
+    return {
+        'stop_type': stop['type'],
+        'location': stop['location'],
+        'latitude': stop.get('latitude'),
+        'longitude': stop.get('longitude'),
+        'arrival_time': stop['arrival_time'],
+        'departure_time': stop['departure_time'],
+        'duration_hours': stop['duration_hours'],
+        'notes': stop['notes'],
+        'order': stop['order'],
+    }
+
+
+def log_segment_rows(log, segments):
+    '''
+    Unsaved LogSegment rows for segment dicts (status, start, end, location)
+    '''
+    from ..models import LogSegment
+    
+    return [
+        LogSegment(log=log, status=segment['status'], start_time=segment['start'],
+                   end_time=segment['end'], location=segment.get('location') or '')
+        for segment in segments
+    ]
+
+
+def save_trip(stops, **trip_fields):
+    '''
+    Create a Trip and all its stops in one transaction (one commit, and no
+    Trip left without its stops if a write fails); returns the Trip
+    '''
+    from ..models import Stop, Trip
+    
+    with transaction.atomic():
+        trip = Trip.objects.create(**trip_fields)
+        Stop.objects.bulk_create([Stop(trip=trip, **stop_fields(stop)) for stop in stops])
+    return trip
+
+
+def save_log(trip_fields, segments, storage=None, **log_fields):
+    '''
+    Create a Trip, its ELDLog and the log's segments in one transaction.
+    Segments become LogSegment rows or the ELDLog.grid blob, per `storage`
+    or the ELD_LOG_STORAGE setting. Returns the ELDLog.
+    '''
+    from ..models import ELDLog, LogSegment, Trip
+    
+    blob = (storage or storage_format()) == 'blob'
+    with transaction.atomic():
+        trip = Trip.objects.create(**trip_fields)
+        log = ELDLog.objects.create(trip=trip, grid=encode_segments(segments) if blob else None, **log_fields)
+        if not blob:
+            LogSegment.objects.bulk_create(log_segment_rows(log, segments))
+    return log
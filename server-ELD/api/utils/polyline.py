@@ -0,0 +1,214 @@
+# api/utils/polyline.py - Route geometry with a cumulative-distance index
+
+import numpy as np
+
+from .cache import MISSING, LRUCache
+from .distance import haversine_miles
+
+SEGMENT_FIELDS = ('start', 'end', 'start_coords', 'end_coords', 'distance',
+                  'duration_hours', 'fuel_stops_needed', 'geometry', 'routing', 'stop_type')
+
+
+class RoutePolyline:
+    '''
+    Route geometry as (lat, lon) vertex arrays plus the cumulative miles at
+    each vertex, so the point at mile N is a binary search and one
+    interpolation away.
+    '''
+    
+    def __init__(self, points, cumulative=None):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if len(points) == 0:
+            raise ValueError('A polyline needs at least one point')
+        self.lat = points[:, 0]
+        self.lon = points[:, 1]
+        
+        if cumulative is None:
+            cumulative = np.zeros(len(points))
+            if len(points) > 1:
+                np.cumsum(haversine_miles(self.lat[:-1], self.lon[:-1], self.lat[1:], self.lon[1:]),
+                          out=cumulative[1:])
+        self.cumulative = np.asarray(cumulative, dtype=np.float64)
+    
+    def __len__(self):
+        return len(self.lat)
+    
+    @property
+    def length(self):
+        return float(self.cumulative[-1])
+    
+    @classmethod
+    def join(cls, parts):
+        '''
+        Chain polylines end to end. Each part is (points, miles): its
+        cumulative distances are scaled so the part spans exactly `miles`,
+        which keeps mile positions consistent with the reported road distance
+        even when the geometry is coarser than the road.
+        '''
+        lats, lons, cumulative = [], [], []
+        offset = 0.0
+        for points, miles in parts:
+            part = cls(points)
+            scale = miles / part.length if part.length > 0 else 0.0
+            start = 1 if lats and len(part) > 1 else 0
+            lats.append(part.lat[start:])
+            lons.append(part.lon[start:])
+            cumulative.append(offset + part.cumulative[start:] * scale)
+            offset += miles
+        
+        points = np.column_stack((np.concatenate(lats), np.concatenate(lons)))
+        return cls(points, np.maximum.accumulate(np.concatenate(cumulative)))
+    
+    def point_at(self, miles):
+        '''
+        {'lat', 'lon'} of the point `miles` along the route (clamped to its ends)
+        '''
+        lat, lon = self.points_at(np.asarray([miles], dtype=np.float64))
+        return {'lat': float(lat[0]), 'lon': float(lon[0])}
+    
+    def points_at(self, miles):
+        '''
+        Vectorized point_at: (lat array, lon array) for an array of mile positions
+        '''
+        miles = np.clip(np.asarray(miles, dtype=np.float64), 0.0, self.length)
+        if len(self) == 1:
+            return np.full(miles.shape, self.lat[0]), np.full(miles.shape, self.lon[0])
+        
+        index = np.clip(np.searchsorted(self.cumulative, miles, side='right') - 1, 0, len(self) - 2)
+        span = self.cumulative[index + 1] - self.cumulative[index]
+        fraction = np.divide(miles - self.cumulative[index], span, out=np.zeros_like(miles), where=span > 0)
+        
+        lat = self.lat[index] + (self.lat[index + 1] - self.lat[index]) * fraction
+        lon = self.lon[index] + (self.lon[index + 1] - self.lon[index]) * fraction
+        return lat, lon
+    
+    def nearest_mile(self, lat, lon, start_mile=0.0, end_mile=None):
+        '''
+        Route mile of the point closest to (lat, lon). Only edges between
+        start_mile and end_mile are considered, so a route that doubles back
+        snaps onto the right leg.
+        '''
+        end_mile = self.length if end_mile is None else end_mile
+        if len(self) == 1:
+            return 0.0
+        
+        # Flat projection around the query point, plenty for snapping a GPS fix
+        x, y = (self.lon - lon) * np.cos(np.radians(lat)), self.lat - lat
+        dx, dy = np.diff(x), np.diff(y)
+        length2 = dx * dx + dy * dy
+        t = np.clip(np.divide(-(x[:-1] * dx + y[:-1] * dy), length2,
+                              out=np.zeros_like(length2), where=length2 > 0), 0.0, 1.0)
+        distance2 = (x[:-1] + t * dx) ** 2 + (y[:-1] + t * dy) ** 2
+        
+        in_range = (self.cumulative[1:] >= start_mile) & (self.cumulative[:-1] <= end_mile)
+        if not in_range.any():
+            in_range[:] = True
+        index = int(np.argmin(np.where(in_range, distance2, np.inf)))
+        mile = self.cumulative[index] + t[index] * (self.cumulative[index + 1] - self.cumulative[index])
+        return float(min(max(mile, start_mile), end_mile))
+    
+    def to_points(self):
+        return np.column_stack((self.lat, self.lon)).tolist()
+
+
+def route_polyline(segments):
+    '''
+    Whole-route polyline from segment dicts (their 'geometry', or just the
+    endpoints for segments without one), with mile 0 at the first start
+    '''
+    parts = []
+    for segment in segments:
+        points = segment.get('geometry') or [
+            [segment['start_coords']['lat'], segment['start_coords']['lon']],
+            [segment['end_coords']['lat'], segment['end_coords']['lon']],
+        ]
+        parts.append((points, segment['distance']))
+    return RoutePolyline.join(parts)
+
+
+class RouteTimeline:
+    '''
+    Piecewise-linear map from time (seconds since trip start) to route mile,
+    built from the stop schedule: the truck is stationary during each stop
+    and moves at constant speed between one stop's departure and the next
+    stop's arrival.
+    '''
+    
+    def __init__(self, seconds, miles):
+        self.seconds = np.asarray(seconds, dtype=np.float64)
+        self.miles = np.asarray(miles, dtype=np.float64)
+    
+    @classmethod
+    def from_stops(cls, stops):
+        '''
+        Build from stop dicts with arrival_time, departure_time and route_mile
+        '''
+        start = stops[0]['arrival_time']
+        seconds, miles = [], []
+        for stop in stops:
+            for moment in (stop['arrival_time'], stop['departure_time'] or stop['arrival_time']):
+                seconds.append((moment - start).total_seconds())
+                miles.append(stop.get('route_mile') or 0.0)
+        return cls(seconds, np.maximum.accumulate(miles))
+    
+    @property
+    def duration_seconds(self):
+        return float(self.seconds[-1])
+    
+    def state_at(self, seconds):
+        '''
+        Return (route mile, moving) at `seconds` after the trip start
+        '''
+        if seconds <= 0 or len(self.seconds) == 1:
+            return float(self.miles[0]), False
+        if seconds >= self.seconds[-1]:
+            return float(self.miles[-1]), False
+        
+        index = int(np.searchsorted(self.seconds, seconds, side='right')) - 1
+        start, end = self.seconds[index], self.seconds[index + 1]
+        mile_start, mile_end = self.miles[index], self.miles[index + 1]
+        if end <= start or mile_end == mile_start:
+            return float(mile_start), False
+        return float(mile_start + (mile_end - mile_start) * (seconds - start) / (end - start)), True
+    
+    def to_dict(self):
+        return {'seconds': self.seconds.tolist(), 'miles': self.miles.tolist()}
+
+
+def route_record(segments, stops):
+    '''
+    JSON-safe route for Trip.route_data: the segments (with geometry), the
+    stop schedule as a time -> mile timeline and where each stop's arrival
+    is in it
+    '''
+    return {
+        'start_time': stops[0]['arrival_time'].isoformat(),
+        'segments': [{field: segment[field] for field in SEGMENT_FIELDS if field in segment}
+                     for segment in segments],
+        'timeline': RouteTimeline.from_stops(stops).to_dict(),
+        'stop_points': list(range(0, 2 * len(stops), 2)),
+    }
+
+
+_trip_routes = LRUCache(max_entries=256, default_ttl=3600)
+
+
+def get_trip_route(trip):
+    '''
+    (RoutePolyline, RouteTimeline) for a trip's stored route, or None if it
+    has none. Indexes are cached per trip revision, so repeated position
+    queries only pay for the binary searches.
+    '''
+    if not trip.route_data:
+        return None
+    
+    key = (trip.pk, trip.updated_at.isoformat() if trip.updated_at else '')
+    route = _trip_routes.get(key)
+    if route is MISSING:
+        timeline = trip.route_data['timeline']
+        route = (
+            route_polyline(trip.route_data['segments']),
+            RouteTimeline(timeline['seconds'], timeline['miles']),
+        )
+        _trip_routes.set(key, route)
+    return route
@@ -0,0 +1,136 @@
+# api/utils/quick_quote.py - Constant-time HOS estimates for distance-only quotes
+
+import io
+from contextlib import redirect_stdout
+from datetime import datetime
+
+import numpy as np
+from django.conf import settings
+
+from .cache import MISSING, LRUCache
+from .hos_calculator import HOSCalculator
+from .hos_engine import CycleTracker, HOSState
+
+# Matches RouteCalculator.AVERAGE_SPEED_MPH, used when a route has no road graph
+DEFAULT_SPEED_MPH = 55
+# Quotes assume the calculate_stops default start time
+QUOTE_START_HOUR = 6
+# Events closer than this to the destination are treated as not reached (about 6 inches)
+TOLERANCE_MILES = 1e-4
+# Quotes must match calculate_stops to within this many hours (event counts must match exactly)
+QUOTE_HOURS_TOLERANCE = 1 / 60
+
+
+class QuoteTable:
+    '''
+    Every HOS event for a `max_miles` trip (pickup at the start, one long
+    leg, dropoff at the end) at a constant speed, indexed by route mile.
+    
+    The engine's schedule for a shorter trip is exactly a prefix of the
+    long one: the drive loop only looks at the clocks, and the leg just
+    ends sooner. So a quote for d miles is the events before mile d plus
+    d / speed of driving. A per-mile index into the event list makes each
+    lookup constant time, with the same results as calculate_stops.
+    '''
+    
+    KINDS = ('rest', 'break', 'fuel', 'restart')
+    
+    def __init__(self, calculator, speed_mph=DEFAULT_SPEED_MPH, max_miles=10000, start_hour=QUOTE_START_HOUR):
+        self.speed = float(speed_mph)
+        self.max_miles = max_miles
+        self.stop_hours = calculator.engine.stop_hours
+        
+        segments = [
+            {'distance': 0.0, 'duration_hours': 0.0, 'stop_type': 'pickup'},
+            {'distance': float(max_miles), 'duration_hours': max_miles / self.speed, 'stop_type': 'dropoff'},
+        ]
+        cycle = CycleTracker(calculator.WEEKLY_LIMIT, calculator.WEEKLY_DAYS, calculator.duty_history, start_hour)
+        records, _ = calculator.engine.schedule(segments, HOSState(cycle))
+        events = records[2:-1]  # between the pickup and the final dropoff
+        
+        self.miles = np.array([event.route_mile for event in events])
+        # Totals over the first k events, for k = 0..len(events)
+        self.pause_hours = np.concatenate(([0.0], np.cumsum([event.duration for event in events])))
+        self.counts = {
+            kind: np.concatenate(([0], np.cumsum([event.kind == kind for event in events])))
+            for kind in self.KINDS
+        }
+        # An event fires only while driving is left. Event miles on the long
+        # run carry a little float drift, so one within this distance of the
+        # destination counts as being at it, as it would on the short trip.
+        self.tolerance_miles = TOLERANCE_MILES
+        # First event that may still be excluded at each whole mile
+        self.by_mile = np.searchsorted(self.miles, np.arange(max_miles + 2) - self.tolerance_miles, side='left')
+    
+    def quote(self, miles):
+        '''
+        HOS totals for a trip of `miles` (0 <= miles <= max_miles)
+        '''
+        if not 0 <= miles <= self.max_miles:
+            raise ValueError(f"miles must be between 0 and {self.max_miles}")
+        
+        # Events before the whole mile, then the few (if any) inside it
+        k = int(self.by_mile[int(miles)])
+        while k < len(self.miles) and self.miles[k] < miles - self.tolerance_miles:
+            k += 1
+        
+        driving = miles / self.speed
+        total = 2 * self.stop_hours + driving + float(self.pause_hours[k])
+        rests = int(self.counts['rest'][k])
+        restarts = int(self.counts['restart'][k])
+        return {
+            'miles': miles,
+            'total_hours': total,
+            'driving_hours': driving,
+            'rests': rests,
+            'breaks': int(self.counts['break'][k]),
+            'fuel_stops': int(self.counts['fuel'][k]),
+            'restarts': restarts,
+            'total_days': rests + restarts + 1,
+        }
+
+
+_quote_tables = LRUCache(max_entries=256)
+
+
+def get_quote_table(speed_mph=DEFAULT_SPEED_MPH, cycle_hours=0):
+    '''
+    Shared QuoteTable per (speed, cycle hours used), built on first use
+    '''
+    key = (speed_mph, cycle_hours)
+    table = _quote_tables.get(key)
+    if table is MISSING:
+        table = QuoteTable(
+            HOSCalculator(current_cycle_hours=cycle_hours), speed_mph,
+            max_miles=getattr(settings, 'QUOTE_MAX_MILES', 10000),
+        )
+        _quote_tables.set(key, table)
+    return table
+
+
+def calculated_quote(miles, speed_mph=DEFAULT_SPEED_MPH, cycle_hours=0):
+    '''
+    The quote a full calculate_stops run gives for the same trip; the
+    reference QuoteTable.quote is checked against
+    '''
+    segments = [
+        {'start': 'Origin', 'end': 'Origin', 'distance': 0.0, 'duration_hours': 0.0,
+         'start_coords': {'lat': 40.0, 'lon': -100.0}, 'end_coords': {'lat': 40.0, 'lon': -100.0},
+         'stop_type': 'pickup'},
+        {'start': 'Origin', 'end': 'Destination', 'distance': miles, 'duration_hours': miles / speed_mph,
+         'start_coords': {'lat': 40.0, 'lon': -100.0}, 'end_coords': {'lat': 40.0, 'lon': -80.0},
+         'stop_type': 'dropoff'},
+    ]
+    with redirect_stdout(io.StringIO()):
+        timeline = HOSCalculator(current_cycle_hours=cycle_hours).calculate_stops(
+            {'segments': segments}, start_time=datetime(2024, 1, 1, QUOTE_START_HOUR)
+        )
+    stops = timeline['stops']
+    count = lambda kind: sum(1 for stop in stops if stop['type'] == kind)
+    return {
+        'total_hours': (stops[-1]['departure_time'] - stops[0]['arrival_time']).total_seconds() / 3600,
+        'rests': count('rest'),
+        'breaks': count('break'),
+        'fuel_stops': count('fuel'),
+        'restarts': count('restart'),
+    }
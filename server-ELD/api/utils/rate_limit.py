@@ -0,0 +1,177 @@
+# api/utils/rate_limit.py - Token-bucket rate limiting for outbound provider calls
+
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+
+
+class RateLimitExceeded(Exception):
+    pass
+
+
+class TokenBucket:
+    '''
+    In-process token bucket: `rate` tokens per second, holding up to `burst`.
+    
+    acquire() reserves the next token even if it is not there yet, so
+    waiters are served in arrival order and sleep exactly once. If the wait
+    would be longer than max_wait the call is rejected without reserving.
+    '''
+    
+    def __init__(self, rate, burst=1, name=''):
+        self.name = name
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        
+        self._stats_lock = threading.Lock()
+        self.counters = {
+            'acquired': 0,
+            'rejected': 0,
+            'waited': 0,
+            'total_wait_seconds': 0.0,
+            'max_wait_seconds': 0.0,
+        }
+    
+    def acquire(self, max_wait=None):
+        '''
+        Wait for a token and return the seconds waited. Raises
+        RateLimitExceeded if that would take longer than max_wait
+        (max_wait=0 rejects unless a token is available right now).
+        '''
+        try:
+            wait = self._reserve(max_wait)
+        except RateLimitExceeded:
+            with self._stats_lock:
+                self.counters['rejected'] += 1
+            raise
+        
+        if wait > 0:
+            time.sleep(wait)
+        
+        with self._stats_lock:
+            self.counters['acquired'] += 1
+            if wait > 0:
+                self.counters['waited'] += 1
+                self.counters['total_wait_seconds'] += wait
+                self.counters['max_wait_seconds'] = max(self.counters['max_wait_seconds'], wait)
+        return wait
+    
+    def _reserve(self, max_wait):
+        with self._lock:
+            now = time.monotonic()
+            tokens, wait = _refill_and_take(self._tokens, self._updated, now, self.rate, self.burst)
+            if max_wait is not None and wait > max_wait:
+                raise RateLimitExceeded(f"{self.name or 'bucket'}: next token in {wait:.2f}s")
+            self._tokens, self._updated = tokens, now
+            return wait
+    
+    def stats(self):
+        with self._stats_lock:
+            counters = dict(self.counters)
+        counters['avg_wait_ms'] = round(
+            counters['total_wait_seconds'] / counters['waited'] * 1000, 1
+        ) if counters['waited'] else 0.0
+        counters['total_wait_seconds'] = round(counters['total_wait_seconds'], 3)
+        counters['max_wait_seconds'] = round(counters['max_wait_seconds'], 3)
+        counters['rate_per_second'] = self.rate
+        counters['burst'] = self.burst
+        return counters
+
+
+class SharedTokenBucket(TokenBucket):
+    '''
+    Token bucket whose state is one row in a local SQLite file, so every
+    worker process on the host draws from the same budget. Each reservation
+    is a single BEGIN IMMEDIATE transaction, which SQLite serializes across
+    processes.
+    '''
+    
+    def __init__(self, rate, burst=1, name='', path='ratelimit.sqlite3'):
+        super().__init__(rate, burst, name)
+        self.path = str(path)
+        self._local = threading.local()
+    
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS token_buckets '
+                '(name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+            )
+            self._local.conn = conn
+        return conn
+    
+    def _reserve(self, max_wait):
+        try:
+            return self._reserve_shared(max_wait)
+        except sqlite3.Error as e:
+            # Fail open to this process's own bucket rather than blocking all lookups
+            print(f"⚠️ Shared rate limiter {self.path} unavailable ({e}), limiting per process")
+            return super()._reserve(max_wait)
+    
+    def _reserve_shared(self, max_wait):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT tokens, updated FROM token_buckets WHERE name = ?', (self.name,)
+            ).fetchone()
+            # Wall-clock time, since the timestamp is shared between processes
+            now = time.time()
+            tokens, updated = row if row else (self.burst, now)
+            tokens, wait = _refill_and_take(tokens, updated, now, self.rate, self.burst)
+            if max_wait is not None and wait > max_wait:
+                conn.execute('ROLLBACK')
+                raise RateLimitExceeded(f"{self.name}: next token in {wait:.2f}s")
+            conn.execute(
+                'INSERT INTO token_buckets (name, tokens, updated) VALUES (?, ?, ?) '
+                'ON CONFLICT(name) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated',
+                (self.name, tokens, now)
+            )
+            conn.execute('COMMIT')
+            return wait
+        except sqlite3.Error:
+            conn.execute('ROLLBACK')
+            raise
+
+
+def _refill_and_take(tokens, updated, now, rate, burst):
+    '''
+    Refill for the time elapsed and take one token, letting the balance go
+    negative to reserve a future token. Returns (new_tokens, seconds_to_wait).
+    '''
+    tokens = min(burst, tokens + max(0.0, now - updated) * rate) - 1
+    wait = -tokens / rate if tokens < 0 else 0.0
+    return tokens, wait
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(name):
+    '''
+    Return the process-wide limiter for a provider, configured from
+    GEOCODE_PROVIDER_RATES, or None if that provider has no limit.
+    Limiters are shared across processes when RATE_LIMIT_DB is set.
+    '''
+    if name not in _limiters:
+        with _limiters_lock:
+            if name not in _limiters:
+                config = getattr(settings, 'GEOCODE_PROVIDER_RATES', {}).get(name)
+                path = getattr(settings, 'RATE_LIMIT_DB', '')
+                if config is None:
+                    limiter = None
+                elif path:
+                    limiter = SharedTokenBucket(config['rate'], config['burst'], name=name, path=path)
+                else:
+                    limiter = TokenBucket(config['rate'], config['burst'], name=name)
+                _limiters[name] = limiter
+    return _limiters[name]
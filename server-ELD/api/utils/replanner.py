@@ -0,0 +1,114 @@
+# api/utils/replanner.py - Reschedule the rest of a stored trip from the truck's current position
+
+import numpy as np
+
+from .polyline import RouteTimeline
+
+# Stops that finish a route segment
+SEGMENT_END_KINDS = ('pickup', 'dropoff')
+# Stop miles are stored to a tenth of a mile
+PASSED_TOLERANCE_MILES = 0.1
+
+
+def segment_miles(segments):
+    '''
+    Route mile at the start of each segment, plus the route's total
+    '''
+    return np.concatenate(([0.0], np.cumsum([segment['distance'] for segment in segments])))
+
+
+def stop_points(route_data):
+    '''
+    Index of each stop's arrival in route_data['timeline']. A re-plan adds
+    a truck-position point after the kept stops, so after the first one the
+    stops are no longer every other point; trips stored before the index
+    was kept have never been re-planned.
+    '''
+    if 'stop_points' in route_data:
+        return route_data['stop_points']
+    return list(range(0, len(route_data['timeline']['miles']), 2))
+
+
+def completed_stops(departed, route_data, route_mile):
+    '''
+    How many of the `departed` stop rows (those whose scheduled departure has
+    passed, in order) the truck has really completed: a late truck has not
+    reached the later ones yet. route_data is Trip.route_data, whose
+    timeline holds each stop's route mile at its arrival.
+    '''
+    miles, points = route_data['timeline']['miles'], stop_points(route_data)
+    kept = 0
+    while kept < len(departed) and miles[points[kept]] <= route_mile + PASSED_TOLERANCE_MILES:
+        kept += 1
+    return kept
+
+
+def remaining_segments(segments, completed, route_mile, polyline):
+    '''
+    The segments still to drive once the first `completed` are done and the
+    truck is at route_mile (clamped into the current segment): the current
+    one is cut at the truck's position. Returns (segments, route mile of
+    the cut, fraction of the current segment already driven).
+    '''
+    bounds = segment_miles(segments)
+    current = segments[completed]
+    mile = min(max(route_mile, bounds[completed]), bounds[completed + 1])
+    driven = (mile - bounds[completed]) / current['distance'] if current['distance'] > 0 else 0.0
+    
+    cut = {field: value for field, value in current.items() if field != 'geometry'}
+    cut.update(
+        distance=bounds[completed + 1] - mile,
+        duration_hours=current['duration_hours'] * (1 - driven),
+        start_coords=polyline.point_at(mile),
+    )
+    return [cut] + segments[completed + 1:], float(mile), driven
+
+
+def replan_stops(calculator, segments, polyline, completed, route_mile, start_time, clocks, prior_deliveries=0):
+    '''
+    Schedule the route left after `completed` segments from route_mile at
+    start_time, with the driver's HOS clocks as they are now (a dict of
+    driving, window, since_break hours and fuel_miles).
+    
+    Only the remainder goes through the engine; stops are placed on the
+    trip's full polyline, with whole-trip route miles. Returns (stop dicts
+    without the trip's start stop, final HOSState, route mile replanned from).
+    '''
+    remaining, offset, driven = remaining_segments(segments, completed, route_mile, polyline)
+    
+    state = calculator.initial_state(start_time)
+    state.driving = clocks['driving']
+    state.window = clocks['window']
+    state.since_break = clocks['since_break']
+    state.fuel_miles = clocks['fuel_miles']
+    records, state = calculator.engine.schedule(remaining, state)
+    
+    records = records[1:]   # the trip already has its start stop
+    for record in records:
+        record.route_mile += offset
+        if record.segment == 0:
+            # Position within the whole segment, for the location names
+            record.fraction = driven + (1 - driven) * record.fraction
+    
+    stops = calculator.to_stop_dicts(records, remaining, polyline, start_time, prior_deliveries)
+    return stops, state, offset
+
+
+def replanned_timeline(route_data, kept, trip_start, position_time, route_mile, stops):
+    '''
+    Trip.route_data timeline and stop_points after a re-plan: the timeline
+    up to the last kept stop's departure as it was, the truck at route_mile
+    at position_time, then the new stops
+    '''
+    timeline, points = route_data['timeline'], stop_points(route_data)[:kept]
+    end = points[-1] + 2 if points else 0
+    seconds = list(timeline['seconds'][:end])
+    miles = list(timeline['miles'][:end])
+    seconds.append((position_time - trip_start).total_seconds())
+    miles.append(route_mile)
+    for stop in stops:
+        points.append(len(seconds))
+        for moment in (stop['arrival_time'], stop['departure_time']):
+            seconds.append((moment - trip_start).total_seconds())
+            miles.append(stop['route_mile'])
+    return RouteTimeline(seconds, np.maximum.accumulate(miles)).to_dict(), points
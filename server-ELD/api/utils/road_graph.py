@@ -0,0 +1,334 @@
+# api/utils/road_graph.py - Offline road-network routing over a memory-mapped CSR graph
+
+import heapq
+import json
+import math
+import re
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from .distance import EARTH_RADIUS_MILES, haversine_miles
+
+GRAPH_FILES = ('lat', 'lon', 'indptr', 'targets', 'seconds', 'miles',
+               'rev_indptr', 'rev_targets', 'rev_seconds', 'rev_miles', 'lat_order')
+
+# Free-flow truck speeds (mph) for OSM highway classes without a usable maxspeed
+HIGHWAY_SPEEDS = {
+    'motorway': 65, 'motorway_link': 45, 'trunk': 55, 'trunk_link': 40,
+    'primary': 50, 'primary_link': 35, 'secondary': 45, 'secondary_link': 30,
+    'tertiary': 35, 'tertiary_link': 25, 'unclassified': 30, 'residential': 25,
+    'service': 15, 'living_street': 10,
+}
+DEFAULT_SPEED_MPH = 30
+# Speed assumed for the off-network legs between a coordinate and its nearest node
+ACCESS_SPEED_MPH = 25
+MILES_PER_KM = 0.621371
+# Leading number of an OSM maxspeed tag and an optional unit ("80", "65 mph", "65mph", "50;70")
+MAXSPEED_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*(mph)?')
+
+
+class NoRoute(Exception):
+    pass
+
+
+class RoadGraph:
+    '''
+    Directed road graph in compressed sparse row form.
+    
+    Node coordinates and the forward and reverse adjacency (targets plus
+    travel seconds and miles per edge) are flat NumPy arrays. A graph saved
+    with save() is loaded with mmap_mode='r', so every worker process on the
+    host shares the same pages instead of holding its own copy.
+    
+    Nodes are also kept in latitude order (lat_order) for snapping a
+    coordinate to its nearest node without a spatial library.
+    '''
+    
+    def __init__(self, arrays, max_speed_mph, version='memory'):
+        for name in GRAPH_FILES:
+            setattr(self, name, arrays[name])
+        self.max_speed_mph = float(max_speed_mph)
+        self.version = version  # identifies the build, for caches of derived routes
+        self.sorted_lat = self.lat[self.lat_order]
+    
+    def __len__(self):
+        return len(self.lat)
+    
+    @property
+    def edge_count(self):
+        return len(self.targets)
+    
+    @classmethod
+    def build(cls, lat, lon, sources, targets, miles, speeds_mph):
+        '''
+        Build a graph from parallel edge arrays (node indexes, miles and
+        speed per directed edge). Two-way roads must be given in both directions.
+        '''
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        miles = np.asarray(miles, dtype=np.float32)
+        seconds = (miles / np.asarray(speeds_mph, dtype=np.float32) * 3600).astype(np.float32)
+        
+        arrays = {'lat': lat, 'lon': lon}
+        arrays['indptr'], arrays['targets'], (arrays['seconds'], arrays['miles']) = _csr(
+            len(lat), sources, targets, seconds, miles
+        )
+        arrays['rev_indptr'], arrays['rev_targets'], (arrays['rev_seconds'], arrays['rev_miles']) = _csr(
+            len(lat), targets, sources, seconds, miles
+        )
+        arrays['lat_order'] = np.argsort(lat, kind='stable').astype(np.int32)
+        
+        max_speed = float(np.max(miles / np.maximum(seconds, 1e-3) * 3600)) if len(miles) else DEFAULT_SPEED_MPH
+        return cls(arrays, max_speed)
+    
+    def save(self, directory):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in GRAPH_FILES:
+            np.save(directory / f'{name}.npy', getattr(self, name))
+        meta = {'nodes': len(self), 'edges': self.edge_count, 'max_speed_mph': self.max_speed_mph,
+                'built_at': time.time()}
+        (directory / 'meta.json').write_text(json.dumps(meta))
+    
+    @classmethod
+    def load(cls, directory, mmap=True):
+        directory = Path(directory)
+        meta = json.loads((directory / 'meta.json').read_text())
+        arrays = {
+            name: np.load(directory / f'{name}.npy', mmap_mode='r' if mmap else None)
+            for name in GRAPH_FILES
+        }
+        version = f"{meta['nodes']}:{meta['edges']}:{meta.get('built_at', 0):.0f}"
+        return cls(arrays, meta['max_speed_mph'], version)
+    
+    def memory_bytes(self):
+        return sum(getattr(self, name).nbytes for name in GRAPH_FILES)
+    
+    def nearest_node(self, lat, lon, radius_miles=2.0, max_radius_miles=50.0):
+        '''
+        Return (node, miles) for the node closest to a coordinate, searching
+        a latitude band that widens until a node is found within it
+        '''
+        radius = radius_miles
+        while radius <= max_radius_miles:
+            band = radius / 69.0
+            start = np.searchsorted(self.sorted_lat, lat - band, side='left')
+            end = np.searchsorted(self.sorted_lat, lat + band, side='right')
+            if end > start:
+                candidates = self.lat_order[start:end]
+                miles = haversine_miles(lat, lon, self.lat[candidates], self.lon[candidates])
+                best = int(np.argmin(miles))
+                if miles[best] <= radius:
+                    return int(candidates[best]), float(miles[best])
+            radius *= 2
+        raise NoRoute(f"No road within {max_radius_miles:.0f} miles of ({lat:.4f}, {lon:.4f})")
+    
+    def route(self, start, end):
+        '''
+        Fastest road route between two {'lat', 'lon'} coordinates.
+        
+        Returns {'distance' (miles), 'duration_hours', 'geometry' ([lat, lon]
+        pairs), 'access_miles', 'settled'}. The legs between each coordinate
+        and its nearest node are included as straight lines.
+        '''
+        source, source_miles = self.nearest_node(start['lat'], start['lon'])
+        target, target_miles = self.nearest_node(end['lat'], end['lon'])
+        
+        path, road_miles, seconds, settled = self.shortest_path(source, target)
+        access_miles = source_miles + target_miles
+        
+        nodes = np.asarray(path, dtype=np.int64)
+        points = [[start['lat'], start['lon']]]
+        points.extend([lat, lon] for lat, lon in zip(self.lat[nodes].tolist(), self.lon[nodes].tolist()))
+        points.append([end['lat'], end['lon']])
+        geometry = [point for i, point in enumerate(points) if i == 0 or point != points[i - 1]]
+        
+        return {
+            'distance': road_miles + access_miles,
+            'duration_hours': seconds / 3600 + access_miles / ACCESS_SPEED_MPH,
+            'access_miles': access_miles,
+            'geometry': geometry,
+            'settled': settled,
+        }
+    
+    def shortest_path(self, source, target):
+        '''
+        Bidirectional A* on travel time with average potentials.
+        
+        Both searches use the potential p(v) = (h_target(v) - h_source(v)) / 2,
+        where h is the straight-line time at the graph's top speed, so they
+        explore the same reduced-cost graph and can stop as soon as the sum of
+        their queue heads reaches the best meeting cost found so far.
+        Returns (node path, miles, seconds, nodes settled).
+        '''
+        if source == target:
+            return [source], 0.0, 0.0, 0
+        
+        # Haversine gives 2R * asin(...) miles; the factor 2 cancels against the
+        # halving in the average potential
+        lat, lon = self.lat, self.lon
+        seconds_per_radian = EARTH_RADIUS_MILES / self.max_speed_mph * 3600
+        s_lat, s_lon = math.radians(float(lat[source])), math.radians(float(lon[source]))
+        t_lat, t_lon = math.radians(float(lat[target])), math.radians(float(lon[target]))
+        cos_s, cos_t = math.cos(s_lat), math.cos(t_lat)
+        potentials = {}
+        
+        def potential(node):
+            value = potentials.get(node)
+            if value is None:
+                n_lat, n_lon = math.radians(float(lat[node])), math.radians(float(lon[node]))
+                cos_n = math.cos(n_lat)
+                to_target = math.asin(min(1.0, math.sqrt(
+                    math.sin((t_lat - n_lat) / 2) ** 2 + cos_n * cos_t * math.sin((t_lon - n_lon) / 2) ** 2
+                )))
+                from_source = math.asin(min(1.0, math.sqrt(
+                    math.sin((n_lat - s_lat) / 2) ** 2 + cos_s * cos_n * math.sin((n_lon - s_lon) / 2) ** 2
+                )))
+                value = potentials[node] = (to_target - from_source) * seconds_per_radian
+            return value
+        
+        forward = _Search(self.indptr, self.targets, self.seconds, source, potential(source), 1.0)
+        backward = _Search(self.rev_indptr, self.rev_targets, self.rev_seconds, target, -potential(target), -1.0)
+        
+        best, meeting = math.inf, -1
+        while forward.heap and backward.heap:
+            if forward.heap[0][0] + backward.heap[0][0] >= best:
+                break
+            
+            search, other = (forward, backward) if len(forward.heap) <= len(backward.heap) else (backward, forward)
+            _, node = heapq.heappop(search.heap)
+            if node in search.settled:
+                continue
+            search.settled.add(node)
+            
+            start, stop = int(search.indptr[node]), int(search.indptr[node + 1])
+            base = search.dist[node]
+            dist, parent, heap, direction = search.dist, search.parent, search.heap, search.direction
+            for edge, (neighbour, cost) in enumerate(
+                zip(search.targets[start:stop].tolist(), search.costs[start:stop].tolist()), start
+            ):
+                candidate = base + cost
+                if candidate < dist.get(neighbour, math.inf):
+                    dist[neighbour] = candidate
+                    parent[neighbour] = (node, edge)
+                    heapq.heappush(heap, (candidate + direction * potential(neighbour), neighbour))
+                    
+                    through = other.dist.get(neighbour)
+                    if through is not None and candidate + through < best:
+                        best, meeting = candidate + through, neighbour
+        
+        if meeting < 0:
+            raise NoRoute(f"Nodes {source} and {target} are not connected")
+        
+        path, edges, rev_edges = [], [], []
+        node = meeting
+        while node != source:
+            node, edge = forward.parent[node]
+            path.append(node)
+            edges.append(edge)
+        path.reverse()
+        path.append(meeting)
+        node = meeting
+        while node != target:
+            node, edge = backward.parent[node]
+            path.append(node)
+            rev_edges.append(edge)
+        
+        miles = float(self.miles[edges].sum()) + float(self.rev_miles[rev_edges].sum())
+        return path, miles, best, len(forward.settled) + len(backward.settled)
+
+
+class _Search:
+    '''
+    State of one direction of the bidirectional search
+    '''
+    __slots__ = ('indptr', 'targets', 'costs', 'direction', 'heap', 'dist', 'parent', 'settled')
+    
+    def __init__(self, indptr, targets, costs, origin, key, direction):
+        self.indptr, self.targets, self.costs = indptr, targets, costs
+        self.direction = direction
+        self.heap = [(key, origin)]
+        self.dist = {origin: 0.0}
+        self.parent = {}
+        self.settled = set()
+
+
+def _csr(node_count, sources, targets, *columns):
+    '''
+    Sort edges by source and return (indptr, targets, columns) as compact arrays
+    '''
+    order = np.argsort(sources, kind='stable')
+    indptr = np.zeros(node_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=node_count), out=indptr[1:])
+    return (
+        indptr,
+        targets[order].astype(np.int32),
+        tuple(np.asarray(column)[order] for column in columns),
+    )
+
+
+def edge_speed_mph(highway, maxspeed=''):
+    '''
+    Speed for an OSM way: its maxspeed tag if usable, else the highway class
+    default. OSM speeds without a unit are km/h.
+    '''
+    match = MAXSPEED_PATTERN.match((maxspeed or '').lower())
+    if match and float(match.group(1)) > 0:
+        speed = float(match.group(1))
+        return speed if match.group(2) else speed * MILES_PER_KM
+    return HIGHWAY_SPEEDS.get((highway or '').strip(), DEFAULT_SPEED_MPH)
+
+
+def largest_component(node_count, sources, targets):
+    '''
+    Boolean mask of the nodes in the largest weakly connected component
+    '''
+    parent = list(range(node_count))
+    
+    def find(node):
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        while parent[node] != root:
+            parent[node], node = root, parent[node]
+        return root
+    
+    for a, b in zip(sources.tolist(), targets.tolist()):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[root_a] = root_b
+    
+    roots = np.array([find(node) for node in range(node_count)])
+    return roots == np.bincount(roots).argmax()
+
+
+_road_graph = None
+_road_graph_loaded = False
+_road_graph_lock = threading.Lock()
+
+
+def get_road_graph():
+    '''
+    Return the process-wide road graph, or None if ROAD_GRAPH_PATH is unset
+    '''
+    global _road_graph, _road_graph_loaded
+    
+    if not _road_graph_loaded:
+        with _road_graph_lock:
+            if not _road_graph_loaded:
+                path = getattr(settings, 'ROAD_GRAPH_PATH', '')
+                if path:
+                    try:
+                        _road_graph = RoadGraph.load(path)
+                        print(f"🛣️ Road graph loaded: {len(_road_graph)} nodes, "
+                              f"{_road_graph.edge_count} edges from {path}")
+                    except (OSError, ValueError, KeyError) as e:
+                        print(f"⚠️ Could not load road graph {path}: {e}")
+                _road_graph_loaded = True
+    return _road_graph
@@ -1,5 +1,17 @@
+import time
 from datetime import datetime, timedelta
-from .geocoding import GeocodingService, OpenRouteService
+from django.conf import settings
+from .distance import distance_matrix, haversine_miles
+from .geocoding import GeocodingService
+from .polyline import route_polyline
+from .location_normalizer import normalize_location
+from .road_graph import NoRoute, get_road_graph
+from .route_plan_cache import RoutePlanCache, get_route_plan_cache
+from .stop_optimizer import optimize_stop_order, path_cost
+
+
+# Bump when segment building changes, so cached route plans are not reused
+ROUTE_ENGINE_VERSION = 3
 
 
 class RouteCalculator:
@@ -9,47 +21,120 @@ class RouteCalculator:
     
     def __init__(self):
         self.geocoding = GeocodingService()
-        self.routing = OpenRouteService()
+        self.road_graph = get_road_graph()
+        self.plan_cache = get_route_plan_cache()
         self.FUEL_INTERVAL_MILES = 1000
         self.AVERAGE_SPEED_MPH = 55  # Average highway speed
+        self.CONCURRENT_GEOCODING = getattr(settings, 'GEOCODE_CONCURRENT', True)
+        self.OPTIMIZE_TIME_LIMIT = getattr(settings, 'STOP_OPTIMIZER_TIME_LIMIT', 0.5)
     
-    def calculate_route(self, current_location, pickup_location, dropoff_location):
+    def calculate_route(self, current_location, pickup_location, dropoff_location,
+                        extra_stops=None, optimize=False):
         '''
         Calculate the complete route with all waypoints
+        
+        The trip runs current -> pickup -> extra_stops (deliveries, in the
+        given order) -> dropoff, one segment per leg. With optimize=True the
+        extra stops are reordered to shorten the route; the current
+        location, pickup and final dropoff stay fixed.
         '''
-        # Geocode all locations
-        current_coords = self.geocoding.geocode(current_location)
-        pickup_coords = self.geocoding.geocode(pickup_location)
-        dropoff_coords = self.geocoding.geocode(dropoff_location)
+        extra_stops = list(extra_stops or [])
+        names = [current_location, pickup_location] + extra_stops + [dropoff_location]
+        optimize = optimize and len(extra_stops) > 1
         
-        if not all([current_coords, pickup_coords, dropoff_coords]):
-            raise Exception("Could not geocode one or more locations")
+        plan_key = None
+        versions = self.geocoding.cache.location_versions(names) if self.plan_cache is not None else None
+        if versions is not None:
+            plan_key = RoutePlanCache.lane_key(self.engine_version(), names, optimize, versions)
+            cached = self.plan_cache.get(plan_key)
+            if cached is not None:
+                print(f"♻️ Route plan cache hit: {' -> '.join(names)}")
+                return self._relabel(cached, names)
+        started = time.perf_counter()
         
-        # Calculate segments
-        segment1 = self._calculate_segment(
-            current_coords, pickup_coords, 
-            current_location, pickup_location
-        )
+        # Geocode all locations in parallel under one deadline
+        coords = self.geocoding.geocode_many(names, concurrent=self.CONCURRENT_GEOCODING)
+        
+        failed = [name for name, result in coords.items() if not result]
+        if failed:
+            raise Exception(f"Could not geocode one or more locations: {', '.join(failed)}")
+        
+        optimization = None
+        if optimize:
+            names, optimization = self._optimize_order(names, coords)
         
-        segment2 = self._calculate_segment(
-            pickup_coords, dropoff_coords,
-            pickup_location, dropoff_location
-        )
+        # Calculate segments
+        segments = []
+        for index in range(1, len(names)):
+            segment = self._calculate_segment(
+                coords[names[index - 1]], coords[names[index]],
+                names[index - 1], names[index]
+            )
+            segment['stop_type'] = 'pickup' if index == 1 else 'dropoff'
+            segments.append(segment)
         
-        total_distance = segment1['distance'] + segment2['distance']
-        total_duration_hours = segment1['duration_hours'] + segment2['duration_hours']
+        total_distance = sum(segment['distance'] for segment in segments)
+        total_duration_hours = sum(segment['duration_hours'] for segment in segments)
         
         # Add pickup/dropoff time (1 hour each)
-        total_duration_hours += 2
+        total_duration_hours += len(segments)
         
-        return {
+        route_data = {
             'total_distance': round(total_distance, 1),
             'total_duration_hours': round(total_duration_hours, 1),
-            'segment1': segment1,  # Current to Pickup
-            'segment2': segment2,  # Pickup to Dropoff
-            'current_coords': current_coords,
-            'pickup_coords': pickup_coords,
-            'dropoff_coords': dropoff_coords
+            'segments': segments,  # Current -> pickup -> ... -> dropoff
+            'polyline': route_polyline(segments),  # Whole route, indexed by mile
+            'stop_order': names,
+            'optimization': optimization,
+            'current_coords': coords[current_location],
+            'pickup_coords': coords[pickup_location],
+            'dropoff_coords': coords[dropoff_location]
+        }
+        
+        if plan_key is not None:
+            self.plan_cache.set(plan_key, route_data, time.perf_counter() - started)
+        return route_data
+    
+    def engine_version(self):
+        '''
+        Version of everything that shapes a route plan: this module and the loaded road graph
+        '''
+        graph = self.road_graph.version if self.road_graph is not None else 'straight-line'
+        return f"{ROUTE_ENGINE_VERSION}:{graph}"
+    
+    def _relabel(self, route_data, names):
+        '''
+        Show a cached plan with this request's spelling of each location
+        '''
+        spelling = {normalize_location(name): name for name in names}
+        relabel = lambda name: spelling.get(normalize_location(name), name)
+        for segment in route_data['segments']:
+            segment['start'] = relabel(segment['start'])
+            segment['end'] = relabel(segment['end'])
+        route_data['stop_order'] = [relabel(name) for name in route_data['stop_order']]
+        if route_data['optimization']:
+            route_data['optimization']['requested_order'] = names
+        return route_data
+    
+    def _optimize_order(self, names, coords):
+        '''
+        Reorder the deliveries between the pickup and the final dropoff
+        using great-circle distances between all stops
+        '''
+        matrix = self.distance_matrix([coords[name] for name in names])
+        # Row 0 of the sub-problem is the pickup (index 1); the current location never moves
+        order, stats = optimize_stop_order(matrix[1:, 1:], time_limit=self.OPTIMIZE_TIME_LIMIT)
+        reordered = [names[0]] + [names[i + 1] for i in order]
+        
+        before = path_cost(matrix, list(range(len(names))))
+        after = matrix[0, 1] + stats['cost']
+        print(f"🔀 Stop order optimized: {before:.0f} -> {after:.0f} straight-line miles "
+              f"({stats['passes']} passes)")
+        return reordered, {
+            'requested_order': names,
+            'straight_line_miles_before': round(before, 1),
+            'straight_line_miles_after': round(after, 1),
+            'timed_out': stats['timed_out'],
         }
     
     def _calculate_segment(self, start_coords, end_coords, start_name, end_name):
@@ -60,13 +145,25 @@ class RouteCalculator:
         print(f"  Start coords: {start_coords}")
         print(f"  End coords: {end_coords}")
         
-        # Make sure we're passing (lat, lon) tuples to calculate_distance
-        distance = self.geocoding.calculate_distance(
-            (start_coords['lat'], start_coords['lon']),  # (lat, lon)
-            (end_coords['lat'], end_coords['lon'])       # (lat, lon)
-        )
+        road = None
+        if self.road_graph is not None:
+            try:
+                road = self.road_graph.route(start_coords, end_coords)
+            except NoRoute as e:
+                print(f"⚠️ No road route ({e}), using straight-line distance")
+        
+        if road:
+            distance = road['distance']
+            duration_hours = road['duration_hours']
+            geometry = road['geometry']
+        else:
+            distance = haversine_miles(
+                start_coords['lat'], start_coords['lon'],
+                end_coords['lat'], end_coords['lon']
+            )
+            duration_hours = distance / self.AVERAGE_SPEED_MPH
+            geometry = [[start_coords['lat'], start_coords['lon']], [end_coords['lat'], end_coords['lon']]]
         
-        duration_hours = distance / self.AVERAGE_SPEED_MPH
         fuel_stops_needed = int(distance / self.FUEL_INTERVAL_MILES)
         
         print(f"  Result: {distance:.1f} miles, {duration_hours:.1f} hours, {fuel_stops_needed} fuel stops")
@@ -78,14 +175,26 @@ class RouteCalculator:
             'end_coords': end_coords,
             'distance': distance,
             'duration_hours': duration_hours,
-            'fuel_stops_needed': fuel_stops_needed
+            'fuel_stops_needed': fuel_stops_needed,
+            'geometry': geometry,
+            'routing': 'road' if road else 'straight_line'
         }
 
-    def calculate_intermediate_point(self, start_coords, end_coords, fraction):
+    def distance_matrix(self, origins, destinations=None):
+        '''
+        Great-circle miles between every origin and destination coordinate
+        ({'lat', 'lon'} dicts or (lat, lon) pairs) as an N x M NumPy array
+        '''
+        return distance_matrix(origins, destinations)
+    
+    def calculate_intermediate_point(self, start_coords, end_coords, fraction, polyline=None):
         '''
         Calculate coordinates at a fraction of the distance between start and end
         fraction: 0.0 to 1.0
+        Follows the route polyline when one is given, else a straight line
         '''
+        if polyline is not None:
+            return polyline.point_at(fraction * polyline.length)
         lat = start_coords['lat'] + (end_coords['lat'] - start_coords['lat']) * fraction
         lon = start_coords['lon'] + (end_coords['lon'] - start_coords['lon']) * fraction
         return {'lat': lat, 'lon': lon}
\ No newline at end of file
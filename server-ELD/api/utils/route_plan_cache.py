@@ -0,0 +1,117 @@
+# api/utils/route_plan_cache.py - Memoized route plans keyed by lane signature
+
+import copy
+import threading
+
+from django.conf import settings
+
+from .cache import MISSING, LRUCache
+from .location_normalizer import normalize_location
+
+
+class RoutePlanCache:
+    '''
+    Process-wide cache of complete route_data dicts from
+    RouteCalculator.calculate_route.
+    
+    Plans are keyed by the routing-engine version, the normalized stop
+    names in order and the optimize flag, so "Chicago, IL" and
+    "chicago illinois" share an entry while a new road graph or engine
+    release starts from a clean slate. A reverse index from location key to
+    plan keys lets a corrected geocode invalidate every lane through it.
+    Other processes miss their stale plans because the plan key also holds
+    the geocode versions of the stops (GeocodeCache.location_versions).
+    '''
+    
+    def __init__(self, max_entries=512, ttl_seconds=24 * 3600):
+        self.plans = LRUCache(max_entries=max_entries, default_ttl=ttl_seconds)
+        self._by_location = {}  # location key -> set of plan keys
+        self._lock = threading.Lock()
+        self.invalidations = 0
+        self.seconds_saved = 0.0
+    
+    @staticmethod
+    def lane_key(engine_version, names, optimize=False, versions=()):
+        return (engine_version, tuple(normalize_location(name) for name in names), bool(optimize), tuple(versions))
+    
+    def get(self, key):
+        '''
+        A private copy of the cached plan, or None. The route polyline is
+        shared rather than copied since nothing mutates it.
+        '''
+        entry = self.plans.get(key)
+        if entry is MISSING:
+            return None
+        route_data, build_seconds = entry
+        with self._lock:
+            self.seconds_saved += build_seconds
+        polyline = route_data.get('polyline')
+        return copy.deepcopy(route_data, {id(polyline): polyline} if polyline is not None else None)
+    
+    def set(self, key, route_data, build_seconds=0.0):
+        polyline = route_data.get('polyline')
+        stored = copy.deepcopy(route_data, {id(polyline): polyline} if polyline is not None else None)
+        self.plans.set(key, (stored, build_seconds))
+        with self._lock:
+            for location in key[1]:
+                self._by_location.setdefault(location, set()).add(key)
+            if len(self._by_location) > 4 * self.plans.max_entries:
+                self._prune_index()
+    
+    def invalidate(self, key=None):
+        '''
+        Drop one plan, or every plan when key is None
+        '''
+        with self._lock:
+            if key is None:
+                self.invalidations += len(self.plans)
+                self.plans.clear()
+                self._by_location.clear()
+            elif self.plans.delete(key):
+                self.invalidations += 1
+    
+    def invalidate_location(self, name):
+        '''
+        Drop every plan that stops at a location (raw name or normalized key)
+        '''
+        location = normalize_location(name)
+        with self._lock:
+            keys = self._by_location.pop(location, set())
+            for key in keys:
+                if self.plans.delete(key):
+                    self.invalidations += 1
+        return len(keys)
+    
+    def _prune_index(self):
+        live = set(self.plans.keys())
+        for location in list(self._by_location):
+            self._by_location[location] &= live
+            if not self._by_location[location]:
+                del self._by_location[location]
+    
+    def stats(self):
+        stats = self.plans.stats()
+        with self._lock:
+            stats['invalidations'] = self.invalidations
+            stats['build_seconds_saved'] = round(self.seconds_saved, 3)
+        return stats
+
+
+_route_plan_cache = None
+_route_plan_cache_lock = threading.Lock()
+
+
+def get_route_plan_cache():
+    '''
+    Return the process-wide RoutePlanCache, or None when ROUTE_PLAN_CACHE_MAX_ENTRIES is 0
+    '''
+    global _route_plan_cache
+    
+    if _route_plan_cache is None:
+        with _route_plan_cache_lock:
+            if _route_plan_cache is None:
+                _route_plan_cache = RoutePlanCache(
+                    max_entries=getattr(settings, 'ROUTE_PLAN_CACHE_MAX_ENTRIES', 512),
+                    ttl_seconds=getattr(settings, 'ROUTE_PLAN_CACHE_TTL_SECONDS', 24 * 3600),
+                )
+    return _route_plan_cache if _route_plan_cache.plans.max_entries > 0 else None
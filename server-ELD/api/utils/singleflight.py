@@ -0,0 +1,64 @@
+# api/utils/singleflight.py - Coalesce concurrent calls for the same key
+
+import threading
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    '''
+    Run fn once per key at a time. Threads that ask for a key while a call
+    for it is already in flight wait for that call and share its result
+    (or its exception) instead of starting their own.
+    '''
+    
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+    
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.followers += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.leaders += 1
+                leader = True
+        
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+    
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._calls)
+        return {
+            'in_flight': in_flight,
+            'leaders': self.leaders,
+            'coalesced': self.followers,
+        }
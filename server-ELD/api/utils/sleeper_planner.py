@@ -0,0 +1,311 @@
+# api/utils/sleeper_planner.py - Split sleeper-berth rest placement search
+
+import math
+import time
+
+from .hos_engine import EPSILON, HOSState, StopRecord
+
+
+class SplitState(HOSState):
+    '''
+    HOSState plus what the split sleeper-berth rule needs: the qualifying
+    rest period that could start a pair, and the driving and window time
+    accrued since it ended. `records` is a linked list (newest first) so
+    branches share their common prefix.
+    '''
+    __slots__ = ('pending', 'strict_window', 'segment', 'done', 'records')
+    
+    @classmethod
+    def from_state(cls, state, records):
+        node = cls.__new__(cls)
+        for name in HOSState.__slots__:
+            setattr(node, name, getattr(state, name))
+        node.cycle = state.cycle.copy()
+        node.pending = None     # (length, driving since, window since) or None
+        node.strict_window = None   # window counting the pending period, until it is paired
+        node.segment = 0
+        node.done = 0.0         # hours driven on the current segment
+        node.records = records
+        return node
+    
+    def drive(self, hours, miles):
+        super().drive(hours, miles)
+        if self.strict_window is not None:
+            self.strict_window += hours
+        if self.pending:
+            length, driving, window = self.pending
+            self.pending = (length, driving + hours, window + hours)
+    
+    def on_duty(self, hours):
+        super().on_duty(hours)
+        if self.strict_window is not None:
+            self.strict_window += hours
+        if self.pending:
+            length, driving, window = self.pending
+            self.pending = (length, driving, window + hours)
+
+
+class SleeperPlanner:
+    '''
+    Searches where to rest so a route finishes as early as possible, using
+    full 10-hour rests and FMCSA split sleeper-berth periods (7/3, 8/2: one
+    period of at least 7 hours in the berth, the other at least 2, 10 or
+    more in total).
+    
+    When the second period of a pair ends, the 11- and 14-hour clocks are
+    recalculated from the end of the first, so neither period counts
+    against the window. A period that has not been paired yet is left out
+    of the window on the assumption that its partner follows; the window
+    counting it is tracked alongside, and a branch is dropped if the pair
+    is abandoned (by a full rest, an unpaired period or the end of the
+    route) after that stricter window had run out. A period abandoned for
+    an unpaired one counts against the window from then on.
+    
+    The search is depth-first branch and bound: at every decision point
+    (a limit or break falling due, a pickup, dropoff or fuel stop, and
+    optionally every `step_hours` of driving) it may keep driving or take
+    any rest period. Branches are pruned when they
+    cannot beat the best schedule found so far, or when a state with the
+    same clocks (rounded to `resolution` hours) has already been reached
+    at the same place no later. The plain HOSEngine schedule is the
+    starting incumbent, so the result is never slower than the baseline,
+    and the search stops with the best schedule found when its CPU budget
+    runs out.
+    '''
+    
+    def __init__(self, engine, periods=(2, 3, 7, 8), min_sleeper=7, min_short=2,
+                 step_hours=None, resolution=0.25, cpu_budget=0.5):
+        self.engine = engine
+        self.periods = periods
+        self.min_sleeper = min_sleeper
+        self.min_short = min_short
+        self.step_hours = step_hours
+        self.resolution = resolution
+        self.cpu_budget = cpu_budget
+    
+    def pairs(self, first, second):
+        return (min(first, second) >= self.min_short - EPSILON
+                and max(first, second) >= self.min_sleeper - EPSILON
+                and first + second >= self.engine.rest_hours - EPSILON)
+    
+    def plan(self, segments, state):
+        '''
+        Schedule `segments` from `state` (an HOSState). Returns a dict with
+        the best 'records' and final 'state', the engine's
+        'baseline_records' and 'baseline_state', and search statistics.
+        '''
+        engine = self.engine
+        baseline_records, baseline_state = engine.schedule(segments, state.copy())
+        deadline = time.process_time() + self.cpu_budget
+        
+        offsets = [0.0]
+        for segment in segments:
+            offsets.append(offsets[-1] + segment['distance'])
+        # Driving and stop hours from the start of each segment to the end of the route
+        driving_left, stops_left = [0.0] * (len(segments) + 1), [0.0] * (len(segments) + 1)
+        for index in range(len(segments) - 1, -1, -1):
+            driving_left[index] = driving_left[index + 1] + segments[index]['duration_hours']
+            stops_left[index] = stops_left[index + 1] + engine.stop_hours
+        
+        best_clock, best = baseline_state.clock, None
+        root = SplitState.from_state(state, (StopRecord('start', state.clock, 0.0, 0.0, 0, 0.0), None))
+        nodes, timed_out, complete = 0, False, False
+        
+        # Limited discrepancy search: pass k explores every schedule that departs
+        # from the preferred choice at most k times, until a pass is exhaustive
+        discrepancies = 0
+        while not complete and not timed_out:
+            memo = {}
+            complete = True
+            stack = [(root, 0)]
+            while stack:
+                nodes += 1
+                if nodes % 256 == 0 and time.process_time() > deadline:
+                    timed_out = True
+                    break
+                node, used = stack.pop()
+                
+                if node.segment == len(segments):
+                    if node.clock < best_clock - EPSILON and self._unpaired_ok(node):
+                        best_clock, best = node.clock, node
+                    continue
+                
+                driving = driving_left[node.segment] - node.done
+                if node.clock + driving + stops_left[node.segment] + self._rest_bound(node, driving) >= best_clock - EPSILON:
+                    continue
+                key = self._key(node)
+                seen = memo.get(key)
+                if seen and seen[0] <= node.clock + EPSILON and seen[1] <= used:
+                    continue
+                memo[key] = (node.clock, used)
+                
+                children = self._expand(node, segments, offsets)
+                if used + len(children) - 1 > discrepancies:
+                    complete = False
+                # Pushed in reverse so the preferred child (driving on) is explored first
+                for index in range(min(len(children) - 1, discrepancies - used), -1, -1):
+                    stack.append((children[index], used + (index > 0)))
+            discrepancies += 1
+        
+        if best is None:
+            records, final = baseline_records, baseline_state
+        else:
+            records, final = self._unwind(best.records), best
+        return {
+            'records': records,
+            'state': final,
+            'baseline_records': baseline_records,
+            'baseline_state': baseline_state,
+            'nodes': nodes,
+            'discrepancies': discrepancies - 1,
+            'timed_out': timed_out,
+        }
+    
+    def _rest_bound(self, node, driving):
+        '''
+        Least rest still needed to drive `driving` more hours. Beyond what
+        the clocks allow now, the first reset costs at least the short half
+        of a split if a pair is pending (else a full rest), and every further
+        11 hours of driving needs 10 more hours off: consecutive split
+        periods pair up, so two periods totalling 10 hours add at most 11
+        hours of driving.
+        '''
+        engine = self.engine
+        allowance = max(0.0, min(engine.max_driving - node.driving, engine.max_window - node.window))
+        if driving <= allowance + EPSILON:
+            return 0.0
+        resets = math.ceil((driving - allowance - EPSILON) / engine.max_driving)
+        first = self.min_short if node.pending else engine.rest_hours
+        return first + engine.rest_hours * (resets - 1)
+    
+    def _key(self, node):
+        q = lambda hours: int(round(hours / self.resolution))
+        pending = (q(node.pending[0]), q(node.pending[1]), q(node.pending[2])) if node.pending else None
+        return (node.segment, q(node.done), q(node.driving), q(node.window), q(node.since_break),
+                int(node.fuel_miles // 50), pending, q(node.cycle.used))
+    
+    def _expand(self, node, segments, offsets):
+        engine = self.engine
+        segment = segments[node.segment]
+        miles, hours = segment['distance'], segment['duration_hours']
+        speed = miles / hours if hours > 0 else 0.0
+        
+        if hours - node.done <= EPSILON:
+            child = self._child(node, segment.get('stop_type', 'dropoff'), engine.stop_hours,
+                                offsets[node.segment + 1], 1.0)
+            child.on_duty(engine.stop_hours)
+            child.segment += 1
+            child.done = 0.0
+            return [child]
+        
+        position = (offsets[node.segment] + node.done * speed, node.done / hours)
+        limit_hit = node.driving >= engine.max_driving - EPSILON or node.window >= engine.max_window - EPSILON
+        available = node.cycle.available(node.clock)
+        
+        if not limit_hit and available <= EPSILON:
+            if not self._unpaired_ok(node):
+                return []
+            child = self._child(node, 'restart', engine.restart_hours, *position)
+            child.restart(engine.restart_hours)
+            child.pending = child.strict_window = None
+            return [child]
+        if not limit_hit and speed and node.fuel_miles >= engine.fuel_interval_miles - EPSILON:
+            child = self._child(node, 'fuel', engine.fuel_hours, *position)
+            child.on_duty(engine.fuel_hours)
+            child.fuel_miles = 0.0
+            return [child]
+        
+        children = []
+        break_due = node.since_break >= engine.break_after - EPSILON
+        if not limit_hit and not break_due:
+            step = min(
+                self.step_hours or hours,
+                hours - node.done,
+                engine.max_driving - node.driving,
+                engine.max_window - node.window,
+                engine.break_after - node.since_break,
+                available,
+                (engine.fuel_interval_miles - node.fuel_miles) / speed if speed else hours,
+            )
+            child = node.copy()
+            child.drive(step, step * speed)
+            child.done += step
+            children.append(child)
+        elif break_due and not limit_hit:
+            child = self._child(node, 'break', engine.break_hours, *position)
+            child.on_duty(engine.break_hours)
+            children.append(child)
+        
+        # Rest is only considered where it can matter: when a limit or break
+        # is due, while already stopped, or at a step_hours decision point.
+        # Resting before anything has been worked since the last reset gains nothing.
+        if (limit_hit or break_due or self.step_hours or node.records[0].end >= node.clock - EPSILON) \
+                and (limit_hit or node.window > EPSILON):
+            rests = []
+            for length in self.periods:
+                # Out of hours, only a period that completes a pair or could
+                # start one that ends in a long enough second half helps
+                if limit_hit and not (self.pairs(node.pending[0], length) if node.pending
+                                      else length >= self.min_sleeper - EPSILON):
+                    continue
+                child = self._child(node, 'sleeper', length, *position)
+                if self._split_rest(child, length):
+                    rests.append(child)
+            if self._unpaired_ok(node):
+                child = self._child(node, 'rest', engine.rest_hours, *position)
+                child.rest(engine.rest_hours)
+                child.pending = child.strict_window = None
+                rests.append(child)
+            
+            if break_due and not limit_hit and not node.pending:
+                # Preferred: take the short half of a split in place of the 30-minute break
+                children = rests[:1] + children + rests[1:]
+            elif limit_hit and not node.pending:
+                # Preferred: the longest first half, leaving the short half for the next break
+                children = sorted(rests[:-1], key=lambda child: -child.records[0].duration) + rests[-1:]
+            else:
+                children += rests
+        return children
+    
+    def _split_rest(self, node, length):
+        '''
+        Take one sleeper-berth period. If it completes a pair, the clocks
+        restart from the end of the pair's first period. Returns False if
+        the period abandons a pending pair that the schedule relied on.
+        '''
+        node.clock += length
+        node.total_rest += length
+        node.since_break = 0.0
+        if node.pending and self.pairs(node.pending[0], length):
+            node.driving, node.window = node.pending[1], node.pending[2]
+            node.strict_window = None
+            node.rests += 1
+        else:
+            if not self._unpaired_ok(node):
+                return False
+            if node.strict_window is not None:
+                # The pending period will never be paired, so it counts against the window after all
+                node.window = node.strict_window
+            node.strict_window = node.window + length
+        node.pending = (length, 0.0, 0.0)
+        return True
+    
+    def _unpaired_ok(self, node):
+        '''
+        Whether the schedule stays compliant if the pending period never gets a partner
+        '''
+        return node.strict_window is None or node.strict_window <= self.engine.max_window + EPSILON
+    
+    def _child(self, node, kind, duration, route_mile, fraction):
+        child = node.copy()
+        child.records = (StopRecord(kind, node.clock, duration, route_mile, node.segment, fraction), node.records)
+        return child
+    
+    @staticmethod
+    def _unwind(records):
+        result = []
+        while records:
+            record, records = records
+            result.append(record)
+        result.reverse()
+        return result
@@ -0,0 +1,73 @@
+# api/utils/start_time_sweep.py - Schedule one route across many start times and keep the best
+
+from datetime import timedelta
+
+from .polyline import route_polyline
+
+# Stops the HOS rules add on the way; pickups and dropoffs are the same for every start
+EN_ROUTE_KINDS = ('rest', 'restart', 'sleeper', 'break', 'fuel')
+REST_KINDS = ('rest', 'restart', 'sleeper')
+
+
+def in_daily_window(moment, window_start, window_end):
+    '''
+    Whether moment's time of day is inside [window_start, window_end]; the window may wrap midnight
+    '''
+    clock = moment.time()
+    if window_start <= window_end:
+        return window_start <= clock <= window_end
+    return clock >= window_start or clock <= window_end
+
+
+def sweep_start_times(calculator, route_data, starts, receiving_window=None, min_rest_distance_miles=0):
+    '''
+    Run the HOS engine over route_data once per start time and return the
+    Pareto-best departures: no other start arrives earlier without adding
+    en-route stops.
+    
+    Only the engine runs per start; stop dicts are built for the winners.
+    receiving_window is an optional (start, end) pair of times of day the
+    final dropoff must arrive in, and starts whose last rest falls within
+    min_rest_distance_miles of the dropoff are skipped.
+    '''
+    segments = route_data['segments']
+    route_miles = sum(segment['distance'] for segment in segments)
+    
+    candidates = []
+    for start_time in starts:
+        records, state = calculator.schedule(segments, start_time)
+        arrival = start_time + timedelta(hours=records[-1].start)
+        if receiving_window and not in_daily_window(arrival, *receiving_window):
+            continue
+        
+        rests = [record for record in records if record.kind in REST_KINDS]
+        rest_gap = route_miles - rests[-1].route_mile if rests else None
+        if rest_gap is not None and rest_gap < min_rest_distance_miles:
+            continue
+        
+        candidates.append({
+            'start_time': start_time,
+            'arrival_time': arrival,
+            'total_hours': state.clock,
+            'en_route_stops': sum(1 for record in records if record.kind in EN_ROUTE_KINDS),
+            'rests': len(rests),
+            'last_rest_miles_from_dropoff': rest_gap,
+            'records': records,
+        })
+    
+    # Pareto front on (arrival, en-route stops): walk by arrival, keep each strict improvement in stops
+    front, fewest = [], None
+    for candidate in sorted(candidates, key=lambda c: (c['arrival_time'], c['en_route_stops'], c['start_time'])):
+        if fewest is None or candidate['en_route_stops'] < fewest:
+            front.append(candidate)
+            fewest = candidate['en_route_stops']
+    
+    polyline = route_data.get('polyline') or route_polyline(segments)
+    for option in front:
+        option['stops'] = calculator.to_stop_dicts(option.pop('records'), segments, polyline, option['start_time'])
+    
+    return {
+        'evaluated': len(starts),
+        'feasible': len(candidates),
+        'options': front,
+    }
@@ -4,7 +4,14 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, generics
 from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.dateparse import parse_datetime
 from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
 from django.http import FileResponse
 from io import BytesIO
 from reportlab.pdfgen import canvas
@@ -15,7 +22,6 @@ from rest_framework import status
 from datetime import datetime, timedelta
 from .utils.route_calculator import RouteCalculator
 from .utils.hos_calculator import HOSCalculator
-from .serializers import TripInputSerializer
 from .models import Trip, Stop
 from reportlab.lib.pagesizes import A4
 
@@ -27,11 +33,56 @@ from .serializers import (
     TripInputSerializer,
     StopSerializer,
     ELDLogSerializer,
-    SaveLogSerializer
+    SaveLogSerializer,
+    BatchGeocodeSerializer,
+    DistanceMatrixSerializer,
+    StartTimeSweepSerializer,
+    DriverLogsQuerySerializer,
+    QuoteQuerySerializer,
+    TripReplanSerializer,
 )
 from .utils.route_calculator import RouteCalculator
 from .utils.hos_calculator import HOSCalculator
 from .utils.log_generator import LogGenerator
+from .utils.geocoding import GeocodingService
+from .utils.batch_geocoder import BatchGeocoder, summarize
+from .utils.distance import distance_matrix
+from .utils.duty_bitmap import DutyDay, format_minute
+from .utils.keyset import encode_cursor, logs_before
+from .utils.log_grid import read_segments
+from .utils.persistence import save_log, save_trip, stop_fields
+from .utils.polyline import get_trip_route, route_record
+from .utils.route_plan_cache import get_route_plan_cache
+from .utils.start_time_sweep import REST_KINDS, sweep_start_times
+from .utils.quick_quote import get_quote_table
+from .utils.replanner import SEGMENT_END_KINDS, completed_stops, replan_stops, replanned_timeline, segment_miles
+
+
+def _format_stop(s):
+    return {
+        'type': s['type'],
+        'title': _get_stop_title(s['type']),
+        'location': s['location'],
+        'time': s['arrival_time'].strftime('%I:%M %p'),
+        'duration': f"{s['duration_hours']}h" if s['duration_hours'] > 0 else None,
+        'notes': s['notes'],
+        'coordinates': [s.get('latitude'), s.get('longitude')]
+    }
+
+
+def _get_stop_title(stop_type):
+    """Convert stop type to display title"""
+    title_map = {
+        'start': 'Start Location',
+        'pickup': 'Pickup Location', 
+        'dropoff': 'Dropoff Location',
+        'fuel': 'Fuel Stop',
+        'rest': 'Rest Break',
+        'restart': '34-Hour Restart',
+        'sleeper': 'Sleeper Berth',
+        'break': 'Required Break'
+    }
+    return title_map.get(stop_type, stop_type.title())
 
 
 class CalculateRouteView(APIView):
@@ -73,22 +124,29 @@ class CalculateRouteView(APIView):
             
             # Step 1: Calculate route
             route_calc = RouteCalculator()
-            pickup_location = data.get('waypoints', [None])[0] or data['origin']
+            waypoints = data.get('waypoints') or []
+            pickup_location = waypoints[0] if waypoints else data['origin']
             
             route_data = route_calc.calculate_route(
                 current_location=data['origin'],
                 pickup_location=pickup_location,
-                dropoff_location=data['destination']
+                dropoff_location=data['destination'],
+                extra_stops=waypoints[1:],
+                optimize=data.get('optimize_stops', False)
             )
             
             # Step 2: Initialize HOS calculator
             hos_calc = HOSCalculator(
-                current_cycle_hours=data.get('current_cycle_hours', 0)
+                current_cycle_hours=data.get('current_cycle_hours', 0),
+                duty_history=data.get('duty_history')
             )
             
             # ✅ Step 3: Use HOSCalculator to generate HOS-compliant stops
             print("🚛 Calculating HOS-compliant stops...")
-            stops_timeline = hos_calc.calculate_stops(route_data, start_time=current_time)
+            stops_timeline = hos_calc.calculate_stops(
+                route_data, start_time=current_time,
+                split_sleeper=data.get('split_sleeper', False)
+            )
             
             # Extract stops and totals
             stops = stops_timeline['stops']
@@ -101,50 +159,56 @@ class CalculateRouteView(APIView):
             print(f"   Total rest: {total_rest_hours}h")
             print(f"   Total duration: {total_hours}h")
             
-            # Step 4: Save to database
-            trip = Trip.objects.create(
+            # Step 4: Save the trip and its stops in one transaction
+            trip = save_trip(
+                stops,
                 current_location=data['origin'],
                 pickup_location=pickup_location,
                 dropoff_location=data['destination'],
-                current_cycle_hours=data.get('current_cycle_hours', 0),
+                current_cycle_hours=hos_calc.current_cycle_hours,
                 total_distance=route_data['total_distance'],
                 total_duration_hours=total_hours,
                 driving_hours=total_driving_hours,
-                rest_hours=total_rest_hours
+                rest_hours=total_rest_hours,
+                route_data=route_record(route_data['segments'], stops)
             )
             
-            # Save stops to database
-            for stop_data in stops:
-                Stop.objects.create(
-                    trip=trip,
-                    stop_type=stop_data['type'],
-                    location=stop_data['location'],
-                    latitude=stop_data.get('latitude'),
-                    longitude=stop_data.get('longitude'),
-                    arrival_time=stop_data['arrival_time'],
-                    departure_time=stop_data['departure_time'],
-                    duration_hours=stop_data['duration_hours'],
-                    notes=stop_data['notes'],
-                    order=stop_data['order']
-                )
-            
             # Format response for frontend
             response_data = {
                 'totalDistance': f"{route_data['total_distance']} miles",
                 'totalDuration': f"{total_hours:.1f}h",
                 'drivingTime': f"{total_driving_hours:.1f}h",
                 'restTime': f"{total_rest_hours:.1f}h",
-                'stops': [{
-                    'type': s['type'],
-                    'title': self._get_stop_title(s['type']),
-                    'location': s['location'],
-                    'time': s['arrival_time'].strftime('%I:%M %p'),
-                    'duration': f"{s['duration_hours']}h" if s['duration_hours'] > 0 else None,
-                    'notes': s['notes'],
-                    'coordinates': [s.get('latitude'), s.get('longitude')]
-                } for s in stops]
+                'cycleHoursUsed': stops_timeline['cycle_hours_used'],
+                'cycleRestarts': stops_timeline['cycle_restarts'],
+                'stops': [_format_stop(s) for s in stops],
+                'stopOrder': route_data['stop_order'],
+                'logs': [self._format_log(log) for log in LogGenerator(
+                    driver_name=data.get('driver_name', 'Driver'),
+                    carrier_name=data.get('carrier_name', 'Carrier')
+                ).generate_logs(stops_timeline, route_data)]
             }
             
+            if route_data['optimization']:
+                optimization = route_data['optimization']
+                response_data['optimization'] = {
+                    'requestedOrder': optimization['requested_order'],
+                    'straightLineMilesBefore': optimization['straight_line_miles_before'],
+                    'straightLineMilesAfter': optimization['straight_line_miles_after'],
+                }
+            
+            if stops_timeline.get('sleeper_plan'):
+                plan = stops_timeline['sleeper_plan']
+                response_data['sleeperPlan'] = {
+                    'totalHours': plan['total_hours'],
+                    'baselineTotalHours': plan['baseline_total_hours'],
+                    'hoursSaved': plan['hours_saved'],
+                    'baselineRestHours': plan['baseline_rest_hours'],
+                    'baselineStops': plan['baseline_stops'],
+                    'splitRests': plan['split_rests'],
+                    'searchComplete': not plan['timed_out'],
+                }
+            
             print(f"✅ Route calculated successfully")
             print(f"  Total stops: {len(stops)}")
             print(f"  Start time: {stops[0]['arrival_time'].strftime('%I:%M %p')}")
@@ -160,17 +224,120 @@ class CalculateRouteView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-    def _get_stop_title(self, stop_type):
-        """Convert stop type to display title"""
-        title_map = {
-            'start': 'Start Location',
-            'pickup': 'Pickup Location', 
-            'dropoff': 'Dropoff Location',
-            'fuel': 'Fuel Stop',
-            'rest': 'Rest Break',
-            'break': 'Required Break'
+    def _format_log(self, log):
+        # Same shape as /api/driver-logs/, so the client draws both the same way
+        return {
+            'date': log['date'],
+            'day_number': log['day_number'],
+            'driver': log['driver'],
+            'carrier': log['carrier'],
+            'totalMiles': log['total_miles'],
+            'summary': log['summary'],
+            'segments': log['segments'],
+            'remarks': log['remarks']
         }
-        return title_map.get(stop_type, stop_type.title())
+
+
+class StartTimeSweepView(APIView):
+    """
+    POST /api/calculate-route/sweep/
+    Route once, then schedule it for a grid of start times and return the
+    Pareto-best departures (earliest arrival vs. fewest en-route stops)
+    """
+    
+    def post(self, request):
+        serializer = StartTimeSweepSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {'error': 'Invalid input', 'details': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        data = serializer.validated_data
+        
+        try:
+            waypoints = data.get('waypoints') or []
+            route_data = RouteCalculator().calculate_route(
+                current_location=data['origin'],
+                pickup_location=waypoints[0] if waypoints else data['origin'],
+                dropoff_location=data['destination'],
+                extra_stops=waypoints[1:],
+                optimize=data.get('optimize_stops', False)
+            )
+            hos_calc = HOSCalculator(
+                current_cycle_hours=data.get('current_cycle_hours', 0),
+                duty_history=data.get('duty_history')
+            )
+            
+            first = datetime.combine(datetime.now().date(), data['earliest_start'])
+            step = timedelta(minutes=data['step_minutes'])
+            starts = [first + step * i for i in range(serializer.start_count(data))]
+            window = None
+            if data.get('receiving_window_start') is not None:
+                window = (data['receiving_window_start'], data['receiving_window_end'])
+            
+            sweep = sweep_start_times(
+                hos_calc, route_data, starts, receiving_window=window,
+                min_rest_distance_miles=data.get('min_rest_distance_miles', 0)
+            )
+            print(f"🕐 Start-time sweep: {sweep['evaluated']} starts, {sweep['feasible']} feasible, "
+                  f"{len(sweep['options'])} Pareto-best")
+            
+            return Response({
+                'totalDistance': f"{route_data['total_distance']} miles",
+                'stopOrder': route_data['stop_order'],
+                'startsEvaluated': sweep['evaluated'],
+                'startsFeasible': sweep['feasible'],
+                'options': [{
+                    'startTime': option['start_time'].isoformat(),
+                    'arrivalTime': option['arrival_time'].isoformat(),
+                    'totalDuration': f"{option['total_hours']:.1f}h",
+                    'enRouteStops': option['en_route_stops'],
+                    'rests': option['rests'],
+                    'lastRestMilesFromDropoff': (round(option['last_rest_miles_from_dropoff'], 1)
+                                                 if option['last_rest_miles_from_dropoff'] is not None else None),
+                    'stops': [_format_stop(s) for s in option['stops']],
+                } for option in sweep['options']]
+            }, status=status.HTTP_200_OK)
+        
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+     
+class QuickQuoteView(APIView):
+    """
+    GET /api/quote/?miles=2300[&cycle_hours=0&speed_mph=55]
+    Constant-time HOS estimate for a distance: total hours, days, rests, breaks, fuel stops
+    """
+    
+    def get(self, request):
+        serializer = QuoteQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(
+                {'error': 'Invalid input', 'details': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        data = serializer.validated_data
+        quote = get_quote_table(data['speed_mph'], data['cycle_hours']).quote(data['miles'])
+        response = Response({
+            'miles': quote['miles'],
+            'totalHours': round(quote['total_hours'], 2),
+            'drivingHours': round(quote['driving_hours'], 2),
+            'totalDays': quote['total_days'],
+            'rests': quote['rests'],
+            'breaks': quote['breaks'],
+            'fuelStops': quote['fuel_stops'],
+            'restarts': quote['restarts'],
+        }, status=status.HTTP_200_OK)
+        # The answer only depends on the query string and the HOS rules
+        patch_cache_control(response, public=True, max_age=getattr(settings, 'QUOTE_CACHE_SECONDS', 86400))
+        return response
 
      
 class SaveLogView(APIView):
@@ -180,6 +347,32 @@ class SaveLogView(APIView):
     """
     
     def post(self, request):
+        serializer = SaveLogSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {'error': 'Invalid input', 'details': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Duty status by the minute: overlapping segments are rejected, gaps are off duty
+        day = DutyDay.from_segments(serializer.validated_data['segments'])
+        if day.overlaps:
+            return Response(
+                {'error': 'Invalid input', 'details': {'segments': [
+                    f"Segments overlap from {format_minute(start)} to {format_minute(end)}"
+                    for start, end in day.overlaps
+                ]}},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        warnings = [
+            f"Segment {index + 1} at {format_minute(start)} is shorter than a minute; ignored"
+            for index, start in day.empty
+        ] + [
+            f"No duty status from {format_minute(start)} to {format_minute(end)}; recorded as off duty"
+            for start, end in day.fill_gaps()
+        ]
+        summary = day.totals()
+        
         try:
             data = request.data
             trip_data = data.get('tripData', {})
@@ -188,54 +381,41 @@ class SaveLogView(APIView):
             print("Full data:", json.dumps(data, indent=2, default=str))
             print("Trip data:", json.dumps(trip_data, indent=2))
             
-           
-            trip = Trip.objects.create(
-                current_location=trip_data.get('currentLocation', ''),
-                pickup_location=trip_data.get('pickupLocation', ''),
-                dropoff_location=trip_data.get('dropoffLocation', ''),
-                current_cycle_hours=trip_data.get('currentCycleHours', 0),
-                total_distance=data.get('totalMiles', 0),
-                
-            )
-            
-          
             log_date = datetime.strptime(data['date'], '%m/%d/%Y').date() if '/' in data['date'] else datetime.now().date()
             
-            eld_log = ELDLog.objects.create(
-                trip=trip,
+            # Trip, log and segments (LogSegment rows or the grid blob, per ELD_LOG_STORAGE) in one transaction
+            eld_log = save_log(
+                {
+                    'current_location': trip_data.get('currentLocation', ''),
+                    'pickup_location': trip_data.get('pickupLocation', ''),
+                    'dropoff_location': trip_data.get('dropoffLocation', ''),
+                    'current_cycle_hours': trip_data.get('currentCycleHours', 0),
+                    'total_distance': data.get('totalMiles', 0),
+                },
+                day.to_segments(),
                 log_date=log_date,
                 day_number=1,
                 driver_name=trip_data.get('driverName', data.get('driver', 'Driver')),
                 carrier_name=trip_data.get('carrierName', data.get('carrier', 'Carrier')),
-              
                 carrier_address=trip_data.get('carrierAddress', ''),
                 home_terminal=trip_data.get('homeTerminal', ''),
                 vehicle_number=trip_data.get('vehicleNumber', ''),
                 trailer_number=trip_data.get('trailerNumber', ''),
-               
                 total_miles=data.get('totalMiles', 0),
-                off_duty_hours=data.get('summary', {}).get('offDuty', 0),
-                sleeper_berth_hours=data.get('summary', {}).get('sleeper', 0),
-                driving_hours=data.get('summary', {}).get('driving', 0),
-                on_duty_hours=data.get('summary', {}).get('onDuty', 0),
+                off_duty_hours=summary['offDuty'],
+                sleeper_berth_hours=summary['sleeper'],
+                driving_hours=summary['driving'],
+                on_duty_hours=summary['onDuty'],
                 remarks=data.get('remarks', '')
             )
             
-           
-            for segment in data.get('segments', []):
-                LogSegment.objects.create(
-                    log=eld_log,
-                    status=segment['status'],
-                    start_time=segment['start'],
-                    end_time=segment['end'],
-                    location=segment.get('location', '')
-                )
-            
             print(f"✅ Log saved successfully: {eld_log.id}")
+            for warning in warnings:
+                print(f"⚠️ {warning}")
             
             # Return saved log with ALL data
-            serializer = ELDLogSerializer(eld_log)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            response_data = dict(ELDLogSerializer(eld_log).data, warnings=warnings)
+            return Response(response_data, status=status.HTTP_201_CREATED)
             
         except Exception as e:
             import traceback
@@ -244,6 +424,42 @@ class SaveLogView(APIView):
                 {'error': str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+
+def _saved_log(log):
+    '''
+    Response dict for a saved ELDLog; select_related('trip') and prefetch 'segments' when listing
+    '''
+    return {
+        'id': log.id,
+        'date': log.log_date.strftime('%m/%d/%Y'),
+        'day_number': log.day_number,
+        'driver': log.driver_name,
+        'carrier': log.carrier_name,
+        'totalMiles': log.total_miles,
+        'summary': {
+            'offDuty': log.off_duty_hours,
+            'sleeper': log.sleeper_berth_hours,
+            'driving': log.driving_hours,
+            'onDuty': log.on_duty_hours
+        },
+        'segments': read_segments(log),
+        'remarks': log.remarks,
+        'tripData': {
+            'currentLocation': log.trip.current_location if log.trip else '',
+            'pickupLocation': log.trip.pickup_location if log.trip else '',
+            'dropoffLocation': log.trip.dropoff_location if log.trip else '',
+            'currentCycleHours': log.trip.current_cycle_hours if log.trip else 0,
+            'driverName': log.driver_name,
+            'carrierName': log.carrier_name,
+            'carrierAddress': log.carrier_address,
+            'homeTerminal': log.home_terminal,
+            'vehicleNumber': log.vehicle_number,
+            'trailerNumber': log.trailer_number
+        }
+    }
+
+
 class DriverLogsView(APIView):
     """
     GET /api/driver-logs/
@@ -252,46 +468,11 @@ class DriverLogsView(APIView):
     
     def get(self, request):
         try:
-            logs = ELDLog.objects.all().order_by('-log_date')
+            logs = ELDLog.objects.select_related('trip').prefetch_related('segments').order_by('-log_date')
             
             logs_data = []
             for log in logs:
-                segments = LogSegment.objects.filter(log=log).order_by('start_time')
-                
-                logs_data.append({
-                    'id': log.id,
-                    'date': log.log_date.strftime('%m/%d/%Y'),
-                    'day_number': log.day_number,
-                    'driver': log.driver_name,
-                    'carrier': log.carrier_name,
-                    'totalMiles': log.total_miles,
-                    'summary': {
-                        'offDuty': log.off_duty_hours,
-                        'sleeper': log.sleeper_berth_hours,
-                        'driving': log.driving_hours,
-                        'onDuty': log.on_duty_hours
-                    },
-                    'segments': [{
-                        'status': seg.status,
-                        'start': seg.start_time,
-                        'end': seg.end_time,
-                        'location': seg.location
-                    } for seg in segments],
-                    'remarks': log.remarks,
-                    'tripData': {
-                        'currentLocation': log.trip.current_location if log.trip else '',
-                        'pickupLocation': log.trip.pickup_location if log.trip else '',
-                        'dropoffLocation': log.trip.dropoff_location if log.trip else '',
-                        'currentCycleHours': log.trip.current_cycle_hours if log.trip else 0,
-                       
-                        'driverName': log.driver_name,
-                        'carrierName': log.carrier_name,
-                        'carrierAddress': log.carrier_address,
-                        'homeTerminal': log.home_terminal,
-                        'vehicleNumber': log.vehicle_number,
-                        'trailerNumber': log.trailer_number
-                    }
-                })
+                logs_data.append(_saved_log(log))
             
             return Response(logs_data, status=status.HTTP_200_OK)
             
@@ -303,6 +484,45 @@ class DriverLogsView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+
+class DriverLogsV2View(APIView):
+    """
+    GET /api/v2/driver-logs/?[driver=&carrier=&vehicle=&date_from=&date_to=&limit=50&cursor=]
+    Saved logs newest first, one page at a time; pass nextCursor back as cursor for the next page
+    """
+    
+    def get(self, request):
+        serializer = DriverLogsQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(
+                {'error': 'Invalid input', 'details': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        data = serializer.validated_data
+        logs = ELDLog.objects.all()
+        for param, field in (('driver', 'driver_name'), ('carrier', 'carrier_name'), ('vehicle', 'vehicle_number')):
+            if param in data:
+                logs = logs.filter(**{field: data[param]})
+        if 'date_from' in data:
+            logs = logs.filter(log_date__gte=data['date_from'])
+        if 'date_to' in data:
+            logs = logs.filter(log_date__lte=data['date_to'])
+        if 'cursor' in data:
+            logs = logs_before(logs, data['cursor'])
+        
+        # One extra row tells us whether there is a next page without a COUNT
+        limit = data['limit']
+        page = list(logs.select_related('trip').prefetch_related('segments').order_by('-log_date', '-id')[:limit + 1])
+        has_more = len(page) > limit
+        page = page[:limit]
+        
+        return Response({
+            'results': [_saved_log(log) for log in page],
+            'nextCursor': encode_cursor(page[-1]) if has_more else None,
+        }, status=status.HTTP_200_OK)
+
+
 class TodayMileageView(APIView):
     """
     GET /api/today-mileage/
@@ -394,6 +614,292 @@ class TripDetailView(generics.RetrieveAPIView):
         return Response(trip_data, status=status.HTTP_200_OK)
 
 
+class TripPositionView(APIView):
+    """
+    GET /api/trips/<id>/position/?time=<ISO datetime>
+    Where the truck is on the planned route at a given time (default: now)
+    """
+    
+    def get(self, request, pk):
+        try:
+            trip = Trip.objects.get(pk=pk)
+        except Trip.DoesNotExist:
+            return Response({'error': 'Trip not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        route = get_trip_route(trip)
+        if route is None:
+            return Response(
+                {'error': 'Trip has no stored route'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        polyline, timeline = route
+        
+        at = timezone.now()
+        if request.query_params.get('time'):
+            at = parse_datetime(request.query_params['time'])
+            if at is None:
+                return Response(
+                    {'error': 'time must be an ISO 8601 datetime'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        start = parse_datetime(trip.route_data['start_time'])
+        # Schedules are built from naive datetimes, which are stored as UTC
+        if timezone.is_naive(start):
+            start = timezone.make_aware(start, dt_timezone.utc)
+        if timezone.is_naive(at):
+            at = timezone.make_aware(at, dt_timezone.utc)
+        
+        elapsed = (at - start).total_seconds()
+        route_mile, moving = timeline.state_at(elapsed)
+        point = polyline.point_at(route_mile)
+        
+        if elapsed < 0:
+            state = 'not_started'
+        elif elapsed >= timeline.duration_seconds:
+            state = 'completed'
+        else:
+            state = 'driving' if moving else 'stopped'
+        
+        return Response({
+            'tripId': trip.id,
+            'time': at.isoformat(),
+            'status': state,
+            'routeMile': round(route_mile, 1),
+            'totalMiles': round(polyline.length, 1),
+            'coordinates': [point['lat'], point['lon']],
+        }, status=status.HTTP_200_OK)
+
+
+class TripReplanView(APIView):
+    """
+    POST /api/trips/<id>/replan/
+    Reschedule the rest of a trip from the truck's current position, time and
+    HOS clocks. Completed stops are kept; only stop rows that change are written.
+    """
+    
+    STOP_FIELDS = ('stop_type', 'location', 'latitude', 'longitude', 'arrival_time',
+                   'departure_time', 'duration_hours', 'notes', 'order')
+    
+    def post(self, request, pk):
+        serializer = TripReplanSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {'error': 'Invalid input', 'details': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        data = serializer.validated_data
+        now = data['current_time']
+        
+        with transaction.atomic():
+            try:
+                trip = Trip.objects.select_for_update().get(pk=pk)
+            except Trip.DoesNotExist:
+                return Response({'error': 'Trip not found'}, status=status.HTTP_404_NOT_FOUND)
+            
+            route = get_trip_route(trip)
+            if route is None:
+                return Response(
+                    {'error': 'Trip has no stored route'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            polyline, _ = route
+            segments = trip.route_data['segments']
+            
+            rows = list(trip.stops.order_by('order'))
+            departed = 0
+            while departed < len(rows) and (rows[departed].departure_time or rows[departed].arrival_time) <= now:
+                departed += 1
+            if departed == 0:
+                return Response(
+                    {'error': 'current_time is before the trip start'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            route_mile = data.get('route_mile')
+            if route_mile is None:
+                # A late truck may still be on the leg before the scheduled one
+                bounds = segment_miles(segments)
+                leg = min(sum(1 for row in rows[:departed] if row.stop_type in SEGMENT_END_KINDS), len(segments) - 1)
+                route_mile = polyline.nearest_mile(*data['coordinates'], bounds[max(leg - 1, 0)], bounds[leg + 1])
+            
+            kept = completed_stops(rows[:departed], trip.route_data, route_mile)
+            completed = sum(1 for row in rows[:kept] if row.stop_type in SEGMENT_END_KINDS)
+            if completed >= len(segments):
+                return Response({'error': 'Trip is already complete'}, status=status.HTTP_400_BAD_REQUEST)
+            
+            hos_calc = HOSCalculator(current_cycle_hours=data['cycle_hours'])
+            stops, state, route_mile = replan_stops(
+                hos_calc, segments, polyline, completed, route_mile, now,
+                {
+                    'driving': data['driving_hours'],
+                    'window': data['window_hours'],
+                    'since_break': data['since_break_hours'],
+                    'fuel_miles': data['fuel_miles'],
+                },
+                prior_deliveries=sum(1 for row in rows[:kept] if row.stop_type == 'dropoff')
+            )
+            for order, stop in enumerate(stops, start=kept):
+                stop['order'] = order
+            
+            changes = self._write_stops(trip, rows[kept:], stops)
+            
+            trip_start = parse_datetime(trip.route_data['start_time'])
+            if timezone.is_naive(trip_start):
+                trip_start = timezone.make_aware(trip_start, dt_timezone.utc)
+            timeline, points = replanned_timeline(trip.route_data, kept, trip_start, now, route_mile, stops)
+            trip.route_data = dict(trip.route_data, timeline=timeline, stop_points=points)
+            trip.total_duration_hours = round(
+                (stops[-1]['departure_time'] - rows[0].arrival_time).total_seconds() / 3600, 1
+            )
+            trip.rest_hours = round(
+                sum(row.duration_hours for row in rows[:kept] if row.stop_type in REST_KINDS) + state.total_rest, 1
+            )
+            trip.save(update_fields=['route_data', 'total_duration_hours', 'rest_hours', 'updated_at'])
+        
+        print(f"🔁 Re-planned trip {trip.id} from mile {route_mile:.1f}: kept {kept} stops, "
+              f"{changes['updated']} updated, {changes['created']} created, {changes['deleted']} deleted")
+        
+        return Response({
+            'tripId': trip.id,
+            'time': now.isoformat(),
+            'routeMile': round(route_mile, 1),
+            'keptStops': kept,
+            'stopsUnchanged': changes['unchanged'],
+            'stopsUpdated': changes['updated'],
+            'stopsCreated': changes['created'],
+            'stopsDeleted': changes['deleted'],
+            'totalDuration': f"{trip.total_duration_hours:.1f}h",
+            'cycleHoursUsed': round(state.cycle.used_at(state.clock), 1),
+            'cycleRestarts': state.restarts,
+            'stops': [_format_stop(s) for s in stops],
+        }, status=status.HTTP_200_OK)
+    
+    def _write_stops(self, trip, rows, stops):
+        '''
+        Make the stop rows after the kept prefix match `stops`, writing only the rows that differ
+        '''
+        changed, created = [], []
+        for row, stop in zip(rows + [None] * (len(stops) - len(rows)), stops):
+            values = stop_fields(stop)
+            if row is None:
+                created.append(Stop(trip=trip, **values))
+            elif any(getattr(row, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(row, field, value)
+                changed.append(row)
+        surplus = [row.pk for row in rows[len(stops):]]
+        
+        if changed:
+            Stop.objects.bulk_update(changed, self.STOP_FIELDS)
+        if created:
+            Stop.objects.bulk_create(created)
+        if surplus:
+            Stop.objects.filter(pk__in=surplus).delete()
+        return {
+            'unchanged': len(stops) - len(changed) - len(created),
+            'updated': len(changed),
+            'created': len(created),
+            'deleted': len(surplus),
+        }
+
+
+class GeocodingStatsView(APIView):
+    """
+    GET /api/geocoding-stats/
+    Per-provider latency/error stats, circuit state, geocode cache and route plan cache counters
+    """
+    
+    def get(self, request):
+        data = GeocodingService().stats()
+        plans = get_route_plan_cache()
+        data['route_plans'] = plans.stats() if plans is not None else None
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class BatchGeocodeView(APIView):
+    """
+    POST /api/geocode/batch/
+    Geocode a list of locations; streams one JSON line per location as it resolves,
+    followed by a summary line
+    """
+    
+    def post(self, request):
+        serializer = BatchGeocodeSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {'error': 'Invalid input', 'details': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        locations = serializer.validated_data['locations']
+        lines, summary = summarize(BatchGeocoder().run(locations))
+        
+        def stream():
+            try:
+                for line in lines:
+                    yield json.dumps(line) + '\n'
+            finally:
+                lines.close()  # stops the geocoding workers if the client disconnects
+            yield json.dumps({'summary': summary}) + '\n'
+        
+        response = StreamingHttpResponse(stream(), content_type='application/x-ndjson')
+        response['X-Accel-Buffering'] = 'no'  # let proxies pass lines through immediately
+        return response
+
+
+class DistanceMatrixView(APIView):
+    """
+    POST /api/distance-matrix/
+    Great-circle distance matrix (miles) between origins and destinations;
+    points may be location names (geocoded) or coordinates
+    """
+    
+    def post(self, request):
+        serializer = DistanceMatrixSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {'error': 'Invalid input', 'details': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        data = serializer.validated_data
+        origins = data['origins']
+        destinations = data.get('destinations')
+        
+        names = [p for p in origins + (destinations or []) if isinstance(p, str)]
+        geocoded = GeocodingService().geocode_many(names) if names else {}
+        failed = sorted({name for name in names if not geocoded.get(name)})
+        if failed:
+            return Response(
+                {'error': 'Could not geocode one or more locations', 'locations': failed},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        def resolve(points):
+            resolved = []
+            for point in points:
+                if isinstance(point, str):
+                    coords = geocoded[point]
+                    resolved.append({'name': point, 'lat': coords['lat'], 'lon': coords['lon']})
+                elif isinstance(point, dict):
+                    resolved.append({'lat': float(point['lat']), 'lon': float(point['lon'])})
+                else:
+                    resolved.append({'lat': float(point[0]), 'lon': float(point[1])})
+            return resolved
+        
+        resolved_origins = resolve(origins)
+        resolved_destinations = resolve(destinations) if destinations else resolved_origins
+        matrix = distance_matrix(resolved_origins, resolved_destinations)
+        
+        return Response({
+            'origins': resolved_origins,
+            'destinations': resolved_destinations,
+            'units': 'miles',
+            'distances': matrix.round(1).tolist(),
+        }, status=status.HTTP_200_OK)
+
+
 class DownloadLogsPDFView(APIView):
     """
     POST /api/download-logs-pdf/
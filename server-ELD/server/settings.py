@@ -111,3 +111,88 @@ OPENROUTE_API_KEY = config('OPENROUTE_API_KEY', default='')
 MAPBOX_API_KEY = config('MAPBOX_API_KEY', default='')
 print("OPENROUTE_API_KEY from .env:", OPENROUTE_API_KEY)
 
+# Geocode cache (in-process LRU in front of the GeocodeCacheEntry table)
+GEOCODE_CACHE_MAX_ENTRIES = config('GEOCODE_CACHE_MAX_ENTRIES', default=2048, cast=int)
+GEOCODE_CACHE_TTL_SECONDS = config('GEOCODE_CACHE_TTL_SECONDS', default=30 * 24 * 3600, cast=int)
+GEOCODE_NEGATIVE_TTL_SECONDS = config('GEOCODE_NEGATIVE_TTL_SECONDS', default=900, cast=int)
+
+
+# Concurrent geocoding (RouteCalculator resolves all trip locations in parallel)
+GEOCODE_CONCURRENT = config('GEOCODE_CONCURRENT', default=True, cast=bool)
+GEOCODE_MAX_WORKERS = config('GEOCODE_MAX_WORKERS', default=8, cast=int)
+GEOCODE_DEADLINE_SECONDS = config('GEOCODE_DEADLINE_SECONDS', default=20, cast=float)
+
+# Geocoding provider clients (pooled sessions, circuit breakers, hedged fallback)
+GEOCODE_PROVIDER_TIMEOUT = config('GEOCODE_PROVIDER_TIMEOUT', default=10, cast=float)
+GEOCODE_POOL_SIZE = config('GEOCODE_POOL_SIZE', default=10, cast=int)
+GEOCODE_BREAKER_FAILURES = config('GEOCODE_BREAKER_FAILURES', default=5, cast=int)
+GEOCODE_BREAKER_RESET_SECONDS = config('GEOCODE_BREAKER_RESET_SECONDS', default=30, cast=float)
+GEOCODE_HEDGE_DEFAULT_DELAY = config('GEOCODE_HEDGE_DEFAULT_DELAY', default=2.0, cast=float)
+GEOCODE_HEDGE_MIN_DELAY = config('GEOCODE_HEDGE_MIN_DELAY', default=0.25, cast=float)
+
+# Offline gazetteer (GeoNames-style TSV) consulted before any network geocoder
+GAZETTEER_PATH = config('GAZETTEER_PATH', default='')
+GAZETTEER_MIN_POPULATION = config('GAZETTEER_MIN_POPULATION', default=0, cast=int)
+GAZETTEER_FUZZY_THRESHOLD = config('GAZETTEER_FUZZY_THRESHOLD', default=0.0, cast=float) or None
+
+# Cross-worker single-flight: one worker resolves a key, the others wait for it
+GEOCODE_LEASE_SECONDS = config('GEOCODE_LEASE_SECONDS', default=15, cast=float)
+GEOCODE_LEASE_WAIT_SECONDS = config('GEOCODE_LEASE_WAIT_SECONDS', default=10, cast=float)
+
+# Near-duplicate location names (trigram similarity) reuse an already cached coordinate; 0 disables
+GEOCODE_FUZZY_THRESHOLD = config('GEOCODE_FUZZY_THRESHOLD', default=0.8, cast=float)
+
+# Batch geocoding: OpenRouteService worker threads and how long each call may queue for a token
+GEOCODE_BATCH_WORKERS = config('GEOCODE_BATCH_WORKERS', default=4, cast=int)
+GEOCODE_BATCH_MAX_LOCATIONS = config('GEOCODE_BATCH_MAX_LOCATIONS', default=10000, cast=int)
+GEOCODE_BATCH_MAX_WAIT = config('GEOCODE_BATCH_MAX_WAIT', default=300, cast=float)
+# Seconds after a batch starts beyond which the Nominatim fallback stops making lookups
+GEOCODE_BATCH_FALLBACK_DEADLINE = config('GEOCODE_BATCH_FALLBACK_DEADLINE', default=600, cast=float)
+
+# Outbound provider rate limits (token buckets). rate = requests/second, burst = bucket size,
+# max_wait = seconds an interactive lookup may queue for a token before it is rejected (0 = reject).
+# With RATE_LIMIT_DB set, buckets live in that SQLite file and are shared by all workers on the host.
+RATE_LIMIT_DB = config('RATE_LIMIT_DB', default=str(BASE_DIR / 'ratelimit.sqlite3'))
+GEOCODE_PROVIDER_RATES = {
+    'openroute': {
+        'rate': config('OPENROUTE_RATE_PER_SECOND', default=1.6, cast=float),
+        'burst': config('OPENROUTE_RATE_BURST', default=5, cast=int),
+        'max_wait': config('OPENROUTE_RATE_MAX_WAIT', default=2.0, cast=float),
+    },
+    'nominatim': {
+        'rate': config('NOMINATIM_RATE_PER_SECOND', default=1.0, cast=float),
+        'burst': config('NOMINATIM_RATE_BURST', default=1, cast=int),
+        'max_wait': config('NOMINATIM_RATE_MAX_WAIT', default=5.0, cast=float),
+    },
+}
+
+# Largest origins x destinations matrix /api/distance-matrix/ will compute
+DISTANCE_MATRIX_MAX_CELLS = config('DISTANCE_MATRIX_MAX_CELLS', default=250000, cast=int)
+
+# Offline road routing: directory written by `manage.py build_road_graph` (empty = straight-line estimates)
+ROAD_GRAPH_PATH = config('ROAD_GRAPH_PATH', default='')
+
+# Multi-stop trips: most waypoints per request, and the time budget for reordering deliveries
+ROUTE_MAX_WAYPOINTS = config('ROUTE_MAX_WAYPOINTS', default=25, cast=int)
+STOP_OPTIMIZER_TIME_LIMIT = config('STOP_OPTIMIZER_TIME_LIMIT', default=0.5, cast=float)
+
+# Full route plans memoized per lane (normalized stops + routing engine version); 0 disables
+ROUTE_PLAN_CACHE_MAX_ENTRIES = config('ROUTE_PLAN_CACHE_MAX_ENTRIES', default=512, cast=int)
+ROUTE_PLAN_CACHE_TTL_SECONDS = config('ROUTE_PLAN_CACHE_TTL_SECONDS', default=24 * 3600, cast=int)
+
+# CPU seconds the split sleeper-berth planner may spend searching before returning its best schedule
+SLEEPER_PLANNER_CPU_SECONDS = config('SLEEPER_PLANNER_CPU_SECONDS', default=0.5, cast=float)
+
+# Most start times one /api/calculate-route/sweep/ request may schedule
+START_TIME_SWEEP_MAX_STARTS = config('START_TIME_SWEEP_MAX_STARTS', default=1000, cast=int)
+
+# Distance-only quotes (/api/quote/): longest quotable trip, and how long clients and proxies may cache answers
+QUOTE_MAX_MILES = config('QUOTE_MAX_MILES', default=10000, cast=int)
+QUOTE_CACHE_SECONDS = config('QUOTE_CACHE_SECONDS', default=86400, cast=int)
+
+# How saved daily logs store their duty-status segments: 'rows' (LogSegment) or 'blob' (ELDLog.grid, see utils/log_grid.py)
+ELD_LOG_STORAGE = config('ELD_LOG_STORAGE', default='rows')
+
+# /api/v2/driver-logs/: logs per page when no limit is given, and the largest limit accepted
+DRIVER_LOGS_PAGE_SIZE = config('DRIVER_LOGS_PAGE_SIZE', default=50, cast=int)
+DRIVER_LOGS_MAX_PAGE_SIZE = config('DRIVER_LOGS_MAX_PAGE_SIZE', default=200, cast=int)